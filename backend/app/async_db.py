@@ -0,0 +1,96 @@
+import os
+import time
+from contextlib import asynccontextmanager
+
+from psycopg.types.numeric import FloatLoader
+from psycopg_pool import AsyncConnectionPool
+
+from app.metrics import db_connection_wait
+
+from app.db_connection import (
+    RDS_HOST,
+    RDS_PORT,
+    RDS_DB_NAME,
+    RDS_USER,
+    RDS_PASSWORD,
+    DB_POOL_TIMEOUT,
+    DB_STATEMENT_TIMEOUT_MS,
+)
+
+# Async pool parameters (request path); the psycopg2 pool keeps serving background work
+ASYNC_DB_POOL_MIN_SIZE = int(os.getenv("ASYNC_DB_POOL_MIN_SIZE", 2))
+ASYNC_DB_POOL_MAX_SIZE = int(os.getenv("ASYNC_DB_POOL_MAX_SIZE", 20))
+
+_pool = None
+
+
+async def _configure(conn):
+    # NUMERIC columns come back as float, like the psycopg2 request path used to convert them
+    conn.adapters.register_loader("numeric", FloatLoader)
+
+
+def _create_pool() -> AsyncConnectionPool:
+    return AsyncConnectionPool(
+        kwargs={
+            "host": RDS_HOST,
+            "port": RDS_PORT,
+            "dbname": RDS_DB_NAME,
+            "user": RDS_USER,
+            "password": RDS_PASSWORD,
+            "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}",
+        },
+        min_size=ASYNC_DB_POOL_MIN_SIZE,
+        max_size=ASYNC_DB_POOL_MAX_SIZE,
+        timeout=DB_POOL_TIMEOUT,
+        configure=_configure,
+        open=False,
+    )
+
+
+async def init_async_pool():
+    """Open the async pool (called from the FastAPI lifespan)."""
+    global _pool
+    if _pool is None:
+        print(f"Creating async database pool (min={ASYNC_DB_POOL_MIN_SIZE}, max={ASYNC_DB_POOL_MAX_SIZE})")
+        pool = _create_pool()
+        await pool.open()
+        _pool = pool
+
+
+async def close_async_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+@asynccontextmanager
+async def get_async_connection():
+    """
+    Borrow an async connection. The transaction is committed when the block
+    exits normally and rolled back on error, then the connection goes back to the pool.
+    """
+    if _pool is None:
+        await init_async_pool()
+    start = time.perf_counter()
+    async with _pool.connection() as conn:
+        db_connection_wait.labels(pool="async").observe(time.perf_counter() - start)
+        yield conn
+
+
+def get_async_pool_stats() -> dict:
+    """Size, wait and error counters of the async pool, empty if it was never created."""
+    if _pool is None:
+        return {}
+    stats = _pool.get_stats()
+    return {
+        "min_size": ASYNC_DB_POOL_MIN_SIZE,
+        "max_size": ASYNC_DB_POOL_MAX_SIZE,
+        "pool_size": stats.get("pool_size", 0),
+        "pool_available": stats.get("pool_available", 0),
+        "requests_waiting": stats.get("requests_waiting", 0),
+        "requests_num": stats.get("requests_num", 0),
+        "requests_wait_ms": stats.get("requests_wait_ms", 0),
+        "requests_errors": stats.get("requests_errors", 0),
+        "usage_ms": stats.get("usage_ms", 0),
+    }
@@ -0,0 +1,231 @@
+import csv
+import io
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from app.utils import generate_customer_ids
+
+# Columns written by /customers/upload_csv, with the type each CSV value is validated against
+# (same coercions as the CustomerDB schema). Other CSV columns are ignored.
+UPLOAD_COLUMNS = {
+    "customer_id": "text",
+    "gender": "text",
+    "senior_citizen": "bool",
+    "partner": "bool",
+    "dependents": "bool",
+    "tenure": "int",
+    "phone_service": "bool",
+    "multiple_lines": "text",
+    "internet_service": "text",
+    "online_security": "text",
+    "online_backup": "text",
+    "device_protection": "text",
+    "tech_support": "text",
+    "streaming_tv": "text",
+    "streaming_movies": "text",
+    "contract": "text",
+    "paperless_billing": "bool",
+    "payment_method": "text",
+    "monthly_charges": "numeric",
+    "total_charges": "numeric",
+    "churn": "bool",
+    "status": "text",
+    "notified": "bool",
+    "first_name": "text",
+    "last_name": "text",
+    "email": "text",
+}
+
+# VARCHAR limits of the customers table, checked up front so COPY never fails mid-file
+TEXT_LIMITS = {"status": 20, "first_name": 50, "last_name": 50, "email": 100}
+
+TRUE_STRINGS = {"1", "t", "true", "y", "yes", "on"}
+FALSE_STRINGS = {"0", "f", "false", "n", "no", "off"}
+INT_MAX = 2**31 - 1
+NUMERIC_MAX = 10**8  # NUMERIC(10,2)
+
+UPLOAD_CHUNK_ROWS = 50_000
+
+_COLUMN_LIST = ", ".join(UPLOAD_COLUMNS)
+
+
+def _upsert_query(columns: list[str], keep_existing: bool) -> str:
+    """
+    Merge of the staging table into `customers`, writing only `columns`: a
+    column the input does not have (e.g. churn in a producer message) keeps
+    its stored value. With `keep_existing`, NULLs keep the stored value too.
+    """
+    column_list = ", ".join(columns)
+    update = ",\n            ".join(
+        f"{c}=COALESCE(EXCLUDED.{c}, customers.{c})" if keep_existing else f"{c}=EXCLUDED.{c}"
+        for c in columns
+        if c != "customer_id"
+    )
+    return f"""
+            INSERT INTO customers ({column_list})
+            SELECT DISTINCT ON (customer_id) {column_list}
+            FROM customers_upload_stage
+            ORDER BY customer_id, row_num DESC
+            ON CONFLICT (customer_id) DO UPDATE SET
+            {update},
+            updated_at=NOW()
+            """
+
+
+def open_customer_csv(binary_stream, chunk_rows: int = UPLOAD_CHUNK_ROWS):
+    """
+    Start parsing an uploaded CSV without reading it all in memory.
+    Returns (headers, chunks) where chunks yields DataFrames of raw strings.
+    """
+    text = io.TextIOWrapper(binary_stream, encoding="utf-8-sig", errors="ignore", newline="")
+    reader = csv.reader(text)
+    headers = [h.strip() for h in next(reader, [])]
+    # Like csv.DictReader: the last of repeated headers wins, surplus fields are dropped
+    # and missing trailing fields are None
+    positions = {h: i for i, h in enumerate(headers)}
+    width = len(headers)
+
+    def chunks():
+        while True:
+            rows = list(islice(reader, chunk_rows))
+            if not rows:
+                return
+            rows = [row[:width] if len(row) >= width else row + [None] * (width - len(row)) for row in rows]
+            frame = pd.DataFrame(rows, columns=range(width), dtype=object)
+            yield frame[list(positions.values())].set_axis(list(positions), axis=1)
+
+    return headers, chunks()
+
+
+def validate_chunk(raw: pd.DataFrame, first_row: int):
+    """
+    Validate and normalise one chunk of raw CSV strings.
+    Returns (clean, errors): `clean` holds the valid rows in COPY-ready text form
+    (None for NULL) plus a `row_num` column; `errors` lists {"row", "error"} for the others.
+    """
+    row_nums = np.arange(first_row, first_row + len(raw))
+    clean = pd.DataFrame({"row_num": row_nums}, index=raw.index)
+    problems = pd.Series("", index=raw.index)
+
+    for column, kind in UPLOAD_COLUMNS.items():
+        if column not in raw.columns:
+            clean[column] = None
+            continue
+        values = raw[column].astype(object).where(raw[column].notna(), None)
+        present = values.notna()
+
+        if kind == "text":
+            out = values
+            limit = TEXT_LIMITS.get(column)
+            bad = present & (values.str.len() > limit) if limit else pd.Series(False, index=raw.index)
+            message = f"{column}: String should have at most {limit} characters"
+        elif kind == "bool":
+            normalised = values.str.strip().str.lower()
+            out = pd.Series(
+                np.where(normalised.isin(TRUE_STRINGS), "t", np.where(normalised.isin(FALSE_STRINGS), "f", None)),
+                index=raw.index,
+                dtype=object,
+            )
+            bad = present & out.isna()
+            message = f"{column}: Input should be a valid boolean"
+        else:
+            stripped = values.str.strip()
+            numbers = pd.to_numeric(stripped, errors="coerce")
+            if kind == "int":
+                bad = present & ~(numbers.notna() & (numbers == np.floor(numbers)) & (numbers.abs() <= INT_MAX))
+                # "12.0" is a valid integer for the schema but not for COPY
+                out = numbers.where(~bad).astype("Int64").astype(str)
+                message = f"{column}: Input should be a valid integer"
+            else:
+                bad = present & ~(np.isfinite(numbers) & (numbers.abs() < NUMERIC_MAX))
+                out = stripped
+                message = f"{column}: Input should be a valid number"
+            out = out.astype(object).where(~bad & present, None)
+
+        clean[column] = out
+        if bad.any():
+            problems[bad] = problems[bad] + message + "; "
+
+    invalid = problems != ""
+    errors = [
+        {"row": int(row), "error": message.rstrip("; ")}
+        for row, message in zip(row_nums[invalid.to_numpy()], problems[invalid])
+    ]
+    return clean[~invalid], errors
+
+
+def load_customers(conn, chunks, keep_existing: bool = False) -> tuple[int, list[dict], list[dict], set]:
+    """
+    Bulk-load parsed CSV chunks into `customers` (caller commits).
+
+    Each chunk is validated, given generated IDs where customer_id is empty,
+    and COPYed into a staging table; one INSERT ... ON CONFLICT then merges the
+    staging table into `customers`. When an ID appears several times, the last
+    row wins, as with the former row-by-row upserts. Only the columns present
+    in the chunks are written; `keep_existing` also keeps stored values over NULLs
+    (partial updates, as the stream consumer receives).
+    Returns (processed, errors, generated_ids, upserted_ids).
+    """
+    processed = 0
+    present = {"customer_id"}
+    errors = []
+    generated_ids = []
+    used_ids = set()
+    first_row = 2  # line 1 is the header
+
+    with conn.cursor() as cur:
+        # Temp tables skip the WAL like UNLOGGED ones and are private to this upload
+        cur.execute(
+            """
+            CREATE TEMP TABLE customers_upload_stage
+                (row_num INTEGER, LIKE customers INCLUDING DEFAULTS)
+            ON COMMIT DROP
+            """
+        )
+
+        for raw in chunks:
+            present.update(raw.columns)
+            clean, chunk_errors = validate_chunk(raw, first_row)
+            first_row += len(raw)
+            errors.extend(chunk_errors)
+            if clean.empty:
+                continue
+
+            explicit = clean["customer_id"].notna() & (clean["customer_id"] != "")
+            used_ids.update(clean.loc[explicit, "customer_id"])
+            missing = clean.index[~explicit]
+            if len(missing):
+                new_ids = _unused_customer_ids(cur, len(missing), used_ids)
+                clean.loc[missing, "customer_id"] = new_ids
+                generated_ids.extend(
+                    {"row": int(row), "customer_id": cid}
+                    for row, cid in zip(clean.loc[missing, "row_num"], new_ids)
+                )
+
+            buffer = io.StringIO()
+            clean[["row_num", *UPLOAD_COLUMNS]].to_csv(buffer, header=False, index=False, na_rep="\\N")
+            buffer.seek(0)
+            cur.copy_expert(
+                f"COPY customers_upload_stage (row_num, {_COLUMN_LIST}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                buffer,
+            )
+            processed += len(clean)
+
+        cur.execute(_upsert_query([c for c in UPLOAD_COLUMNS if c in present], keep_existing))
+
+    return processed, errors, generated_ids, used_ids
+
+
+def _unused_customer_ids(cur, count: int, used_ids: set) -> list[str]:
+    """Draw `count` new IDs that clash neither with `customers` nor with IDs used earlier in the file."""
+    ids = []
+    while len(ids) < count:
+        candidates = [c for c in generate_customer_ids(count - len(ids)) if c not in used_ids]
+        cur.execute("SELECT customer_id FROM customers WHERE customer_id = ANY(%s)", (candidates,))
+        taken = {row[0] for row in cur.fetchall()}
+        fresh = [c for c in candidates if c not in taken]
+        used_ids.update(fresh)
+        ids.extend(fresh)
+    return ids
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+from config import DASHBOARD_CACHE_TTL_SECONDS
+
+
+class AggregateCache:
+    """
+    In-process cache for the dashboard aggregates.
+
+    Each key holds the last computed value, reused until the TTL expires or
+    the key is invalidated by a rare write (uploads, feedback). Frequent writes
+    (predictions) patch the cached value in place with `update`. Concurrent
+    misses on the same key run the query once. `last_modified` only moves
+    when a recomputation actually changes the value, so browsers keep their
+    cached copy across refreshes that found nothing new.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._entries = {}  # key -> (value, fingerprint, last_modified, expires_at)
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, compute) -> tuple:
+        """Return (value, last_modified) for `key`, calling `compute()` when stale."""
+        entry = self._entries.get(key)
+        if entry is not None and entry[3] > time.monotonic():
+            return entry[0], entry[2]
+
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        with key_lock:
+            # Another request may have refreshed the key while we waited
+            entry = self._entries.get(key)
+            if entry is not None and entry[3] > time.monotonic():
+                return entry[0], entry[2]
+
+            value = compute()
+            fingerprint = make_etag(value)
+            last_modified = entry[2] if entry is not None and entry[1] == fingerprint else time.time()
+            self._entries[key] = (value, fingerprint, last_modified, time.monotonic() + self.ttl_seconds)
+            return value, last_modified
+
+    def update(self, key: str, apply):
+        """
+        Replace a fresh cached value by `apply(value)`, keeping its expiry.
+        Nothing happens when the key is stale or missing: the next read recomputes it.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[3] <= time.monotonic():
+                return
+            value = apply(entry[0])
+            fingerprint = make_etag(value)
+            last_modified = entry[2] if fingerprint == entry[1] else time.time()
+            self._entries[key] = (value, fingerprint, last_modified, entry[3])
+
+    def invalidate(self, *keys: str):
+        """Drop the given keys, or everything when called without arguments."""
+        with self._lock:
+            for key in keys or list(self._entries):
+                # Keep last_modified and the fingerprint, only force the next read to recompute
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries[key] = (entry[0], entry[1], entry[2], 0.0)
+
+
+def add_daily_predictions(rollup: dict, total: int, churn: int) -> dict:
+    """A fetch_daily_prediction_counts result with `total` predictions (`churn` of them churn) added to today."""
+    days = list(rollup["days"])
+    if days and days[-1]["date"] == rollup["today"]:
+        last = days[-1]
+        days[-1] = {"date": last["date"], "churn": last["churn"] + churn, "total": last["total"] + total}
+    else:
+        days.append({"date": rollup["today"], "churn": churn, "total": total})
+    return {"today": rollup["today"], "days": days}
+
+
+def make_etag(value) -> str:
+    body = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return '"' + hashlib.sha1(body.encode("utf-8")).hexdigest() + '"'
+
+
+def conditional_json_response(request: Request, value, last_modified: float) -> Response:
+    """JSON response carrying ETag/Last-Modified, or an empty 304 when the client copy is current."""
+    etag = make_etag(value)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(last_modified, usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+    elif request.headers.get("if-modified-since"):
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"]).timestamp()
+        except (TypeError, ValueError):
+            since = None
+        if since is not None and int(last_modified) <= since:
+            return Response(status_code=304, headers=headers)
+
+    return JSONResponse(value, headers=headers)
+
+
+dashboard_cache = AggregateCache(DASHBOARD_CACHE_TTL_SECONDS)
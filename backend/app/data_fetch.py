@@ -1,208 +1,421 @@
-from app.db_connection import get_db_connection
+import time
+from uuid import uuid4
 
-def fetch_customers():
-    """Fetch customer data with their predictions and feedback status."""
-    from decimal import Decimal
-    
-    connection = None
+import psycopg2.extensions
+
+from app.db_connection import get_pooled_connection
+from app.async_db import get_async_connection
+from app.metrics import db_query_duration, timed
+
+# Numeric columns come back as float instead of Decimal, straight from the driver
+_DECIMAL_AS_FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values,
+    "DECIMAL_AS_FLOAT",
+    lambda value, cursor: float(value) if value is not None else None,
+)
+
+# Fields /customers can return, mapped to their SQL expression
+CUSTOMER_LIST_FIELDS = {
+    "customer_id": "c.customer_id",
+    "first_name": "c.first_name",
+    "last_name": "c.last_name",
+    "email": "c.email",
+    "contract": "c.contract",
+    "monthly_charges": "c.monthly_charges",
+    "total_charges": "c.total_charges",
+    "tenure": "c.tenure",
+    "churn_label": "lp.churn_label",
+    "churn_score": "lp.churn_score",
+    "prediction_date": "lp.created_at",
+    "notified_date": "lp.notified_at",
+    "feedback_date": "lp.answered_at",
+    "feedback_answer": "lp.feedback_answer",
+}
+
+# Returned when no projection is requested (the historical /customers payload)
+DEFAULT_CUSTOMER_FIELDS = [
+    "customer_id", "first_name", "last_name", "email", "contract", "monthly_charges", "total_charges",
+    "churn_label", "prediction_date", "notified_date", "feedback_date", "feedback_answer",
+]
+
+
+def _customer_list_query(fields: list[str] | None, filters: dict | None, after: str | None, limit: int | None):
+    """
+    Build the /customers SELECT: projection, filters and keyset pagination on customer_id.
+    Raises ValueError for unknown fields. Returns (sql, params, fields).
+    """
+    fields = list(dict.fromkeys(fields or DEFAULT_CUSTOMER_FIELDS))
+    unknown = [f for f in fields if f not in CUSTOMER_LIST_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    # customer_id is the pagination key, always returned
+    if "customer_id" not in fields:
+        fields.insert(0, "customer_id")
+
+    filters = filters or {}
+    conditions = []
+    params = []
+    if filters.get("contract") is not None:
+        conditions.append("c.contract = %s")
+        params.append(filters["contract"])
+    if filters.get("churn_label") is not None:
+        conditions.append("lp.churn_label = %s")
+        params.append(bool(filters["churn_label"]))
+    if filters.get("min_score") is not None:
+        conditions.append("lp.churn_score >= %s")
+        params.append(float(filters["min_score"]))
+    if filters.get("max_score") is not None:
+        conditions.append("lp.churn_score <= %s")
+        params.append(float(filters["max_score"]))
+    if filters.get("notified") is not None:
+        conditions.append("lp.notified_at IS NOT NULL" if filters["notified"] else "lp.notified_at IS NULL")
+    if after is not None:
+        conditions.append("c.customer_id > %s")
+        params.append(after)
+
+    select = ", ".join(f"{CUSTOMER_LIST_FIELDS[f]} AS {f}" for f in fields)
+    sql = f"""
+        SELECT {select}
+        FROM customers c
+        LEFT JOIN latest_predictions lp ON lp.customer_id = c.customer_id
+        {"WHERE " + " AND ".join(conditions) if conditions else ""}
+        ORDER BY c.customer_id
+    """
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    return sql, params, fields
+
+
+@timed(db_query_duration, query="fetch_customers")
+def fetch_customers(fields: list[str] | None = None, filters: dict | None = None,
+                    after: str | None = None, limit: int = 500):
+    """
+    Fetch one page of customers with their latest prediction and feedback status.
+
+    Pages are keyed on customer_id: pass the returned `next_cursor` as `after`
+    to get the next one (None once the last page is reached).
+    Returns (customers, next_cursor).
+    """
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        
-        print('Fetching customers with predictions and feedback from database...')
-        
-        # Join customers with latest predictions and feedback - only essential fields
-        query = """
-            SELECT 
-                c.customer_id,
-                c.first_name,
-                c.last_name,
-                c.email,
-                c.contract,
-                c.monthly_charges,
-                c.total_charges,
-                p.churn_label,
-                p.created_at as prediction_date,
-                f.sent_at as notified_date,
-                f.answered_at as feedback_date,
-                f.answer as feedback_answer
-            FROM customers c
-            LEFT JOIN LATERAL (
-                SELECT churn_label, created_at
-                FROM predictions
-                WHERE customer_id = c.customer_id
-                ORDER BY created_at DESC
-                LIMIT 1
-            ) p ON true
-            LEFT JOIN LATERAL (
-                SELECT sent_at, answered_at, answer
-                FROM feedback
-                WHERE prediction_id IN (
-                    SELECT prediction_id 
-                    FROM predictions 
-                    WHERE customer_id = c.customer_id 
-                    ORDER BY created_at DESC 
-                    LIMIT 1
-                )
-                ORDER BY answered_at DESC
-                LIMIT 1
-            ) f ON true
-            ORDER BY c.customer_id;
-        """
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        
-        # Get column names
-        columns = [desc[0] for desc in cursor.description]
-        
-        # Convert rows to list of dicts
-        customers = []
-        for row in rows:
-            data = dict(zip(columns, row))
-            
-            # Convert Decimal to float for JSON serialization
-            for k, v in list(data.items()):
-                if isinstance(v, Decimal):
-                    data[k] = float(v)
-            
-            customers.append(data)
+        sql, params, fields = _customer_list_query(fields, filters, after, limit + 1)
+        with get_pooled_connection() as connection, connection.cursor() as cursor:
+            psycopg2.extensions.register_type(_DECIMAL_AS_FLOAT, cursor)
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
 
-        return customers
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1][fields.index("customer_id")]
+        return [dict(zip(fields, row)) for row in rows], next_cursor
 
     except Exception as e:
         print(f"Error fetching customers: {e}")
         raise
 
-    finally:
-        if connection:
-            cursor.close()
-            connection.close()
 
+@timed(db_query_duration, query="fetch_customers")
+async def fetch_customers_async(fields: list[str] | None = None, filters: dict | None = None,
+                                after: str | None = None, limit: int = 500):
+    """Async fetch_customers, on the async pool. Returns (customers, next_cursor)."""
+    try:
+        sql, params, fields = _customer_list_query(fields, filters, after, limit + 1)
+        async with get_async_connection() as connection, connection.cursor() as cursor:
+            await cursor.execute(sql, params)
+            rows = await cursor.fetchall()
 
-def fetch_customer_by_id(customer_id: str):
-    """Fetch a single customer by their ID and return a dict keyed by column names."""
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1][fields.index("customer_id")]
+        return [dict(zip(fields, row)) for row in rows], next_cursor
+
+    except Exception as e:
+        print(f"Error fetching customers: {e}")
+        raise
+
+
+def stream_customers(fields: list[str] | None = None, filters: dict | None = None, chunk_size: int = 2000):
+    """
+    Yield lists of customer dicts read through a server-side cursor, `chunk_size` rows at a time,
+    so the full table is never held in memory. Unknown fields raise ValueError before any query runs.
+    """
+    sql, params, fields = _customer_list_query(fields, filters, None, None)
+
+    def chunks():
+        with get_pooled_connection() as connection:
+            # Named cursors live in a transaction; the pool rolls it back on check-in
+            with connection.cursor(name=f"customers_{uuid4().hex}") as cursor:
+                psycopg2.extensions.register_type(_DECIMAL_AS_FLOAT, cursor)
+                cursor.itersize = chunk_size
+                cursor.execute(sql, params)
+                chunk_duration = db_query_duration.labels(query="stream_customers")
+                while True:
+                    start = time.perf_counter()
+                    rows = cursor.fetchmany(chunk_size)
+                    chunk_duration.observe(time.perf_counter() - start)
+                    if not rows:
+                        break
+                    yield [dict(zip(fields, row)) for row in rows]
+
+    return chunks()
+
+
+_LATEST_PREDICTION_SQL = """
+    SELECT 
+        prediction_id,
+        churn_score, 
+        churn_label, 
+        created_at,
+        feedback_id,
+        feedback_answer,
+        used_for_training,
+        answered_at
+    FROM latest_predictions
+    WHERE customer_id = %s
+"""
+
+
+def _customer_detail(data: dict, prediction_row) -> dict:
+    """Shape a customers row plus its latest prediction for /customers/{id}."""
     from decimal import Decimal
 
-    connection = None
+    # Map notified_date to notified for frontend compatibility
+    if 'notified_date' in data and 'notified' not in data:
+        data['notified'] = data.get('notified_date', False)
+
+    # Ensure status has a default value if None
+    if data.get('status') is None or data.get('status') == '':
+        data['status'] = 'not_notified'
+
+    # Ensure JSON-serializable types (e.g., Decimal -> float)
+    for k, v in list(data.items()):
+        if isinstance(v, Decimal):
+            data[k] = float(v)
+
+    if prediction_row:
+        data['prediction_id'] = prediction_row[0]
+        data['churn_probability'] = float(prediction_row[1]) if prediction_row[1] else 0.0
+        data['churn_prediction'] = prediction_row[2]
+        data['prediction_date'] = prediction_row[3].isoformat() if prediction_row[3] else None
+        data['feedback_id'] = prediction_row[4]
+        data['feedback_answer'] = prediction_row[5]
+        data['used_for_training'] = prediction_row[6]
+        data['feedback_date'] = prediction_row[7].isoformat() if prediction_row[7] else None
+    else:
+        data['prediction_id'] = None
+        data['churn_probability'] = 0.0
+        data['churn_prediction'] = False
+        data['prediction_date'] = None
+        data['feedback_id'] = None
+        data['feedback_answer'] = None
+        data['used_for_training'] = None
+        data['feedback_date'] = None
+
+    return data
+
+
+@timed(db_query_duration, query="fetch_customer_by_id")
+def fetch_customer_by_id(customer_id: str):
+    """Fetch a single customer by their ID and return a dict keyed by column names."""
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
+        with get_pooled_connection() as connection, connection.cursor() as cursor:
+            query = "SELECT * FROM customers WHERE customer_id = %s;"
+            cursor.execute(query, (customer_id,))
+            row = cursor.fetchone()
 
-        query = "SELECT * FROM customers WHERE customer_id = %s;"
-        cursor.execute(query, (customer_id,))
-        row = cursor.fetchone()
+            if row is None:
+                return None
 
-        if row is None:
-            return None
+            # Map to dict using column names from cursor.description
+            columns = [desc[0] for desc in cursor.description]
+            data = dict(zip(columns, row))
+
+            # Fetch latest prediction and feedback for this customer
+            cursor.execute(_LATEST_PREDICTION_SQL, (customer_id,))
+            prediction_row = cursor.fetchone()
 
-        # Map to dict using column names from cursor.description
-        columns = [desc[0] for desc in cursor.description]
-        data = dict(zip(columns, row))
+        return _customer_detail(data, prediction_row)
 
-        # Map notified_date to notified for frontend compatibility
-        if 'notified_date' in data and 'notified' not in data:
-            data['notified'] = data.get('notified_date', False)
+    except Exception as e:
+        print(f"Error fetching customer by ID: {e}")
+        raise
 
-        # Ensure status has a default value if None
-        if data.get('status') is None or data.get('status') == '':
-            data['status'] = 'not_notified'
 
-        # Ensure JSON-serializable types (e.g., Decimal -> float)
-        for k, v in list(data.items()):
-            if isinstance(v, Decimal):
-                data[k] = float(v)
+@timed(db_query_duration, query="fetch_customer_by_id")
+async def fetch_customer_by_id_async(customer_id: str):
+    """Async fetch_customer_by_id, on the async pool."""
+    try:
+        async with get_async_connection() as connection, connection.cursor() as cursor:
+            await cursor.execute("SELECT * FROM customers WHERE customer_id = %s", (customer_id,))
+            row = await cursor.fetchone()
 
-        # Fetch latest prediction and feedback for this customer
-        cursor.execute(
-            """
-            SELECT 
-                p.prediction_id,
-                p.churn_score, 
-                p.churn_label, 
-                p.created_at,
-                f.feedback_id,
-                f.answer,
-                f.used_for_training,
-                f.answered_at
-            FROM predictions p
-            LEFT JOIN feedback f ON f.prediction_id = p.prediction_id
-            WHERE p.customer_id = %s 
-            ORDER BY p.created_at DESC 
-            LIMIT 1
-            """,
-            (customer_id,)
-        )
-        prediction_row = cursor.fetchone()
-        
-        if prediction_row:
-            data['prediction_id'] = prediction_row[0]
-            data['churn_probability'] = float(prediction_row[1]) if prediction_row[1] else 0.0
-            data['churn_prediction'] = prediction_row[2]
-            data['prediction_date'] = prediction_row[3].isoformat() if prediction_row[3] else None
-            data['feedback_id'] = prediction_row[4]
-            data['feedback_answer'] = prediction_row[5]
-            data['used_for_training'] = prediction_row[6]
-            data['feedback_date'] = prediction_row[7].isoformat() if prediction_row[7] else None
-        else:
-            data['prediction_id'] = None
-            data['churn_probability'] = 0.0
-            data['churn_prediction'] = False
-            data['prediction_date'] = None
-            data['feedback_id'] = None
-            data['feedback_answer'] = None
-            data['used_for_training'] = None
-            data['feedback_date'] = None
-
-        return data
+            if row is None:
+                return None
+
+            columns = [desc[0] for desc in cursor.description]
+            data = dict(zip(columns, row))
+
+            await cursor.execute(_LATEST_PREDICTION_SQL, (customer_id,))
+            prediction_row = await cursor.fetchone()
+
+        return _customer_detail(data, prediction_row)
 
     except Exception as e:
         print(f"Error fetching customer by ID: {e}")
         raise
 
-    finally:
-        if connection:
-            cursor.close()
-            connection.close()
 
+FEATURE_COLUMNS = [
+    "email", "gender", "senior_citizen", "partner", "dependents", "tenure",
+    "phone_service", "multiple_lines", "internet_service",
+    "online_security", "online_backup", "device_protection", "tech_support",
+    "streaming_tv", "streaming_movies", "contract", "paperless_billing",
+    "payment_method", "monthly_charges", "total_charges",
+]
 
+_FEATURE_SELECT = ", ".join(FEATURE_COLUMNS)
+
+
+def _row_to_features(customer_id: str, row) -> dict:
+    features = {"customer_id": customer_id, **dict(zip(FEATURE_COLUMNS, row))}
+    for k in ("monthly_charges", "total_charges"):
+        if features[k] is not None:
+            features[k] = float(features[k])
+    return features
+
+
+@timed(db_query_duration, query="fetch_customer_features")
 def fetch_customer_features(conn, customer_id: str) -> dict | None:
     with conn.cursor() as cur:
         cur.execute(
-            """
-            SELECT email, gender, senior_citizen, partner, dependents, tenure,
-                   phone_service, multiple_lines, internet_service,
-                   online_security, online_backup, device_protection, tech_support,
-                   streaming_tv, streaming_movies, contract, paperless_billing,
-                   payment_method, monthly_charges, total_charges
-            FROM customers
-            WHERE customer_id = %s
-            """,
+            f"SELECT {_FEATURE_SELECT} FROM customers WHERE customer_id = %s",
             (customer_id,)
         )
         row = cur.fetchone()
         if row is None:
             return None
 
-        return {
-            "customer_id": customer_id,
-            "email": row[0],
-            "gender": row[1],
-            "senior_citizen": row[2],
-            "partner": row[3],
-            "dependents": row[4],
-            "tenure": row[5],
-            "phone_service": row[6],
-            "multiple_lines": row[7],
-            "internet_service": row[8],
-            "online_security": row[9],
-            "online_backup": row[10],
-            "device_protection": row[11],
-            "tech_support": row[12],
-            "streaming_tv": row[13],
-            "streaming_movies": row[14],
-            "contract": row[15],
-            "paperless_billing": row[16],
-            "payment_method": row[17],
-            "monthly_charges": float(row[18]) if row[18] is not None else None,
-            "total_charges": float(row[19]) if row[19] is not None else None,
-        }
+        return _row_to_features(customer_id, row)
+
+
+@timed(db_query_duration, query="fetch_customers_features")
+def fetch_customers_features(conn, customer_ids: list[str]) -> dict[str, dict]:
+    """
+    Fetch the model features of many customers in a single query.
+    Returns {customer_id: features}; ids that do not exist are simply absent.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            f"SELECT customer_id, {_FEATURE_SELECT} FROM customers WHERE customer_id = ANY(%s)",
+            (list(customer_ids),)
+        )
+        return {row[0]: _row_to_features(row[0], row[1:]) for row in cur.fetchall()}
+
+
+@timed(db_query_duration, query="fetch_customer_features")
+async def fetch_customer_features_async(conn, customer_id: str) -> dict | None:
+    async with conn.cursor() as cur:
+        await cur.execute(
+            f"SELECT {_FEATURE_SELECT} FROM customers WHERE customer_id = %s",
+            (customer_id,)
+        )
+        row = await cur.fetchone()
+        if row is None:
+            return None
+
+        return _row_to_features(customer_id, row)
+
+
+@timed(db_query_duration, query="fetch_customers_features")
+async def fetch_customers_features_async(conn, customer_ids: list[str]) -> dict[str, dict]:
+    """Async fetch_customers_features."""
+    async with conn.cursor() as cur:
+        await cur.execute(
+            f"SELECT customer_id, {_FEATURE_SELECT} FROM customers WHERE customer_id = ANY(%s)",
+            (list(customer_ids),)
+        )
+        return {row[0]: _row_to_features(row[0], row[1:]) for row in await cur.fetchall()}
+
+
+@timed(db_query_duration, query="fetch_dashboard_stats")
+def fetch_dashboard_stats():
+    """
+    Headline dashboard statistics:
+    - Churn percentage (customers with churn_label=True / total with predictions)
+    - Total customers
+    - Notified customers count
+    - At-risk customers (high churn probability)
+    """
+    with get_pooled_connection() as conn, conn.cursor() as cur:
+        # Total customers
+        cur.execute("SELECT COUNT(*) FROM customers")
+        total_customers = cur.fetchone()[0]
+
+        # Customers with predictions, churn count and at-risk customers (churn_score >= 0.7),
+        # all from the latest prediction per customer
+        cur.execute("""
+            SELECT
+                COUNT(*),
+                COUNT(*) FILTER (WHERE churn_label = true),
+                COUNT(*) FILTER (WHERE churn_score >= 0.7)
+            FROM latest_predictions
+        """)
+        customers_with_predictions, churn_count, at_risk_count = cur.fetchone()
+
+        # Churn percentage
+        churn_percentage = (churn_count / customers_with_predictions * 100) if customers_with_predictions > 0 else 0
+
+        # Notified customers (have feedback entry with sent_at)
+        cur.execute("""
+            SELECT COUNT(DISTINCT p.customer_id) 
+            FROM feedback f
+            JOIN predictions p ON f.prediction_id = p.prediction_id
+            WHERE f.sent_at IS NOT NULL
+        """)
+        notified_count = cur.fetchone()[0]
+
+        # Feedback response rate
+        cur.execute("""
+            SELECT 
+                COUNT(*) FILTER (WHERE answered_at IS NOT NULL) as responded,
+                COUNT(*) as total
+            FROM feedback
+            WHERE sent_at IS NOT NULL
+        """)
+        feedback_responded, feedback_total = cur.fetchone()
+        response_rate = (feedback_responded / feedback_total * 100) if feedback_total > 0 else 0
+
+    return {
+        "total_customers": total_customers,
+        "churn_percentage": round(churn_percentage, 1),
+        "churn_count": churn_count,
+        "notified_count": notified_count,
+        "at_risk_count": at_risk_count,
+        "response_rate": round(response_rate, 1),
+        "customers_with_predictions": customers_with_predictions
+    }
+
+
+@timed(db_query_duration, query="fetch_daily_prediction_counts")
+def fetch_daily_prediction_counts():
+    """
+    Per-day prediction and churn counts from the `prediction_daily_stats` rollup,
+    plus the database's current date so callers can cut any window from it.
+    """
+    with get_pooled_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT CURRENT_DATE")
+        today = cur.fetchone()[0]
+        cur.execute("""
+            SELECT day, SUM(churn_predictions), SUM(total_predictions)
+            FROM prediction_daily_stats
+            GROUP BY day
+            ORDER BY day ASC
+        """)
+        rows = cur.fetchall()
+
+    return {
+        "today": today.isoformat(),
+        "days": [{"date": day.isoformat(), "churn": int(churn), "total": int(total)} for day, churn, total in rows],
+    }
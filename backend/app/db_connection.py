@@ -1,7 +1,15 @@
 import os
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import ThreadedConnectionPool
 from dotenv import load_dotenv
 
+from app.metrics import db_connection_wait
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -12,10 +20,202 @@ RDS_DB_NAME = os.getenv("RDS_DB_NAME")
 RDS_USER = os.getenv("RDS_USER")
 RDS_PASSWORD = os.getenv("RDS_PASSWORD")
 
+# Connection pool parameters
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 1))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))  # seconds to wait for a free connection
+DB_POOL_IDLE_CHECK_SECONDS = float(os.getenv("DB_POOL_IDLE_CHECK_SECONDS", 30))  # ping connections idle longer than this
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 30000))
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes free within DB_POOL_TIMEOUT."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe psycopg2 pool with bounded waiting and health-checked checkout.
+
+    psycopg2's ThreadedConnectionPool raises as soon as it is exhausted, so
+    checkouts first take a slot from a semaphore sized to `maxconn`, which is
+    where callers wait (and where the wait time is measured).
+    """
+
+    def __init__(self, minconn: int, maxconn: int, timeout: float,
+                 idle_check_seconds: float, statement_timeout_ms: int):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.idle_check_seconds = idle_check_seconds
+        self._pool = ThreadedConnectionPool(
+            minconn,
+            maxconn,
+            host=RDS_HOST,
+            port=RDS_PORT,
+            database=RDS_DB_NAME,
+            user=RDS_USER,
+            password=RDS_PASSWORD,
+            options=f"-c statement_timeout={statement_timeout_ms}",
+        )
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used = {}
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "checkouts": 0,
+            "checkout_timeouts": 0,
+            "in_use": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "discarded_connections": 0,
+        }
+
+    @contextmanager
+    def connection(self):
+        """
+        Check out a connection for the duration of the `with` block.
+        Uncommitted work is rolled back when the connection is returned.
+        """
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            self._record(checkout_timeouts=1)
+            raise PoolTimeoutError(f"No database connection available after {self.timeout}s")
+        wait = time.perf_counter() - start
+
+        try:
+            conn = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+        self._record(checkouts=1, in_use=1, wait=wait)
+        db_connection_wait.labels(pool="sync").observe(wait)
+
+        try:
+            yield conn
+        finally:
+            self._checkin(conn)
+            self._record(in_use=-1)
+            self._slots.release()
+
+    def _checkout(self):
+        conn = self._pool.getconn()
+        if not self._is_healthy(conn):
+            self._discard(conn)
+            conn = self._pool.getconn()
+        return conn
+
+    def _checkin(self, conn):
+        if conn.closed:
+            self._discard(conn)
+            return
+        try:
+            if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if conn.autocommit:
+                conn.autocommit = False
+        except psycopg2.Error:
+            self._discard(conn)
+            return
+        self._last_used[id(conn)] = time.monotonic()
+        self._pool.putconn(conn)
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        # Only pay a round trip for connections that sat idle long enough to be dropped server-side
+        last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used < self.idle_check_seconds:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        self._last_used.pop(id(conn), None)
+        self._pool.putconn(conn, close=True)
+        self._record(discarded_connections=1)
+
+    def _record(self, checkouts=0, checkout_timeouts=0, in_use=0, wait=None, discarded_connections=0):
+        with self._stats_lock:
+            self._stats["checkouts"] += checkouts
+            self._stats["checkout_timeouts"] += checkout_timeouts
+            self._stats["in_use"] += in_use
+            self._stats["discarded_connections"] += discarded_connections
+            if wait is not None:
+                self._stats["wait_seconds_total"] += wait
+                self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], wait)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        checkouts = stats["checkouts"]
+        stats["wait_seconds_avg"] = stats["wait_seconds_total"] / checkouts if checkouts else 0.0
+        stats["min_size"] = self.minconn
+        stats["max_size"] = self.maxconn
+        return stats
+
+    def close(self):
+        self._pool.closeall()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def init_pool() -> ConnectionPool:
+    """Create the process-wide pool (called at FastAPI startup, or lazily on first checkout)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            print(f"Creating database pool (min={DB_POOL_MIN_SIZE}, max={DB_POOL_MAX_SIZE})")
+            _pool = ConnectionPool(
+                DB_POOL_MIN_SIZE,
+                DB_POOL_MAX_SIZE,
+                DB_POOL_TIMEOUT,
+                DB_POOL_IDLE_CHECK_SECONDS,
+                DB_STATEMENT_TIMEOUT_MS,
+            )
+        return _pool
+
+
+def close_pool():
+    """Close every pooled connection (called at FastAPI shutdown)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+@contextmanager
+def get_pooled_connection():
+    """
+    Borrow a connection from the pool:
+
+        with get_pooled_connection() as conn:
+            with conn.cursor() as cur:
+                ...
+            conn.commit()
+    """
+    pool = _pool or init_pool()
+    with pool.connection() as conn:
+        yield conn
+
+
+def get_pool_stats() -> dict:
+    """Checkout and wait-time counters of the pool, empty if it was never created."""
+    pool = _pool
+    return pool.stats() if pool is not None else {}
+
+
 def get_db_connection():
-    """Establish and return a database connection."""
+    """Establish and return a dedicated (non-pooled) database connection."""
     try:
-        print('Establishing database connection...')
         connection = psycopg2.connect(
             host=RDS_HOST,
             port=RDS_PORT,
@@ -69,3 +269,168 @@ def ensure_customers_table(conn):
             )
             """
         )
+
+def ensure_notification_tables(conn):
+    """Create the tables tracking /notify jobs and per-customer delivery status."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS notification_jobs (
+                job_id          UUID PRIMARY KEY,
+                status          TEXT NOT NULL DEFAULT 'queued',   -- queued | running | completed | failed
+                total           INTEGER NOT NULL,
+                created_at      TIMESTAMPTZ NOT NULL DEFAULT now(),
+                started_at      TIMESTAMPTZ,
+                finished_at     TIMESTAMPTZ,
+                owner           TEXT,           -- dispatcher process holding the job
+                lease_until     TIMESTAMPTZ     -- renewed by the owner; once past, another process may claim it
+            );
+
+            ALTER TABLE notification_jobs
+                ADD COLUMN IF NOT EXISTS owner        TEXT,
+                ADD COLUMN IF NOT EXISTS lease_until  TIMESTAMPTZ;
+
+            CREATE TABLE IF NOT EXISTS notification_job_items (
+                job_id          UUID NOT NULL REFERENCES notification_jobs(job_id) ON DELETE CASCADE,
+                customer_id     TEXT NOT NULL,
+                status          TEXT NOT NULL DEFAULT 'pending',  -- pending | sent | failed
+                prediction_id   BIGINT,
+                attempts        INTEGER NOT NULL DEFAULT 0,
+                error           TEXT,
+                updated_at      TIMESTAMPTZ NOT NULL DEFAULT now(),
+                PRIMARY KEY (job_id, customer_id)
+            );
+            """
+        )
+
+def ensure_latest_predictions_table(conn) -> bool:
+    """
+    Create the `latest_predictions` projection (one row per customer) if it does not exist.
+    Feedback rows are written by n8n as well as by the API, so a trigger on `feedback`
+    keeps the projection's feedback columns in sync.
+    Returns True when the table was just created and still needs a backfill.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('latest_predictions') IS NULL")
+        created = cur.fetchone()[0]
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS latest_predictions (
+                customer_id         TEXT PRIMARY KEY,
+                prediction_id       BIGINT NOT NULL,
+                churn_score         DOUBLE PRECISION NOT NULL,
+                churn_label         BOOLEAN NOT NULL,
+                token               TEXT,
+                model_version       TEXT,
+                created_at          TIMESTAMPTZ NOT NULL,
+                feedback_id         BIGINT,
+                notified_at         TIMESTAMPTZ,
+                feedback_answer     TEXT,
+                answered_at         TIMESTAMPTZ,
+                used_for_training   BOOLEAN
+            );
+
+            CREATE INDEX IF NOT EXISTS latest_predictions_prediction_id_idx ON latest_predictions (prediction_id);
+            CREATE INDEX IF NOT EXISTS latest_predictions_churn_label_idx ON latest_predictions (churn_label);
+            CREATE INDEX IF NOT EXISTS latest_predictions_churn_score_idx ON latest_predictions (churn_score);
+
+            CREATE OR REPLACE FUNCTION sync_latest_prediction_feedback() RETURNS trigger AS $$
+            BEGIN
+                UPDATE latest_predictions
+                SET feedback_id = NEW.feedback_id,
+                    notified_at = NEW.sent_at,
+                    feedback_answer = NEW.answer,
+                    answered_at = NEW.answered_at,
+                    used_for_training = NEW.used_for_training
+                WHERE prediction_id = NEW.prediction_id;
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'feedback_sync_latest_prediction') THEN
+                    CREATE TRIGGER feedback_sync_latest_prediction
+                    AFTER INSERT OR UPDATE ON feedback
+                    FOR EACH ROW EXECUTE FUNCTION sync_latest_prediction_feedback();
+                END IF;
+            END
+            $$;
+            """
+        )
+    return created
+
+def ensure_prediction_daily_stats_table(conn) -> bool:
+    """
+    Create the per-day prediction counters behind /dashboard/churn-over-time.
+    Each connection increments its own shard of the day so concurrent writers do not queue on one row.
+    Returns True when the table was just created and still needs a backfill.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('prediction_daily_stats') IS NULL")
+        created = cur.fetchone()[0]
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS prediction_daily_stats (
+                day                 DATE NOT NULL,
+                shard               SMALLINT NOT NULL DEFAULT 0,
+                total_predictions   BIGINT NOT NULL DEFAULT 0,
+                churn_predictions   BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, shard)
+            )
+            """
+        )
+    return created
+
+
+def ensure_training_tables(conn):
+    """
+    Create `trained_models`/`training_runs` if needed and add the columns the
+    retraining engine records (model version, rows used, wall time, metrics)
+    and the promoted artifact every replica serves (bytes, sha256, promoted_at).
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS trained_models (
+                model_version     TEXT PRIMARY KEY,
+                training_reason   TEXT NOT NULL,
+                status            TEXT NOT NULL DEFAULT 'running',
+                started_at        TIMESTAMPTZ NOT NULL DEFAULT now(),
+                ended_at          TIMESTAMPTZ,
+                notes             TEXT
+            )
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS training_runs (
+                run_id      BIGSERIAL PRIMARY KEY,
+                reason      TEXT NOT NULL,
+                status      TEXT NOT NULL DEFAULT 'started',
+                started_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
+                ended_at    TIMESTAMPTZ,
+                notes       TEXT
+            )
+            """
+        )
+        cur.execute(
+            """
+            ALTER TABLE trained_models
+                ADD COLUMN IF NOT EXISTS artifact           BYTEA,
+                ADD COLUMN IF NOT EXISTS artifact_sha256    TEXT,
+                ADD COLUMN IF NOT EXISTS promoted_at        TIMESTAMPTZ
+            """
+        )
+        cur.execute(
+            """
+            ALTER TABLE training_runs
+                ADD COLUMN IF NOT EXISTS model_version      TEXT,
+                ADD COLUMN IF NOT EXISTS promoted           BOOLEAN,
+                ADD COLUMN IF NOT EXISTS rows_used          INTEGER,
+                ADD COLUMN IF NOT EXISTS feedback_rows      INTEGER,
+                ADD COLUMN IF NOT EXISTS wall_time_seconds  DOUBLE PRECISION,
+                ADD COLUMN IF NOT EXISTS metrics            JSONB,
+                ADD COLUMN IF NOT EXISTS metric_deltas      JSONB
+            """
+        )
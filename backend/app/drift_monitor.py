@@ -0,0 +1,335 @@
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+
+from prometheus_client import Gauge
+
+from app.db_connection import get_pooled_connection
+from app.model import get_active_model
+from config import (
+    DRIFT_BUCKET_SECONDS,
+    DRIFT_WINDOWS_SECONDS,
+    DRIFT_MIN_SAMPLES,
+    DRIFT_PUBLISH_SECONDS,
+    DRIFT_PROFILE_DIR,
+    TRAINING_REFERENCE_TABLE,
+)
+
+# Raw model inputs, as stored in predictions.features_json
+NUMERIC_FEATURES = ["tenure", "monthly_charges", "total_charges"]
+CATEGORICAL_FEATURES = [
+    "gender", "senior_citizen", "partner", "dependents", "phone_service", "multiple_lines",
+    "internet_service", "online_security", "online_backup", "device_protection", "tech_support",
+    "streaming_tv", "streaming_movies", "contract", "paperless_billing", "payment_method",
+]
+
+# Reference quantiles used as the fixed bin edges of numeric features (20 bins)
+BIN_QUANTILES = [i / 20 for i in range(21)]
+# Distinct values counted per feature and bucket; the rest share one "other" slot
+MAX_CATEGORIES = 64
+OTHER = "__other__"
+# Proportions are floored at this value so PSI stays finite on empty bins
+PSI_EPSILON = 1e-4
+
+feature_psi = Gauge("feature_drift_psi", "Population stability index of a model input vs the reference",
+                    ["feature", "window"])
+feature_js = Gauge("feature_drift_jensenshannon", "Jensen-Shannon distance of a model input vs the reference",
+                   ["feature", "window"])
+window_samples = Gauge("feature_drift_window_predictions", "Predictions in the drift window", ["window"])
+
+
+def category_key(value) -> str:
+    # Same text as Postgres' value::text, so reference and live counts line up
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+# > Reference profile
+
+def build_reference_profile(conn, table: str) -> dict:
+    """
+    Profile of the reference rows, computed in SQL: quantile bin edges and bin
+    counts for numeric features, value counts for categorical ones.
+    """
+    columns = {}
+    with conn.cursor() as cur:
+        cur.execute(f'SELECT COUNT(*) FROM "{table}" WHERE churn IS NOT NULL')
+        rows = cur.fetchone()[0]
+        for feature in NUMERIC_FEATURES:
+            cur.execute(
+                f'SELECT percentile_cont(%s::float8[]) WITHIN GROUP (ORDER BY "{feature}"::float8) '
+                f'FROM "{table}" WHERE churn IS NOT NULL AND "{feature}" IS NOT NULL',
+                (BIN_QUANTILES,),
+            )
+            quantiles = cur.fetchone()[0]
+            if not quantiles:
+                continue
+            edges = sorted(set(quantiles))
+            inner = edges[1:-1]
+            cur.execute(
+                f'SELECT width_bucket("{feature}"::float8, %s::float8[]), COUNT(*) FROM "{table}" '
+                f'WHERE churn IS NOT NULL AND "{feature}" IS NOT NULL GROUP BY 1',
+                (inner or [edges[0]],),
+            )
+            counts = [0] * max(len(edges) - 1, 1)
+            for bucket, count in cur.fetchall():
+                counts[min(bucket, len(counts) - 1)] += count
+            columns[feature] = {"kind": "numerical", "bin_edges": edges, "bin_counts": counts}
+        for feature in CATEGORICAL_FEATURES:
+            cur.execute(
+                f'SELECT "{feature}"::text, COUNT(*) FROM "{table}" '
+                f'WHERE churn IS NOT NULL AND "{feature}" IS NOT NULL GROUP BY 1'
+            )
+            columns[feature] = {"kind": "categorical", "frequencies": dict(cur.fetchall())}
+    return {"rows": rows, "table": table, "columns": columns, "created_at": time.time()}
+
+
+def load_reference_profile(version: str, directory: str = DRIFT_PROFILE_DIR,
+                           table: str = TRAINING_REFERENCE_TABLE) -> dict:
+    """Stored profile of the reference table for a model version, built and saved on first use."""
+    path = os.path.join(directory, f"reference_{table}_{version}.json")
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    with get_pooled_connection() as conn:
+        profile = build_reference_profile(conn, table)
+        conn.rollback()
+    profile["model_version"] = version
+    os.makedirs(directory, exist_ok=True)
+    with open(path + ".partial", "w") as f:
+        json.dump(profile, f)
+    os.replace(path + ".partial", path)
+    print(f"[DRIFT] Reference profile of {table} ({profile['rows']} rows) saved to {path}")
+    return profile
+
+
+# > Drift measures
+
+def _proportions(counts: list) -> list:
+    total = sum(counts)
+    return [max(c / total, PSI_EPSILON) for c in counts]
+
+
+def psi(reference: list, current: list) -> float:
+    ref, cur = _proportions(reference), _proportions(current)
+    return sum((c - r) * math.log(c / r) for r, c in zip(ref, cur))
+
+
+def jensenshannon(reference: list, current: list) -> float:
+    """Jensen-Shannon distance (natural log), as scipy.spatial.distance.jensenshannon."""
+    ref_total, cur_total = sum(reference), sum(current)
+    ref = [c / ref_total for c in reference]
+    cur = [c / cur_total for c in current]
+    divergence = 0.0
+    for r, c in zip(ref, cur):
+        m = (r + c) / 2
+        if r:
+            divergence += r * math.log(r / m) / 2
+        if c:
+            divergence += c * math.log(c / m) / 2
+    return math.sqrt(max(divergence, 0.0))
+
+
+# > Live histograms
+
+class WindowBucket:
+    """Counts of one time bucket: bin counts per numeric feature, value counts per categorical one."""
+
+    __slots__ = ("start", "count", "numeric", "categorical")
+
+    def __init__(self, start: int, bins: dict):
+        self.start = start
+        self.count = 0
+        self.numeric = {feature: [0] * (len(inner) + 1) for feature, inner in bins.items()}
+        self.categorical = {feature: {} for feature in CATEGORICAL_FEATURES}
+
+
+class DriftMonitor:
+    """
+    Online drift of the model inputs against the reference profile.
+
+    Every written prediction adds its features to the current time bucket
+    (one bin lookup or dict increment per feature). A window is the sum of
+    its buckets; PSI and Jensen-Shannon distance against the reference are
+    computed on demand and published as Prometheus gauges.
+    """
+
+    def __init__(self, bucket_seconds: float, windows: list[float], min_samples: int, publish_seconds: float):
+        self.bucket_seconds = max(bucket_seconds, 1)
+        self.windows = sorted(windows)
+        self.min_samples = min_samples
+        self.publish_seconds = publish_seconds
+        self.max_buckets = max(math.ceil(self.windows[-1] / self.bucket_seconds), 1) if self.windows else 1
+        self.profile = None
+        self._bins = {}  # numeric feature -> inner bin edges of the reference
+        self._buckets = deque()
+        self._lock = threading.Lock()
+        self._task = None
+        self.observed = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.windows)
+
+    async def start(self):
+        if not self.enabled:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def set_profile(self, profile: dict):
+        """Use a new reference profile; live counts restart since bin edges may differ."""
+        bins = {
+            feature: column["bin_edges"][1:-1]
+            for feature, column in profile["columns"].items()
+            if column["kind"] == "numerical"
+        }
+        with self._lock:
+            self.profile = profile
+            self._bins = bins
+            self._buckets.clear()
+
+    def observe_many(self, features_list):
+        """Add written predictions' features to the current bucket."""
+        if self.profile is None:
+            return
+        bucket_start = int(time.time() // self.bucket_seconds)
+        with self._lock:
+            bucket = self._current_bucket(bucket_start)
+            for features in features_list:
+                bucket.count += 1
+                for feature, inner in self._bins.items():
+                    value = features.get(feature)
+                    if value is not None:
+                        bucket.numeric[feature][bisect_right(inner, float(value))] += 1
+                for feature, counts in bucket.categorical.items():
+                    value = features.get(feature)
+                    if value is None:
+                        continue
+                    key = category_key(value)
+                    if key not in counts and len(counts) >= MAX_CATEGORIES:
+                        key = OTHER
+                    counts[key] = counts.get(key, 0) + 1
+            self.observed += len(features_list)
+
+    def _current_bucket(self, bucket_start: int) -> WindowBucket:
+        if not self._buckets or self._buckets[-1].start != bucket_start:
+            self._buckets.append(WindowBucket(bucket_start, self._bins))
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popleft()
+        return self._buckets[-1]
+
+    def _merge(self, window: float) -> WindowBucket:
+        """Sum of the buckets that fall in the last `window` seconds."""
+        oldest = int(time.time() // self.bucket_seconds) - math.ceil(window / self.bucket_seconds) + 1
+        merged = WindowBucket(oldest, self._bins)
+        with self._lock:
+            for bucket in self._buckets:
+                if bucket.start < oldest:
+                    continue
+                merged.count += bucket.count
+                for feature, counts in bucket.numeric.items():
+                    total = merged.numeric[feature]
+                    for i, count in enumerate(counts):
+                        total[i] += count
+                for feature, counts in bucket.categorical.items():
+                    total = merged.categorical[feature]
+                    for key, count in counts.items():
+                        total[key] = total.get(key, 0) + count
+        return merged
+
+    def drift(self, window: float) -> dict:
+        """PSI and Jensen-Shannon distance per feature over the last `window` seconds."""
+        profile = self.profile
+        if profile is None:
+            return {"window": window_label(window), "predictions": 0, "features": {}}
+        merged = self._merge(window)
+        features = {}
+        for feature, column in profile["columns"].items():
+            if column["kind"] == "numerical":
+                reference, current = column["bin_counts"], merged.numeric[feature]
+            else:
+                keys = sorted(set(column["frequencies"]) | set(merged.categorical[feature]))
+                reference = [column["frequencies"].get(k, 0) for k in keys]
+                current = [merged.categorical[feature].get(k, 0) for k in keys]
+            samples = sum(current)
+            if samples < self.min_samples or not sum(reference):
+                features[feature] = {"samples": samples, "psi": None, "jensenshannon": None}
+                continue
+            features[feature] = {
+                "samples": samples,
+                "psi": psi(reference, current),
+                "jensenshannon": jensenshannon(reference, current),
+            }
+        return {"window": window_label(window), "predictions": merged.count, "features": features}
+
+    def publish(self):
+        for window in self.windows:
+            result = self.drift(window)
+            window_samples.labels(window=result["window"]).set(result["predictions"])
+            for feature, scores in result["features"].items():
+                feature_psi.labels(feature=feature, window=result["window"]).set(
+                    scores["psi"] if scores["psi"] is not None else float("nan"))
+                feature_js.labels(feature=feature, window=result["window"]).set(
+                    scores["jensenshannon"] if scores["jensenshannon"] is not None else float("nan"))
+
+    async def _refresh_profile(self):
+        """Load the reference profile of the active model; counts restart when the model changes."""
+        version = get_active_model().version
+        if self.profile is not None and self.profile.get("model_version") == version:
+            return
+        profile = await asyncio.to_thread(load_reference_profile, version)
+        self.set_profile(profile)
+        print(f"[DRIFT] Monitoring {len(profile['columns'])} features against {profile['table']} "
+              f"(model {version}, {profile['rows']} reference rows)")
+
+    async def _run(self):
+        while True:
+            try:
+                await self._refresh_profile()
+                self.publish()
+            except Exception as e:
+                # DB or model unavailable: the previous profile stays, retried on the next cycle
+                print(f"[DRIFT] Refresh failed: {e}")
+            await asyncio.sleep(self.publish_seconds)
+
+    def stats(self) -> dict:
+        profile = self.profile
+        with self._lock:
+            buckets = len(self._buckets)
+        return {
+            "enabled": self.enabled,
+            "model_version": profile.get("model_version") if profile else None,
+            "reference_rows": profile["rows"] if profile else None,
+            "observed": self.observed,
+            "buckets": buckets,
+            "bucket_seconds": self.bucket_seconds,
+            "windows": [window_label(w) for w in self.windows],
+        }
+
+
+def window_label(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds % 3600 == 0:
+        return f"{seconds // 3600}h"
+    if seconds % 60 == 0:
+        return f"{seconds // 60}m"
+    return f"{seconds}s"
+
+
+monitor = DriftMonitor(DRIFT_BUCKET_SECONDS, DRIFT_WINDOWS_SECONDS, DRIFT_MIN_SAMPLES, DRIFT_PUBLISH_SECONDS)
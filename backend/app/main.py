@@ -1,46 +1,86 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, UploadFile, File
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, BackgroundTasks, UploadFile, File, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from app.schemas import PredictInput, PredictRequest, PredictResponse
-from app.predict import predict_churn
-from app.model import get_model_info
-from app.data_fetch import fetch_customers, fetch_customer_by_id, fetch_customer_features
-from uuid import uuid4
-from app.db_connection import get_db_connection, ensure_customers_table
+from app.predict import predict_churn, predict_churn_async, predict_churn_batch_async, shutdown_scoring_executor
+from app.scoring_batcher import batcher as scoring_batcher
+from app.prediction_cache import prediction_cache
+from app.prediction_store import prepare_prediction_tables
+from app.prediction_writer import writer as prediction_writer
+from app.drift_monitor import monitor as drift_monitor
+from app.metrics import PrometheusMiddleware
+from app.model import get_model_info, get_active_model, registry as model_registry
+from app.data_fetch import (
+    fetch_customers_async,
+    stream_customers,
+    fetch_customer_by_id_async,
+    fetch_customer_features_async,
+    fetch_customers_features_async,
+    fetch_dashboard_stats,
+    fetch_daily_prediction_counts,
+)
+from app.dashboard_cache import dashboard_cache, conditional_json_response
+from app.customer_loader import open_customer_csv, load_customers
+from uuid import UUID, uuid4
+from app.db_connection import get_pooled_connection, ensure_customers_table, init_pool, close_pool, get_pool_stats
+from app.async_db import get_async_connection, init_async_pool, close_async_pool, get_async_pool_stats
 from psycopg2.errors import UniqueViolation
 from psycopg2 import Error as PsycopgError
-from app.schemas import FeedbackRequest, FeedbackResponse, RetrainRequest, CustomerDB
-from app.utils import generate_customer_id
-from app.training import start_retrain
+from app.schemas import FeedbackRequest, FeedbackResponse, RetrainRequest
+from app.training import start_retrain, open_retrain_run, run_retrain, get_training_run, prepare_training_tables
+from app.notifier import dispatcher as notification_dispatcher, get_job as get_notification_job
 import json
-import sys
-from pathlib import Path
-import csv
-import io
-from typing import List, Dict
-import requests
-import time
+from datetime import date, datetime, timedelta
+from typing import List
+import httpx
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 from config import K_RETRAIN, MODEL_PATH, N8N_URL, FRONTEND_URL
- 
-
-# Dynamically add the pipeline directory to Python path
-# For Docker: use the copied pipeline in app/pipeline
-# For local: use ml_pipeline/src/pipeline
-BASE_DIR = Path(__file__).resolve().parent.parent.parent
-APP_PIPELINE_DIR = Path(__file__).resolve().parent / "pipeline"
-ML_PIPELINE_SRC = BASE_DIR / "ml_pipeline" / "src" / "pipeline"
 
-# Add app/pipeline first (for Docker), then ml_pipeline/src/pipeline (for local)
-if APP_PIPELINE_DIR.exists() and str(APP_PIPELINE_DIR) not in sys.path:
-    sys.path.insert(0, str(APP_PIPELINE_DIR))
-    print(f"Added {APP_PIPELINE_DIR} to sys.path")
+# Modules that log (e.g. app.prediction_writer) go to stderr next to uvicorn's own lines
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:     [%(name)s] %(message)s")
 
-if ML_PIPELINE_SRC.exists() and str(ML_PIPELINE_SRC) not in sys.path:
-    sys.path.insert(0, str(ML_PIPELINE_SRC))
-    print(f"Added {ML_PIPELINE_SRC} to sys.path")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the database pool once per worker; the API still starts if the DB is unreachable
+    try:
+        init_pool()
+    except Exception as e:
+        print(f"Database pool not created at startup, will retry on first request: {e}")
+    try:
+        await init_async_pool()
+    except Exception as e:
+        print(f"Async database pool not created at startup, will retry on first request: {e}")
+    try:
+        prepare_prediction_tables()
+    except Exception as e:
+        print(f"Could not prepare prediction tables: {e}")
+    try:
+        prepare_training_tables()
+    except Exception as e:
+        print(f"Could not prepare training tables: {e}")
+    try:
+        model_registry.start()
+    except Exception as e:
+        print(f"Model not loaded at startup, will retry on first request: {e}")
+    await notification_dispatcher.start()
+    await scoring_batcher.start()
+    await prediction_writer.start()
+    await drift_monitor.start()
+    yield
+    await drift_monitor.stop()
+    await scoring_batcher.stop()
+    await prediction_writer.stop()
+    await notification_dispatcher.stop()
+    model_registry.stop()
+    shutdown_scoring_executor()
+    await close_async_pool()
+    close_pool()
 
 # FastAPI app initialization
-app = FastAPI(title="Telco Churn Prediction API")
+app = FastAPI(title="Telco Churn Prediction API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -50,10 +90,54 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(PrometheusMiddleware)
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint: request, DB, scoring and webhook timings (app/metrics.py), drift gauges."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/health/db_pool")
+def db_pool_stats():
+    """Connection pool sizing metrics: checkouts, timeouts and time spent waiting for a connection."""
+    return {**get_pool_stats(), "async": get_async_pool_stats()}
+
+@app.get("/health/scoring_batcher")
+def scoring_batcher_stats():
+    """Micro-batching metrics: batch size distribution and time requests waited before scoring."""
+    return scoring_batcher.stats()
+
+@app.get("/health/prediction_cache")
+def prediction_cache_stats():
+    """Prediction cache metrics: hit rate, evictions, invalidations and memory used."""
+    return prediction_cache.stats()
+
+@app.get("/health/prediction_writer")
+def prediction_writer_stats():
+    """Prediction write path: write-behind queue depth, batches written, synchronous fallbacks, retries."""
+    return prediction_writer.stats()
+
+@app.get("/health/drift_monitor")
+def drift_monitor_stats():
+    """Online drift monitor: reference profile in use, predictions observed, live buckets."""
+    return drift_monitor.stats()
+
+@app.get("/drift")
+def feature_drift(window: float = 3600):
+    """PSI and Jensen-Shannon distance of each model input over the last `window` seconds of predictions."""
+    if drift_monitor.profile is None:
+        raise HTTPException(status_code=503, detail="Reference profile not loaded yet")
+    if window <= 0 or window > drift_monitor.max_buckets * drift_monitor.bucket_seconds:
+        raise HTTPException(
+            status_code=400,
+            detail=f"window must be between 1 and {drift_monitor.max_buckets * drift_monitor.bucket_seconds:.0f} seconds",
+        )
+    return drift_monitor.drift(window)
+
 # > Model Endpoints
 @app.post("/predictpyload", response_model=PredictResponse)
 def predict_payload(payload: PredictRequest):
@@ -62,7 +146,7 @@ def predict_payload(payload: PredictRequest):
     return {"churn_probability": proba}
 
 @app.post("/predict", response_model=PredictResponse)
-def predict(payload: "PredictInput"):
+async def predict(payload: "PredictInput"):
     """
     TODO: make sure to handle two modes: best approach to separate them?
     Mode A: payload = {customer_id} -> fetch features depuis new_customers
@@ -76,11 +160,8 @@ def predict(payload: "PredictInput"):
     if set(data.keys()) == {"customer_id"}:
         customer_id = data["customer_id"]
 
-        conn = get_db_connection()
-        try:
-            features = fetch_customer_features(conn, customer_id)
-        finally:
-            conn.close()
+        async with get_async_connection() as conn:
+            features = await fetch_customer_features_async(conn, customer_id)
 
         if features is None:
             raise HTTPException(status_code=404, detail="customer_id not found in customers") #TODO new_customers or customers??
@@ -97,31 +178,23 @@ def predict(payload: "PredictInput"):
     # model_features = get_model_info()["feature_names"]
     # features = {k: features[k] for k in model_features if k in features}
     print(features)
-    proba = predict_churn(features)
+    active = get_active_model()
+    proba = await scoring_batcher.score(features, active)
     pred = 1 if proba >= 0.5 else 0 # TODO threshold configurable?
 
     # insert predictions (BIGSERIAL prediction_id) + token
-    conn = None
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO predictions (customer_id, churn_score, churn_label, features_json, model_version, token)
-                VALUES (%s, %s, %s, %s::jsonb, %s, %s)
-                RETURNING prediction_id
-                """,
-                (customer_id, float(proba), bool(pred), json.dumps(features), "v1", str(token))
-            )
-            prediction_id = cur.fetchone()[0]
-        conn.commit()
+        prediction_ids = await prediction_writer.write([{
+            "customer_id": customer_id,
+            "churn_score": proba,
+            "churn_label": pred,
+            "model_version": active.version,
+            "features": features,
+            "token": token,
+        }])
+        prediction_id = prediction_ids[str(token)]
     except Exception as e:
-        if conn:
-            conn.rollback()
         raise HTTPException(status_code=500, detail=f"DB insert failed: {e}")
-    finally:
-        if conn:
-            conn.close()
 
     return {
         "prediction_id": prediction_id,
@@ -132,7 +205,7 @@ def predict(payload: "PredictInput"):
     }
 
 @app.post("/predict/batch")
-def predict_batch(payload: dict):
+async def predict_batch(payload: dict):
     """
     Predict churn for multiple customers.
     Expects: { "customer_ids": [id1, id2, ...] }
@@ -144,62 +217,77 @@ def predict_batch(payload: dict):
     
     predictions = []
     failed = []
-    
-    for customer_id in customer_ids:
+
+    # Duplicated ids are scored once
+    customer_ids = list(dict.fromkeys(customer_ids))
+
+    async with get_async_connection() as conn:
+        # 1) one query for every requested customer
         try:
-            # Fetch customer features
-            conn = get_db_connection()
-            try:
-                features = fetch_customer_features(conn, str(customer_id))
-            finally:
-                conn.close()
-            
-            if features is None:
-                failed.append({"customer_id": customer_id, "error": "Customer not found"})
-                continue
-            
-            # Make prediction
-            proba = predict_churn(features)
-            pred = 1 if proba >= 0.5 else 0
-            
-            # Insert into predictions table
-            conn = get_db_connection()
-            token = uuid4()
+            features_by_id = await fetch_customers_features_async(conn, [str(c) for c in customer_ids])
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to fetch customers: {e}")
+
+    found = []
+    for customer_id in customer_ids:
+        features = features_by_id.get(str(customer_id))
+        if features is None:
+            failed.append({"customer_id": customer_id, "error": "Customer not found"})
+        else:
+            found.append((customer_id, features))
+
+    # 2) cached scores first, then one vectorized scoring call for the rest;
+    #    isolate bad rows only if the batch fails
+    active = get_active_model()
+    keys = {customer_id: prediction_cache.key(features, active.version) for customer_id, features in found}
+    cached = {customer_id: prediction_cache.get(keys[customer_id]) for customer_id, _ in found}
+    misses = [(cid, features) for cid, features in found if cached[cid] is None]
+    try:
+        probas = await predict_churn_batch_async([features for _, features in misses], active)
+        if len(probas) != len(misses):
+            raise ValueError(f"{len(probas)} scores for {len(misses)} rows")
+        fresh = dict(zip([cid for cid, _ in misses], probas))
+    except Exception:
+        fresh = {}
+        for customer_id, features in misses:
             try:
-                with conn.cursor() as cur:
-                    cur.execute(
-                        """
-                        INSERT INTO predictions (customer_id, churn_score, churn_label, model_version, features_json, token)
-                        VALUES (%s, %s, %s, %s, %s::jsonb, %s)
-                        RETURNING prediction_id
-                        """,
-                        (
-                            str(customer_id), 
-                            float(proba), 
-                            bool(pred), 
-                            'v1', # MODEL_PATH.split("/")[-1],
-                            json.dumps(features),
-                            str(token)
-                         )
-                    )
-                    prediction_id = cur.fetchone()[0]
-                conn.commit()
-                
-                predictions.append({
-                    "customer_id": customer_id,
-                    "prediction_id": prediction_id,
-                    "churn_probability": float(proba),
-                    "churn_label": bool(pred)
-                })
+                fresh[customer_id] = await predict_churn_async(features, active)
             except Exception as e:
-                conn.rollback()
                 failed.append({"customer_id": customer_id, "error": str(e)})
-            finally:
-                conn.close()
-                
-        except Exception as e:
-            failed.append({"customer_id": customer_id, "error": str(e)})
-    
+    for customer_id, proba in fresh.items():
+        prediction_cache.put(keys[customer_id], customer_id, proba)
+    scored = [
+        (cid, features, cached[cid] if cached[cid] is not None else fresh[cid])
+        for cid, features in found
+        if cached[cid] is not None or cid in fresh
+    ]
+
+    # 3) one multi-row insert (or one write-behind enqueue)
+    records = [
+        {
+            "customer_id": customer_id,
+            "churn_score": proba,
+            "churn_label": proba >= 0.5,
+            "model_version": active.version,
+            "features": features,
+            "token": uuid4(),
+        }
+        for customer_id, features, proba in scored
+    ]
+    try:
+        prediction_ids = await prediction_writer.write(records)
+    except Exception as e:
+        failed.extend({"customer_id": cid, "error": str(e)} for cid, _, _ in scored)
+        records = []
+
+    for (customer_id, _, proba), record in zip(scored, records):
+        predictions.append({
+            "customer_id": customer_id,
+            "prediction_id": prediction_ids[str(record["token"])],
+            "churn_probability": float(proba),
+            "churn_label": bool(record["churn_label"])
+        })
+
     return {
         "message": f"Processed {len(predictions)} predictions, {len(failed)} failed",
         "predictions": predictions,
@@ -207,53 +295,46 @@ def predict_batch(payload: dict):
     }
 
 @app.post("/predict/customer/{customer_id}")
-def predict_customer(customer_id: str):
+async def predict_customer(customer_id: str):
     """
     Predict churn for a single customer by ID.
     Returns: { "customer_id": "...", "prediction_id": ..., "churn_probability": ..., "churn_label": ... }
     """
     try:
-        # Fetch customer features
-        conn = get_db_connection()
-        try:
-            features = fetch_customer_features(conn, customer_id)
-        finally:
-            conn.close()
-        
+        async with get_async_connection() as conn:
+            # Fetch customer features
+            features = await fetch_customer_features_async(conn, customer_id)
+            
         if features is None:
             raise HTTPException(status_code=404, detail="Customer not found")
         
         # Make prediction
-        proba = predict_churn(features)
+        active = get_active_model()
+        proba = await scoring_batcher.score(features, active)
         pred = 1 if proba >= 0.5 else 0
         
         # Insert into predictions table
-        conn = get_db_connection()
+        token = uuid4()
         try:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    INSERT INTO predictions (customer_id, churn_score, churn_label, model_version)
-                    VALUES (%s, %s, %s, %s)
-                    RETURNING prediction_id
-                    """,
-                    (customer_id, float(proba), bool(pred), "v1")
-                )
-                prediction_id = cur.fetchone()[0]
-            conn.commit()
-            
-            return {
-                "message": "Prediction completed successfully",
+            prediction_ids = await prediction_writer.write([{
                 "customer_id": customer_id,
-                "prediction_id": prediction_id,
-                "churn_probability": float(proba),
-                "churn_label": bool(pred)
-            }
+                "churn_score": proba,
+                "churn_label": pred,
+                "model_version": active.version,
+                "features": features,
+                "token": token,
+            }])
+            prediction_id = prediction_ids[str(token)]
         except Exception as e:
-            conn.rollback()
             raise HTTPException(status_code=500, detail=f"Failed to save prediction: {e}")
-        finally:
-            conn.close()
+        
+        return {
+            "message": "Prediction completed successfully",
+            "customer_id": customer_id,
+            "prediction_id": prediction_id,
+            "churn_probability": float(proba),
+            "churn_label": bool(pred)
+        }
             
     except HTTPException:
         raise
@@ -267,145 +348,117 @@ def model_info():
 
 # > Dashboard Endpoints
 @app.get("/dashboard/stats")
-def get_dashboard_stats():
+def get_dashboard_stats(request: Request):
     """
     Return dashboard statistics:
     - Churn percentage (customers with churn_label=True / total with predictions)
     - Total customers
     - Notified customers count
     - At-risk customers (high churn probability)
+    Served from the aggregate cache, with ETag/Last-Modified for revalidation.
     """
-    conn = None
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
-            # Total customers
-            cur.execute("SELECT COUNT(*) FROM customers")
-            total_customers = cur.fetchone()[0]
-
-            # Customers with predictions
-            cur.execute("""
-                SELECT COUNT(DISTINCT customer_id) FROM predictions
-            """)
-            customers_with_predictions = cur.fetchone()[0]
-
-            # Churn count (latest prediction per customer where churn_label is true)
-            cur.execute("""
-                SELECT COUNT(*) FROM (
-                    SELECT DISTINCT ON (customer_id) customer_id, churn_label
-                    FROM predictions
-                    ORDER BY customer_id, created_at DESC
-                ) latest WHERE churn_label = true
-            """)
-            churn_count = cur.fetchone()[0]
-
-            # Churn percentage
-            churn_percentage = (churn_count / customers_with_predictions * 100) if customers_with_predictions > 0 else 0
-
-            # Notified customers (have feedback entry with sent_at)
-            cur.execute("""
-                SELECT COUNT(DISTINCT p.customer_id) 
-                FROM feedback f
-                JOIN predictions p ON f.prediction_id = p.prediction_id
-                WHERE f.sent_at IS NOT NULL
-            """)
-            notified_count = cur.fetchone()[0]
-
-            # At-risk customers (churn_score >= 0.7, latest prediction)
-            cur.execute("""
-                SELECT COUNT(*) FROM (
-                    SELECT DISTINCT ON (customer_id) customer_id, churn_score
-                    FROM predictions
-                    ORDER BY customer_id, created_at DESC
-                ) latest WHERE churn_score >= 0.7
-            """)
-            at_risk_count = cur.fetchone()[0]
-
-            # Feedback response rate
-            cur.execute("""
-                SELECT 
-                    COUNT(*) FILTER (WHERE answered_at IS NOT NULL) as responded,
-                    COUNT(*) as total
-                FROM feedback
-                WHERE sent_at IS NOT NULL
-            """)
-            feedback_row = cur.fetchone()
-            feedback_responded = feedback_row[0]
-            feedback_total = feedback_row[1]
-            response_rate = (feedback_responded / feedback_total * 100) if feedback_total > 0 else 0
-
-            return {
-                "total_customers": total_customers,
-                "churn_percentage": round(churn_percentage, 1),
-                "churn_count": churn_count,
-                "notified_count": notified_count,
-                "at_risk_count": at_risk_count,
-                "response_rate": round(response_rate, 1),
-                "customers_with_predictions": customers_with_predictions
-            }
+        stats, last_modified = dashboard_cache.get("stats", fetch_dashboard_stats)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch dashboard stats: {e}")
-    finally:
-        if conn:
-            conn.close()
+    return conditional_json_response(request, stats, last_modified)
 
 
 @app.get("/dashboard/churn-over-time")
-def get_churn_over_time(days: int = 90):
+def get_churn_over_time(request: Request, days: int = 90):
     """
     Return daily churn prediction counts for the chart.
-    Returns data for the last N days (default 90).
+    Returns data for the last N days (default 90), cut from the cached daily rollups.
     """
-    conn = None
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT 
-                    DATE(created_at) as date,
-                    COUNT(*) FILTER (WHERE churn_label = true) as churn_count,
-                    COUNT(*) as total_predictions
-                FROM predictions
-                WHERE created_at >= CURRENT_DATE - INTERVAL '%s days'
-                GROUP BY DATE(created_at)
-                ORDER BY date ASC
-            """, (days,))
-            
-            rows = cur.fetchall()
-            
-            data = []
-            for row in rows:
-                data.append({
-                    "date": row[0].isoformat(),
-                    "churn": row[1],
-                    "total": row[2]
-                })
-            
-            return {"data": data}
+        rollup, last_modified = dashboard_cache.get("daily", fetch_daily_prediction_counts)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch churn data: {e}")
-    finally:
-        if conn:
-            conn.close()
+
+    since = (date.fromisoformat(rollup["today"]) - timedelta(days=days)).isoformat()
+    data = [day for day in rollup["days"] if day["date"] >= since]
+    return conditional_json_response(request, {"data": data}, last_modified)
 
 
 # > Customer Data Endpoints
 REQUIRED_UPLOAD_COLUMNS: List[str] = []
 
+CUSTOMERS_PAGE_MAX = 5000
+
+
+def _customer_list_params(fields, contract, churn_label, min_score, max_score, notified):
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    filters = {
+        "contract": contract,
+        "churn_label": churn_label,
+        "min_score": min_score,
+        "max_score": max_score,
+        "notified": notified,
+    }
+    return field_list, filters
+
+
 @app.get("/customers")
-def get_customers():
-    """Endpoint to fetch customer data."""
+async def get_customers(
+    after: str | None = None,
+    limit: int = 500,
+    fields: str | None = None,
+    contract: str | None = None,
+    churn_label: bool | None = None,
+    min_score: float | None = None,
+    max_score: float | None = None,
+    notified: bool | None = None,
+):
+    """
+    Endpoint to fetch customer data, one page at a time.
+    - `after`: cursor from the previous page's `next_cursor`
+    - `limit`: page size (max 5000)
+    - `fields`: comma-separated projection, e.g. `customer_id,email,churn_score`
+    - filters: `contract`, `churn_label`, `min_score`/`max_score`, `notified`
+    """
+    field_list, filters = _customer_list_params(fields, contract, churn_label, min_score, max_score, notified)
     try:
-        customers = fetch_customers()
-        return {"customers": customers}
+        customers, next_cursor = await fetch_customers_async(field_list, filters, after, max(1, min(limit, CUSTOMERS_PAGE_MAX)))
+        return {"customers": customers, "next_cursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         return {"error": str(e)}
 
+
+@app.get("/customers/stream")
+def stream_customers_ndjson(
+    fields: str | None = None,
+    contract: str | None = None,
+    churn_label: bool | None = None,
+    min_score: float | None = None,
+    max_score: float | None = None,
+    notified: bool | None = None,
+):
+    """Stream every matching customer as NDJSON (one JSON object per line), same fields and filters as /customers."""
+    field_list, filters = _customer_list_params(fields, contract, churn_label, min_score, max_score, notified)
+    try:
+        chunks = stream_customers(field_list, filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def lines():
+        for chunk in chunks:
+            yield "".join(json.dumps(customer, default=_json_default) + "\n" for customer in chunk)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
 @app.get("/customers/{customer_id}")
-def get_customer_by_id(customer_id: str):
+async def get_customer_by_id(customer_id: str):
     """Endpoint to fetch a customer by their ID."""
     try:
-        customer = fetch_customer_by_id(customer_id)
+        customer = await fetch_customer_by_id_async(customer_id)
         if not customer:
             raise HTTPException(status_code=404, detail="Customer not found")
         return {"customer": customer}
@@ -413,7 +466,7 @@ def get_customer_by_id(customer_id: str):
         return {"error": str(e)}
 
 @app.post("/customers/upload_csv")
-async def upload_customers_csv(file: UploadFile = File(...)):
+def upload_customers_csv(file: UploadFile = File(...)):
     """
     Upload a CSV file containing customer records to insert/update into the `customers` table.
 
@@ -422,22 +475,15 @@ async def upload_customers_csv(file: UploadFile = File(...)):
     internet_service,online_security,online_backup,device_protection,tech_support,streaming_tv,streaming_movies,
     contract,paperless_billing,payment_method,monthly_charges,total_charges
 
+    The file is parsed and validated in chunks, COPYed into a staging table and
+    merged into `customers` with one upsert, all in a single transaction.
     Returns summary with processed rows and any per-row errors.
     """
     filename = file.filename or ""
     if not filename.lower().endswith(".csv"):
         raise HTTPException(status_code=400, detail="Please upload a CSV file")
 
-    # Read and decode the uploaded CSV
-    content_bytes = await file.read()
-    try:
-        content = content_bytes.decode("utf-8")
-    except UnicodeDecodeError:
-        # Fallback for BOM or other encodings
-        content = content_bytes.decode("utf-8", errors="ignore")
-
-    reader = csv.DictReader(io.StringIO(content))
-    headers = [h.strip() for h in reader.fieldnames or []]
+    headers, chunks = open_customer_csv(file.file)
     missing = [c for c in REQUIRED_UPLOAD_COLUMNS if c not in headers]
     if missing:
         raise HTTPException(
@@ -445,183 +491,30 @@ async def upload_customers_csv(file: UploadFile = File(...)):
             detail=f"Missing required columns: {', '.join(missing)}"
         )
 
-    conn = None
-    processed = 0
-    errors: List[Dict] = []
     try:
-        conn = get_db_connection()
-        conn.autocommit = False
-
-        ensure_customers_table(conn)
-
-        with conn.cursor() as cur:
-            upsert_sql = (
-                """
-                INSERT INTO customers (
-                    customer_id, gender, senior_citizen, partner, dependents, tenure,
-                    phone_service, multiple_lines, internet_service, online_security, online_backup,
-                    device_protection, tech_support, streaming_tv, streaming_movies, contract,
-                    paperless_billing, payment_method, monthly_charges, total_charges,
-                    churn, status, notified, first_name, last_name, email
-                ) VALUES (
-                    %s, %s, %s, %s, %s, %s,
-                    %s, %s, %s, %s, %s,
-                    %s, %s, %s, %s, %s,
-                    %s, %s, %s, %s,
-                    %s, %s, %s, %s, %s, %s
-                )
-                ON CONFLICT (customer_id) DO UPDATE SET
-                    gender=EXCLUDED.gender,
-                    senior_citizen=EXCLUDED.senior_citizen,
-                    partner=EXCLUDED.partner,
-                    dependents=EXCLUDED.dependents,
-                    tenure=EXCLUDED.tenure,
-                    phone_service=EXCLUDED.phone_service,
-                    multiple_lines=EXCLUDED.multiple_lines,
-                    internet_service=EXCLUDED.internet_service,
-                    online_security=EXCLUDED.online_security,
-                    online_backup=EXCLUDED.online_backup,
-                    device_protection=EXCLUDED.device_protection,
-                    tech_support=EXCLUDED.tech_support,
-                    streaming_tv=EXCLUDED.streaming_tv,
-                    streaming_movies=EXCLUDED.streaming_movies,
-                    contract=EXCLUDED.contract,
-                    paperless_billing=EXCLUDED.paperless_billing,
-                    payment_method=EXCLUDED.payment_method,
-                    monthly_charges=EXCLUDED.monthly_charges,
-                    total_charges=EXCLUDED.total_charges,
-                    churn=EXCLUDED.churn,
-                    status=EXCLUDED.status,
-                    notified=EXCLUDED.notified,
-                    first_name=EXCLUDED.first_name,
-                    last_name=EXCLUDED.last_name,
-                    email=EXCLUDED.email,
-                    updated_at=NOW()
-                """
-            )
-            insert_no_conflict_sql = (
-                """
-                INSERT INTO customers (
-                    customer_id, gender, senior_citizen, partner, dependents, tenure,
-                    phone_service, multiple_lines, internet_service, online_security, online_backup,
-                    device_protection, tech_support, streaming_tv, streaming_movies, contract,
-                    paperless_billing, payment_method, monthly_charges, total_charges,
-                    churn, status, notified, first_name, last_name, email
-                ) VALUES (
-                    %s, %s, %s, %s, %s, %s,
-                    %s, %s, %s, %s, %s,
-                    %s, %s, %s, %s, %s,
-                    %s, %s, %s, %s,
-                    %s, %s, %s, %s, %s, %s
-                )
-                ON CONFLICT (customer_id) DO NOTHING
-                """
-            )
+        with get_pooled_connection() as conn:
+            conn.autocommit = False
 
-            generated_ids: List[Dict] = []
-            for row_idx, row in enumerate(reader, start=2):
-                try:
-                    # Validate and normalize via schema
-                    cust = CustomerDB(**row)
-                    # If customer_id is missing, generate and insert with conflict avoidance
-                    if not cust.customer_id:
-                        assigned_id = None
-                        # Try a few times in the rare case of collision
-                        for _ in range(8):
-                            candidate = generate_customer_id()
-                            values = (
-                                candidate,
-                                cust.gender,
-                                cust.senior_citizen,
-                                cust.partner,
-                                cust.dependents,
-                                cust.tenure,
-                                cust.phone_service,
-                                cust.multiple_lines,
-                                cust.internet_service,
-                                cust.online_security,
-                                cust.online_backup,
-                                cust.device_protection,
-                                cust.tech_support,
-                                cust.streaming_tv,
-                                cust.streaming_movies,
-                                cust.contract,
-                                cust.paperless_billing,
-                                cust.payment_method,
-                                cust.monthly_charges,
-                                cust.total_charges,
-                                cust.churn,
-                                cust.status,
-                                cust.notified,
-                                cust.first_name,
-                                cust.last_name,
-                                cust.email,
-                            )
-                            cur.execute(insert_no_conflict_sql, values)
-                            if cur.rowcount == 1:
-                                assigned_id = candidate
-                                generated_ids.append({"row": row_idx, "customer_id": assigned_id})
-                                processed += 1
-                                break
-                        if not assigned_id:
-                            raise ValueError("Failed to assign unique customer_id after multiple attempts")
-                    else:
-                        # Explicit ID present -> upsert
-                        values = (
-                            cust.customer_id,
-                            cust.gender,
-                            cust.senior_citizen,
-                            cust.partner,
-                            cust.dependents,
-                            cust.tenure,
-                            cust.phone_service,
-                            cust.multiple_lines,
-                            cust.internet_service,
-                            cust.online_security,
-                            cust.online_backup,
-                            cust.device_protection,
-                            cust.tech_support,
-                            cust.streaming_tv,
-                            cust.streaming_movies,
-                            cust.contract,
-                            cust.paperless_billing,
-                            cust.payment_method,
-                            cust.monthly_charges,
-                            cust.total_charges,
-                            cust.churn,
-                            cust.status,
-                            cust.notified,
-                            cust.first_name,
-                            cust.last_name,
-                            cust.email,
-                        )
-                        cur.execute(upsert_sql, values)
-                        processed += 1
-                except Exception as e:
-                    errors.append({"row": row_idx, "error": str(e)})
-
-        conn.commit()
+            ensure_customers_table(conn)
+            processed, errors, generated_ids, upserted_ids = load_customers(conn, chunks)
 
-        return {
-            "status": "ok",
-            "processed": processed,
-            "errors": errors,
-            "required_columns": REQUIRED_UPLOAD_COLUMNS,
-            "target_table": "customers",
-            "generated_ids": generated_ids,
-        }
+            conn.commit()
+            dashboard_cache.invalidate()
+            prediction_cache.invalidate_customers(upserted_ids)
+
+            return {
+                "status": "ok",
+                "processed": processed,
+                "errors": errors,
+                "required_columns": REQUIRED_UPLOAD_COLUMNS,
+                "target_table": "customers",
+                "generated_ids": generated_ids,
+            }
 
     except HTTPException:
-        if conn:
-            conn.rollback()
         raise
     except Exception as e:
-        if conn:
-            conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if conn:
-            conn.close()
 
 # > Feedback and Retraining Endpoints
 
@@ -634,163 +527,133 @@ def feedback(payload: FeedbackRequest, background: BackgroundTasks):
     -> count feedback non utilisés (used_for_training=false)
     -> trigger retrain si >= K_RETRAIN (tu brancheras /retrain après)
     """
-    conn = None
     try:
-        conn = get_db_connection()
-        conn.autocommit = False
-
-        with conn.cursor() as cur:
-            # 1) retrouver prediction_id via token
-            cur.execute("SELECT prediction_id FROM predictions WHERE token=%s", (str(payload.token),))
-            row = cur.fetchone()
-            if row is None:
-                raise HTTPException(status_code=404, detail="token not found")
-            prediction_id = row[0]
-
-            # 2) insérer feedback (1 feedback max par prediction_id)
-            try:
-                cur.execute(
-                    """
-                    UPDATE feedback
-                    SET answer = %s,
-                        feedback_label = %s,
-                        used_for_training = FALSE,
-                        answered_at = NOW()
-                    WHERE prediction_id = %s
-                    AND answer IS NULL
-                    RETURNING feedback_id
-                    """,
-                    (payload.answer, int(payload.feedback_label), prediction_id)
-                )
+        with get_pooled_connection() as conn:
+            conn.autocommit = False
 
+            with conn.cursor() as cur:
+                # 1) retrouver prediction_id via token
+                cur.execute("SELECT prediction_id FROM predictions WHERE token=%s", (str(payload.token),))
                 row = cur.fetchone()
                 if row is None:
-                    raise HTTPException(status_code=404, detail="No pending feedback found (or already answered).")
+                    raise HTTPException(status_code=404, detail="token not found")
+                prediction_id = row[0]
 
-            except PsycopgError:
-                raise HTTPException(status_code=500, detail="Database error")
+                # 2) insérer feedback (1 feedback max par prediction_id)
+                try:
+                    cur.execute(
+                        """
+                        UPDATE feedback
+                        SET answer = %s,
+                            feedback_label = %s,
+                            used_for_training = FALSE,
+                            answered_at = NOW()
+                        WHERE prediction_id = %s
+                        AND answer IS NULL
+                        RETURNING feedback_id
+                        """,
+                        (payload.answer, int(payload.feedback_label), prediction_id)
+                    )
 
-            # 3) compter les feedbacks non utilisés
-            cur.execute("SELECT COUNT(*) FROM feedback WHERE used_for_training = FALSE")
-            new_feedback_count = int(cur.fetchone()[0])
+                    row = cur.fetchone()
+                    if row is None:
+                        raise HTTPException(status_code=404, detail="No pending feedback found (or already answered).")
 
-            retrain_triggered = (new_feedback_count >= K_RETRAIN)
+                except PsycopgError:
+                    raise HTTPException(status_code=500, detail="Database error")
 
-        conn.commit()
-        # Déclencher /retrain via la logique training_runs
-        if retrain_triggered:
-            background.add_task(start_retrain, "feedback") 
+                # 3) compter les feedbacks non utilisés
+                cur.execute("SELECT COUNT(*) FROM feedback WHERE used_for_training = FALSE")
+                new_feedback_count = int(cur.fetchone()[0])
 
+                retrain_triggered = (new_feedback_count >= K_RETRAIN)
+
+            conn.commit()
+            dashboard_cache.invalidate("stats")
+            # Déclencher /retrain via la logique training_runs
+            if retrain_triggered:
+                background.add_task(start_retrain, "feedback") 
 
-        return {
-            "status": "ok",
-            "feedback_count": new_feedback_count,
-            "retrain_triggered": retrain_triggered
-        }
+
+            return {
+                "status": "ok",
+                "feedback_count": new_feedback_count,
+                "retrain_triggered": retrain_triggered
+            }
 
     except HTTPException:
-        if conn:
-            conn.rollback()
         raise
     except Exception as e:
-        if conn:
-            conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if conn:
-            conn.close()
 
 @app.post("/retrain")
-def retrain(payload: RetrainRequest):
-    return start_retrain(payload.reason)
+def retrain(payload: RetrainRequest, background: BackgroundTasks):
+    """
+    Open a training run and train in the background.
+    Returns: { "status": "started", "run_id", "reason", "used_new_feedback" }, or { "status": "skipped", "message" }.
+    Progress and metrics are available on /retrain/runs/{run_id}.
+    """
+    try:
+        run = open_retrain_run(payload.reason)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if run["status"] == "started":
+        background.add_task(run_retrain, run["run_id"], payload.reason, run["used_new_feedback"])
+    return run
+
+@app.get("/retrain/runs/{run_id}")
+def get_retrain_run(run_id: int):
+    """
+    Status of a training run.
+    Returns the training_runs row: { "run_id", "status", "model_version", "promoted", "metrics", ... }
+    """
+    try:
+        run = get_training_run(run_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch training run: {e}")
+    if run is None:
+        raise HTTPException(status_code=404, detail="Training run not found")
+    return run
 
 @app.post("/notify")
-def notify_customers(payload: dict):
+async def notify_customers(payload: dict):
     """
-    Notify customers who have predictions via n8n webhook.
+    Queue a notification job for customers who have predictions (sent via n8n webhook in the background).
     Expects: { "customer_ids": [id1, id2, ...] }
-    Returns: { "message": "...", "notified": [...], "failed": [...] }
+    Returns: { "message": "...", "job_id": "...", "status": "queued", "total": N }
+    Progress is available on /notify/jobs/{job_id}.
     """
     customer_ids = payload.get("customer_ids", [])
     if not customer_ids:
         raise HTTPException(status_code=400, detail="customer_ids is required")
-    
-    print(f"[NOTIFY] Processing {len(customer_ids)} customers: {customer_ids}")
-    
-    notified = []
-    failed = []
-    
-    for customer_id in customer_ids:
-        print(f"[NOTIFY] Processing customer: {customer_id}")
-        try:
-            # Check if customer has a prediction
-            conn = get_db_connection()
-            prediction_row = None
-            try:
-                with conn.cursor() as cur:
-                    cur.execute(
-                        """
-                        SELECT prediction_id, churn_score, churn_label, token
-                        FROM predictions 
-                        WHERE customer_id = %s 
-                        ORDER BY created_at DESC 
-                        LIMIT 1
-                        """,
-                        (str(customer_id),)
-                    )
-                    prediction_row = cur.fetchone()
-            finally:
-                conn.close()
-            
-            if not prediction_row:
-                print(f"[NOTIFY] No prediction found for customer: {customer_id}")
-                failed.append({"customer_id": customer_id, "error": "No prediction found"})
-                continue
-            
-            prediction_id = prediction_row[0]
-            token = prediction_row[3]
-            print(f"[NOTIFY] Found prediction {prediction_id} with token {token} for customer {customer_id}")
-            
-            # Call n8n webhook to send notification
-            webhook_url = f"{N8N_URL}/webhook/notify-churn"
-            webhook_payload = {
-                "customer_id": str(customer_id),
-                "token": str(token),
-            }
-            
-            print(f"[NOTIFY] Calling webhook for customer {customer_id}")
-            try:
-                response = requests.post(
-                    webhook_url,
-                    json=webhook_payload,
-                    timeout=30
-                )
-                response.raise_for_status()
-                print(f"[NOTIFY] Webhook success for customer {customer_id}: {response.status_code}")
-                notified.append({
-                    "customer_id": customer_id,
-                    "prediction_id": prediction_id,
-                    "status": "notified"
-                })
-                
-                # Wait 11 seconds before processing next customer
-                print(f"[NOTIFY] Waiting 11 seconds before next customer...")
-                time.sleep(11)
-                
-            except requests.exceptions.RequestException as e:
-                print(f"[NOTIFY] Webhook failed for customer {customer_id}: {str(e)}")
-                failed.append({"customer_id": customer_id, "error": f"Webhook failed: {str(e)}"})
-                
-        except Exception as e:
-            print(f"[NOTIFY] Exception for customer {customer_id}: {str(e)}")
-            failed.append({"customer_id": customer_id, "error": str(e)})
-    
+
+    try:
+        job_id = await notification_dispatcher.enqueue(customer_ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to queue notifications: {e}")
+
+    print(f"[NOTIFY] Queued job {job_id} for {len(customer_ids)} customers")
     return {
-        "message": f"Notified {len(notified)} customers, {len(failed)} failed",
-        "notified": notified,
-        "failed": failed
+        "message": f"Queued {len(customer_ids)} customers for notification",
+        "job_id": str(job_id),
+        "status": "queued",
+        "total": len(customer_ids)
     }
 
+@app.get("/notify/jobs/{job_id}")
+def get_notify_job(job_id: UUID):
+    """
+    Progress of a notification job.
+    Returns: { "job_id", "status", "total", "pending", "notified": [...], "failed": [...] }
+    """
+    try:
+        job = get_notification_job(job_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch notification job: {e}")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Notification job not found")
+    return job
+
 
 @app.post("/chatbot/query")
 async def chatbot_query(query: dict):
@@ -800,21 +663,21 @@ async def chatbot_query(query: dict):
     """
     try:
         lambda_url = "https://mrvsjty45aj4nyk7q257wi236m0nrgfc.lambda-url.eu-west-3.on.aws/chat"
-        response = requests.post(
-            lambda_url,
-            json={"question": query.get("question", "")},
-            headers={"Content-Type": "application/json"},
-            timeout=30
-        )
+        async with httpx.AsyncClient(timeout=30) as client:
+            response = await client.post(
+                lambda_url,
+                json={"question": query.get("question", "")},
+                headers={"Content-Type": "application/json"},
+            )
         
-        if response.ok:
+        if response.is_success:
             return response.json()
         else:
             raise HTTPException(
                 status_code=response.status_code,
                 detail=f"Lambda returned error: {response.text}"
             )
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to connect to chatbot service: {str(e)}"
@@ -0,0 +1,162 @@
+import asyncio
+import functools
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+from starlette.routing import Match
+
+# Seconds; from a cached prediction (~1ms) up to a slow batch or webhook call
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+http_requests_in_progress = Gauge(
+    "http_requests_in_progress", "HTTP requests being handled", ["method", "route"],
+)
+db_query_duration = Histogram(
+    "db_query_duration_seconds", "Time spent in a data_fetch query, connection checkout included",
+    ["query"], buckets=LATENCY_BUCKETS,
+)
+db_connection_wait = Histogram(
+    "db_connection_wait_seconds", "Time waited for a pooled database connection",
+    ["pool"], buckets=LATENCY_BUCKETS,
+)
+model_scoring_duration = Histogram(
+    "model_scoring_duration_seconds", "predict_churn / predict_churn_batch time",
+    ["mode"], buckets=LATENCY_BUCKETS,
+)
+notify_webhook_duration = Histogram(
+    "notify_webhook_duration_seconds", "n8n webhook call time by outcome (2xx, 4xx, 5xx, error)",
+    ["outcome"], buckets=LATENCY_BUCKETS,
+)
+predictions_total = Counter(
+    "predictions_total", "Predictions written, by model version and predicted label",
+    ["model_version", "label"],
+)
+predictions_dropped_total = Counter(
+    "predictions_dropped_total", "Predictions the writer gave up on (rejected by the database), by model version",
+    ["model_version"],
+)
+
+# Streaming consumer (python -m app.stream_consumer), served on STREAM_METRICS_PORT
+stream_messages_total = Counter(
+    "stream_messages_total", "Messages consumed in committed batches; rate() gives the throughput",
+)
+stream_invalid_messages_total = Counter(
+    "stream_invalid_messages_total", "Messages that are not a JSON customer with a customer_id",
+)
+stream_rejected_rows_total = Counter(
+    "stream_rejected_rows_total", "Customers rejected by the upload validation",
+)
+stream_predictions_total = Counter(
+    "stream_predictions_total", "Predictions written by the consumer",
+)
+stream_replayed_predictions_total = Counter(
+    "stream_replayed_predictions_total", "Redelivered messages whose prediction was already written",
+)
+stream_batches_total = Counter("stream_batches_total", "Batches committed")
+stream_failed_batches_total = Counter("stream_failed_batches_total", "Batches rolled back and replayed")
+stream_batch_duration = Histogram(
+    "stream_batch_duration_seconds", "Time to upsert, score and write one batch", buckets=LATENCY_BUCKETS,
+)
+stream_last_batch_timestamp = Gauge(
+    "stream_last_batch_timestamp_seconds", "Unix time of the last committed batch",
+)
+stream_consumer_lag = Gauge(
+    "stream_consumer_lag", "Messages behind the end of each assigned partition", ["partition"],
+)
+
+# Requests that match no route share one label, so unknown paths cannot grow the series count
+UNMATCHED_ROUTE = "unmatched"
+
+
+def timed(histogram, **labels):
+    """Observe the duration of each call of the decorated function (sync or async) in `histogram`."""
+    child = histogram.labels(**labels)
+
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    child.observe(time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+
+    return decorator
+
+
+def count_predictions(records: list[dict]):
+    counts = {}
+    for record in records:
+        key = (record["model_version"], "churn" if record["churn_label"] else "no_churn")
+        counts[key] = counts.get(key, 0) + 1
+    for (version, label), count in counts.items():
+        predictions_total.labels(model_version=version, label=label).inc(count)
+
+
+def count_dropped_predictions(records: list[dict]):
+    counts = {}
+    for record in records:
+        counts[record["model_version"]] = counts.get(record["model_version"], 0) + 1
+    for version, count in counts.items():
+        predictions_dropped_total.labels(model_version=version).inc(count)
+
+
+def route_template(scope) -> str:
+    """Path template of the route serving `scope` (e.g. /customers/{customer_id})."""
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return UNMATCHED_ROUTE
+
+
+class PrometheusMiddleware:
+    """
+    ASGI middleware timing every HTTP request by method, route template and
+    status code, and counting requests in flight per route. An exception
+    that escapes the app is recorded as a 500.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_template(scope)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = http_requests_in_progress.labels(method=method, route=route)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            http_request_duration.labels(method=method, route=route, status=str(status)).observe(
+                time.perf_counter() - start
+            )
@@ -1,22 +1,366 @@
+import hashlib
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import NamedTuple
+
 import joblib
-from config import MODEL_PATH
+import numpy as np
+import pandas as pd
+from config import (
+    MODEL_PATH,
+    MODEL_VERSION,
+    MODEL_ARTIFACTS_DIR,
+    MODEL_WATCH_INTERVAL_SECONDS,
+    COMPILED_SCORING,
+)
+
+# Unpickling a pipeline and compiling it import `build_pipeline`/`preprocess` as top-level modules:
+# app/pipeline is the copy shipped in the Docker image, ml_pipeline/src/pipeline the one in the repo
+APP_PIPELINE_DIR = Path(__file__).resolve().parent / "pipeline"
+ML_PIPELINE_DIR = Path(__file__).resolve().parents[2] / "ml_pipeline" / "src" / "pipeline"
+
+
+def add_pipeline_to_path():
+    """Make the pipeline modules importable, whichever entry point (API, consumer, script) runs."""
+    for directory in (APP_PIPELINE_DIR, ML_PIPELINE_DIR):  # each is inserted first: the repo copy wins locally
+        if directory.exists() and str(directory) not in sys.path:
+            sys.path.insert(0, str(directory))
+
+
+add_pipeline_to_path()
+
+# File in MODEL_ARTIFACTS_DIR naming the last promoted artifact this pod saw (used while the DB is down)
+CURRENT_POINTER = "CURRENT"
+ARTIFACT_PREFIX = "churn_pipeline_"
+
+# Canned batch every new model must score before it is swapped in
+# (covers each one-hot value of the categorical features)
+_VALIDATION_BASE = {
+    "customer_id": "VALIDATION", "gender": "Male", "senior_citizen": False, "partner": True,
+    "dependents": False, "tenure": 12, "phone_service": True, "multiple_lines": "Yes",
+    "internet_service": "Fiber optic", "online_security": "No", "online_backup": "Yes",
+    "device_protection": "No", "tech_support": "No", "streaming_tv": "Yes", "streaming_movies": "Yes",
+    "contract": "Month-to-month", "paperless_billing": True, "payment_method": "Electronic check",
+    "monthly_charges": 89.50, "total_charges": 1023.75,
+}
+VALIDATION_BATCH = [
+    {**_VALIDATION_BASE, **variant}
+    for variant in [
+        {},
+        {"gender": "Female", "internet_service": "DSL", "contract": "One year",
+         "payment_method": "Mailed check", "online_security": "Yes", "tech_support": "Yes"},
+        {"internet_service": "No", "contract": "Two year", "payment_method": "Bank transfer (automatic)",
+         "senior_citizen": True, "partner": False, "dependents": True, "paperless_billing": False},
+        {"payment_method": "Credit card (automatic)", "monthly_charges": 19.95, "total_charges": 19.95},
+        {"multiple_lines": "No phone service", "online_security": "No internet service",
+         "monthly_charges": 110.0, "total_charges": 7800.0},
+    ]
+]
+
+
+class LoadedModel(NamedTuple):
+    """Immutable snapshot of the served model: a request keeps the one it started with."""
+    version: str
+    path: str
+    pipeline: object
+    compiled: object
+    signature: tuple
+    loaded_at: float
+
+
+def _file_signature(path: str) -> tuple:
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _file_digest(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _read_pointer() -> str:
+    try:
+        with open(os.path.join(MODEL_ARTIFACTS_DIR, CURRENT_POINTER)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+
+
+def _write_pointer(path: str):
+    name = os.path.basename(path)
+    if _read_pointer() == name:
+        return
+    pointer = os.path.join(MODEL_ARTIFACTS_DIR, CURRENT_POINTER)
+    with open(pointer + ".tmp", "w") as f:
+        f.write(name)
+    os.replace(pointer + ".tmp", pointer)
+
+
+def _local_artifact() -> tuple[str, str] | None:
+    """(version, path) named by this pod's MODEL_ARTIFACTS_DIR/CURRENT, if the file is there."""
+    name = _read_pointer()
+    path = os.path.join(MODEL_ARTIFACTS_DIR, name)
+    if name and os.path.exists(path):
+        return name[len(ARTIFACT_PREFIX):].rsplit(".", 1)[0], path
+    return None
+
+
+def _promoted_artifact() -> tuple[str, str] | None:
+    """
+    (version, path) of the model promoted in trained_models, shared by every replica.
+    The artifact is downloaded into MODEL_ARTIFACTS_DIR the first time this pod sees it.
+    Returns None if no model was promoted; raises if the database is unreachable.
+    """
+    from app.db_connection import get_pooled_connection
+    with get_pooled_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT model_version, artifact_sha256
+                FROM trained_models
+                WHERE promoted_at IS NOT NULL AND artifact IS NOT NULL
+                ORDER BY promoted_at DESC
+                LIMIT 1
+                """
+            )
+            row = cur.fetchone()
+            if row is None:
+                conn.commit()
+                return None
+            version, sha256 = row
+            path = os.path.join(MODEL_ARTIFACTS_DIR, f"{ARTIFACT_PREFIX}{version}.pkl")
+            if not os.path.exists(path):
+                cur.execute("SELECT artifact FROM trained_models WHERE model_version=%s", (version,))
+                content = bytes(cur.fetchone()[0])
+                if hashlib.sha256(content).hexdigest() != sha256:
+                    raise ValueError(f"Artifact of model {version} does not match its sha256")
+                os.makedirs(MODEL_ARTIFACTS_DIR, exist_ok=True)
+                # Written aside then renamed: a file under its final name is always complete
+                with open(path + ".tmp", "wb") as f:
+                    f.write(content)
+                os.replace(path + ".tmp", path)
+                print(f"Model {version} downloaded from trained_models to {path}")
+        conn.commit()
+    _write_pointer(path)
+    return version, path
+
+
+def resolve_artifact() -> tuple[str, str]:
+    """
+    (version, path) to serve: the model promoted in trained_models, else MODEL_PATH as MODEL_VERSION.
+    While the database is unreachable, the last promoted model this pod saw (its CURRENT file) is kept.
+    """
+    try:
+        promoted = _promoted_artifact()
+    except Exception as e:
+        print(f"Promoted model not read from trained_models, using the local copy: {e}")
+        promoted = _local_artifact()
+    return promoted or (MODEL_VERSION, MODEL_PATH)
+
+
+def _store_promoted_artifact(version: str, path: str):
+    """Record the artifact as the promoted model in trained_models, where every replica polls it."""
+    from app.db_connection import get_pooled_connection
+    with open(path, "rb") as f:
+        content = f.read()
+    with get_pooled_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO trained_models (model_version, training_reason, status, artifact, artifact_sha256, promoted_at)
+                VALUES (%s, 'deploy', 'success', %s, %s, NOW())
+                ON CONFLICT (model_version) DO UPDATE
+                SET artifact=EXCLUDED.artifact, artifact_sha256=EXCLUDED.artifact_sha256, promoted_at=NOW()
+                """,
+                (version, content, hashlib.sha256(content).hexdigest()),
+            )
+        conn.commit()
 
-_model = None 
+
+def compile_model(model):
+    """
+    Export the fitted pipeline to its flat NumPy scorer (see build_pipeline.CompiledPipeline).
+    Returns None if the pipeline cannot be compiled, so callers fall back to sklearn.
+    """
+    from build_pipeline import CompiledPipeline
+    try:
+        return CompiledPipeline.from_pipeline(model)
+    except (ValueError, KeyError, AttributeError) as e:
+        print(f"Compiled scoring disabled, falling back to sklearn: {e}")
+        return None
+
+
+def prepare_model(version: str, path: str) -> LoadedModel:
+    """
+    Load, compile and validate an artifact without touching the served model.
+    Scoring the canned batch also warms both scoring paths up.
+    Raises ValueError if the pipeline returns unusable probabilities.
+    """
+    signature = _file_signature(path)
+    pipeline = joblib.load(path)
+    proba = pipeline.predict_proba(pd.DataFrame(VALIDATION_BATCH))[:, 1]
+    if len(proba) != len(VALIDATION_BATCH) or not np.all(np.isfinite(proba)) or proba.min() < 0 or proba.max() > 1:
+        raise ValueError(f"Model {version} returned invalid probabilities on the validation batch")
+
+    compiled = compile_model(pipeline) if COMPILED_SCORING else None
+    if compiled is not None:
+        drift = np.max(np.abs(compiled.predict_proba(VALIDATION_BATCH) - proba))
+        if drift > 1e-6:
+            print(f"Compiled scoring disabled for {version}: differs from sklearn by {drift:.2e}")
+            compiled = None
+    return LoadedModel(version, path, pipeline, compiled, signature, time.time())
+
+
+def _register_version(model: LoadedModel):
+    """Make sure predictions stamped with this version satisfy the trained_models foreign key."""
+    from app.db_connection import get_pooled_connection
+    try:
+        with get_pooled_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO trained_models (model_version, training_reason, status, ended_at, notes)
+                    VALUES (%s, 'deploy', 'success', NOW(), %s)
+                    ON CONFLICT (model_version) DO NOTHING
+                    """,
+                    (model.version, model.path),
+                )
+            conn.commit()
+    except Exception as e:
+        print(f"Could not register model {model.version} in trained_models: {e}")
+
+
+class ModelRegistry:
+    """
+    Serves one model at a time and swaps it without a restart.
+
+    The active model is a single LoadedModel reference, replaced in one
+    assignment once the new artifact has been loaded, compiled and validated,
+    so in-flight requests finish on the snapshot they took. A background
+    thread polls the promoted model (trained_models.promoted_at, shared by
+    the replicas) and MODEL_PATH, and reloads when the file to serve changes.
+    """
+
+    def __init__(self, watch_interval: float):
+        self.watch_interval = watch_interval
+        self._active = None
+        self._lock = threading.Lock()
+        self._failed = None
+        self._stop = threading.Event()
+        self._watcher = None
+        self._swap_listeners = []
+
+    def get(self) -> LoadedModel:
+        active = self._active
+        if active is None:
+            with self._lock:
+                if self._active is None:
+                    self._activate(prepare_model(*resolve_artifact()))
+            active = self._active
+        return active
+
+    def start(self):
+        """Start watching for new artifacts and load the model eagerly."""
+        if self.watch_interval > 0 and self._watcher is None:
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, name="model-registry", daemon=True)
+            self._watcher.start()
+        self.get()
+
+    def stop(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def promote(self, version: str, path: str) -> LoadedModel:
+        """
+        Serve an artifact of MODEL_ARTIFACTS_DIR now and publish it in trained_models,
+        from which the watchers of the other workers and replicas load it.
+        """
+        model = prepare_model(version, path)
+        _store_promoted_artifact(version, path)
+        _write_pointer(path)
+        with self._lock:
+            self._activate(model)
+        return model
+
+    def reload_if_changed(self):
+        if self._active is None:
+            # First load goes through get() so it is never done twice concurrently
+            self.get()
+            return
+        version, path = resolve_artifact()
+        signature = _file_signature(path)
+        active = self._active
+        if (active.path, active.signature) == (path, signature):
+            return
+        if self._failed == (path, signature):
+            return
+        if path == MODEL_PATH == active.path:
+            # MODEL_PATH was overwritten in place: tell the versions apart by content
+            version = f"{MODEL_VERSION}+{_file_digest(path)[:8]}"
+        try:
+            model = prepare_model(version, path)
+        except Exception as e:
+            # Retried once the file changes again (e.g. a copy still in progress)
+            print(f"Model {version} at {path} rejected: {e}")
+            self._failed = (path, signature)
+            return
+        with self._lock:
+            self._activate(model)
+
+    def add_swap_listener(self, listener):
+        """Call `listener(previous, model)` after every model swap (not on the first load)."""
+        self._swap_listeners.append(listener)
+
+    def _activate(self, model: LoadedModel):
+        _register_version(model)
+        previous = self._active
+        self._active = model
+        if previous is not None:
+            print(f"Model swapped: {previous.version} -> {model.version}")
+            for listener in self._swap_listeners:
+                try:
+                    listener(previous, model)
+                except Exception as e:
+                    print(f"Model swap listener failed: {e}")
+
+    def _watch(self):
+        while not self._stop.wait(self.watch_interval):
+            try:
+                self.reload_if_changed()
+            except Exception as e:
+                print(f"Model watcher error: {e}")
+
+
+registry = ModelRegistry(MODEL_WATCH_INTERVAL_SECONDS)
+
+
+def get_active_model() -> LoadedModel:
+    return registry.get()
 
 def load_model():
-    # print(MODEL_PATH)
-    global _model
-    if _model is None:
-        _model = joblib.load(MODEL_PATH)
-    return _model
+    return registry.get().pipeline
+
+def get_compiled_model():
+    return registry.get().compiled
 
 def get_model_info() -> dict:
-    model = load_model()
-    model = model.named_steps['model']
+    active = get_active_model()
+    model = active.pipeline.named_steps['model']
     info = {
+        "model_version": active.version,
+        "model_path": active.path,
+        "loaded_at": datetime.fromtimestamp(active.loaded_at, timezone.utc).isoformat(),
         "model_type": type(model).__name__,
         "feature_names": model.feature_names_in_.tolist() if hasattr(model, 'feature_names_in_') else [],
         "n_features": len(model.feature_names_in_) if hasattr(model, 'feature_names_in_') else 0,
+        "compiled_scoring": active.compiled is not None,
     }
     return info
 
@@ -0,0 +1,389 @@
+import asyncio
+import os
+import socket
+import time
+from uuid import UUID, uuid4
+
+import httpx
+from psycopg2.extras import execute_values
+
+from app.db_connection import get_pooled_connection, ensure_notification_tables
+from app.metrics import notify_webhook_duration
+from config import (
+    NOTIFY_WEBHOOK_URL,
+    NOTIFY_RATE_PER_SECOND,
+    NOTIFY_BURST,
+    NOTIFY_CONCURRENCY,
+    NOTIFY_MAX_ATTEMPTS,
+    NOTIFY_BACKOFF_SECONDS,
+    NOTIFY_TIMEOUT_SECONDS,
+    NOTIFY_LEASE_SECONDS,
+)
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, at most `capacity` saved up."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# > Persistence (sync, run in a worker thread)
+
+def _create_job(job_id: UUID, customer_ids: list[str], owner: str, lease_seconds: float):
+    with get_pooled_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO notification_jobs (job_id, total, owner, lease_until)
+                VALUES (%s, %s, %s, NOW() + %s * INTERVAL '1 second')
+                """,
+                (str(job_id), len(customer_ids), owner, lease_seconds),
+            )
+            execute_values(
+                cur,
+                "INSERT INTO notification_job_items (job_id, customer_id) VALUES %s",
+                [(str(job_id), customer_id) for customer_id in customer_ids],
+            )
+        conn.commit()
+
+
+def _start_job(job_id: UUID, owner: str) -> list[tuple] | None:
+    """
+    Mark the job running and return its pending items with the customer's latest
+    prediction, or None when another process has taken the job over.
+    """
+    with get_pooled_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE notification_jobs SET status='running', started_at=COALESCE(started_at, NOW())
+                WHERE job_id=%s AND owner=%s AND status IN ('queued', 'running')
+                RETURNING job_id
+                """,
+                (str(job_id), owner),
+            )
+            if cur.fetchone() is None:
+                conn.commit()
+                return None
+            cur.execute(
+                """
+                SELECT i.customer_id, lp.prediction_id, lp.token
+                FROM notification_job_items i
+                LEFT JOIN latest_predictions lp ON lp.customer_id = i.customer_id
+                WHERE i.job_id = %s AND i.status = 'pending'
+                """,
+                (str(job_id),),
+            )
+            items = cur.fetchall()
+        conn.commit()
+    return items
+
+
+def _set_item_status(job_id: UUID, customer_id: str, status: str, prediction_id=None, attempts=0, error=None):
+    with get_pooled_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE notification_job_items
+                SET status=%s, prediction_id=%s, attempts=%s, error=%s, updated_at=NOW()
+                WHERE job_id=%s AND customer_id=%s
+                """,
+                (status, prediction_id, attempts, error, str(job_id), customer_id),
+            )
+        conn.commit()
+
+
+def _finish_job(job_id: UUID, status: str, owner: str):
+    with get_pooled_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE notification_jobs SET status=%s, finished_at=NOW() WHERE job_id=%s AND owner=%s",
+                (status, str(job_id), owner),
+            )
+        conn.commit()
+
+
+def _prepare_tables():
+    with get_pooled_connection() as conn:
+        ensure_notification_tables(conn)
+        conn.commit()
+
+
+def _renew_leases(owner: str, lease_seconds: float) -> set[str]:
+    """Extend the lease of the unfinished jobs `owner` holds; returns their ids."""
+    with get_pooled_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE notification_jobs SET lease_until = NOW() + %s * INTERVAL '1 second'
+                WHERE owner=%s AND status IN ('queued', 'running')
+                RETURNING job_id
+                """,
+                (lease_seconds, owner),
+            )
+            renewed = {str(row[0]) for row in cur.fetchall()}
+        conn.commit()
+    return renewed
+
+
+def _claim_expired_jobs(owner: str, lease_seconds: float) -> list[str]:
+    """
+    Take over the unfinished jobs whose lease ran out (their process stopped),
+    oldest first. SKIP LOCKED lets concurrent processes claim disjoint jobs.
+    """
+    with get_pooled_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE notification_jobs SET owner=%s, lease_until = NOW() + %s * INTERVAL '1 second'
+                WHERE job_id IN (
+                    SELECT job_id FROM notification_jobs
+                    WHERE status IN ('queued', 'running') AND (lease_until IS NULL OR lease_until < NOW())
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING job_id, created_at
+                """,
+                (owner, lease_seconds),
+            )
+            claimed = [str(job_id) for job_id, _ in sorted(cur.fetchall(), key=lambda row: row[1])]
+        conn.commit()
+    return claimed
+
+
+def get_job(job_id: UUID) -> dict | None:
+    """Progress of a notification job, in the same shape as the old synchronous /notify response."""
+    with get_pooled_connection() as conn, conn.cursor() as cur:
+        cur.execute(
+            "SELECT status, total, created_at, started_at, finished_at FROM notification_jobs WHERE job_id=%s",
+            (str(job_id),),
+        )
+        job = cur.fetchone()
+        if job is None:
+            return None
+
+        cur.execute(
+            """
+            SELECT customer_id, status, prediction_id, attempts, error
+            FROM notification_job_items
+            WHERE job_id=%s
+            ORDER BY customer_id
+            """,
+            (str(job_id),),
+        )
+        items = cur.fetchall()
+
+    notified = [
+        {"customer_id": c, "prediction_id": p, "status": "notified", "attempts": a}
+        for c, s, p, a, _ in items if s == "sent"
+    ]
+    failed = [{"customer_id": c, "error": e, "attempts": a} for c, s, _, a, e in items if s == "failed"]
+    pending = sum(1 for item in items if item[1] == "pending")
+
+    return {
+        "job_id": str(job_id),
+        "status": job[0],
+        "total": job[1],
+        "pending": pending,
+        "created_at": job[2].isoformat() if job[2] else None,
+        "started_at": job[3].isoformat() if job[3] else None,
+        "finished_at": job[4].isoformat() if job[4] else None,
+        "notified": notified,
+        "failed": failed,
+    }
+
+
+# > Dispatcher
+
+class NotificationDispatcher:
+    """
+    Background worker sending /notify webhooks.
+
+    Jobs are persisted before being queued, so `/notify` returns immediately.
+    Each job is leased by one dispatcher process, which renews the lease every
+    `lease_seconds / 3`; a job whose lease ran out (its process died) is
+    claimed by another one, so replicas never send the same job twice.
+    Webhooks go through one pooled async HTTP client, throttled by a token
+    bucket and a concurrency limit, with exponential backoff between attempts.
+    The rate limit applies per process.
+    """
+
+    def __init__(self, webhook_url: str, rate: float, burst: int, concurrency: int,
+                 max_attempts: int, backoff_seconds: float, timeout_seconds: float, lease_seconds: float):
+        self.webhook_url = webhook_url
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.timeout_seconds = timeout_seconds
+        self.lease_seconds = max(lease_seconds, 3)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self._queue = None
+        self._client = None
+        self._worker = None
+        self._lease_task = None
+        self._held = {}  # job id -> time.monotonic() it was taken
+        self._lost = set()  # held jobs another process has taken over
+        self._renewed_at = 0.0
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._bucket = TokenBucket(self.rate, self.burst)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout_seconds,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+        )
+        self._worker = asyncio.create_task(self._run())
+
+        try:
+            await asyncio.to_thread(_prepare_tables)
+        except Exception as e:
+            print(f"[NOTIFY] Could not prepare notification tables: {e}")
+        # Also resumes the jobs a stopped process left unfinished, once their lease ran out
+        self._lease_task = asyncio.create_task(self._keep_leases())
+
+    async def stop(self):
+        for task in (self._lease_task, self._worker):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+
+    async def enqueue(self, customer_ids: list[str]) -> UUID:
+        if self._queue is None:
+            raise RuntimeError("Notification dispatcher is not running")
+        job_id = uuid4()
+        customer_ids = list(dict.fromkeys(str(c) for c in customer_ids))
+        await asyncio.to_thread(_create_job, job_id, customer_ids, self.owner, self.lease_seconds)
+        self._held[str(job_id)] = time.monotonic()
+        await self._queue.put(job_id)
+        return job_id
+
+    def _owns(self, job_id) -> bool:
+        """False once the job was taken over, or when the lease could not be renewed in time."""
+        return str(job_id) not in self._lost and time.monotonic() - self._renewed_at < self.lease_seconds
+
+    async def _keep_leases(self):
+        while True:
+            started = time.monotonic()
+            try:
+                renewed = await asyncio.to_thread(_renew_leases, self.owner, self.lease_seconds)
+                self._renewed_at = started
+                for job_id, taken_at in list(self._held.items()):
+                    if taken_at < started and job_id not in renewed:
+                        print(f"[NOTIFY] Job {job_id} was taken over by another process")
+                        self._lost.add(job_id)
+                        del self._held[job_id]
+                for job_id in await asyncio.to_thread(_claim_expired_jobs, self.owner, self.lease_seconds):
+                    print(f"[NOTIFY] Resuming job {job_id}")
+                    self._held[job_id] = time.monotonic()
+                    self._queue.put_nowait(job_id)
+            except Exception as e:
+                print(f"[NOTIFY] Could not renew job leases: {e}")
+            await asyncio.sleep(self.lease_seconds / 3)
+
+    async def _run(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                if await self._process(job_id):
+                    await asyncio.to_thread(_finish_job, job_id, "completed", self.owner)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[NOTIFY] Job {job_id} failed: {e}")
+                try:
+                    await asyncio.to_thread(_finish_job, job_id, "failed", self.owner)
+                except Exception:
+                    pass
+            finally:
+                self._held.pop(str(job_id), None)
+                self._lost.discard(str(job_id))
+                self._queue.task_done()
+
+    async def _process(self, job_id: UUID) -> bool:
+        """Send the job's pending webhooks; False when the job went to another process."""
+        items = await asyncio.to_thread(_start_job, job_id, self.owner)
+        if items is None:
+            print(f"[NOTIFY] Job {job_id} is held by another process, skipped")
+            return False
+        print(f"[NOTIFY] Job {job_id}: {len(items)} customers to notify")
+        await asyncio.gather(*(
+            self._notify_customer(job_id, customer_id, prediction_id, token)
+            for customer_id, prediction_id, token in items
+        ))
+        # Items left pending after a takeover are the new owner's to send
+        return self._owns(job_id)
+
+    async def _post(self, payload: dict) -> httpx.Response:
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await self._client.post(self.webhook_url, json=payload)
+            outcome = f"{response.status_code // 100}xx"
+            return response
+        finally:
+            notify_webhook_duration.labels(outcome=outcome).observe(time.perf_counter() - start)
+
+    async def _notify_customer(self, job_id: UUID, customer_id: str, prediction_id, token):
+        if prediction_id is None:
+            await asyncio.to_thread(_set_item_status, job_id, customer_id, "failed", None, 0, "No prediction found")
+            return
+
+        payload = {"customer_id": customer_id, "token": str(token)}
+        error = None
+        attempts = 0
+        async with self._semaphore:
+            for attempts in range(1, self.max_attempts + 1):
+                await self._bucket.acquire()
+                if not self._owns(job_id):
+                    return
+                try:
+                    response = await self._post(payload)
+                    response.raise_for_status()
+                    await asyncio.to_thread(_set_item_status, job_id, customer_id, "sent", prediction_id, attempts)
+                    return
+                except httpx.HTTPStatusError as e:
+                    error = f"Webhook failed: {e}"
+                    # Client errors will not succeed on retry (429 aside)
+                    if e.response.status_code < 500 and e.response.status_code != 429:
+                        break
+                except httpx.HTTPError as e:
+                    error = f"Webhook failed: {e}"
+                if attempts < self.max_attempts:
+                    await asyncio.sleep(self.backoff_seconds * 2 ** (attempts - 1))
+
+        print(f"[NOTIFY] Giving up on customer {customer_id}: {error}")
+        await asyncio.to_thread(_set_item_status, job_id, customer_id, "failed", prediction_id, attempts, error)
+
+
+dispatcher = NotificationDispatcher(
+    NOTIFY_WEBHOOK_URL,
+    NOTIFY_RATE_PER_SECOND,
+    NOTIFY_BURST,
+    NOTIFY_CONCURRENCY,
+    NOTIFY_MAX_ATTEMPTS,
+    NOTIFY_BACKOFF_SECONDS,
+    NOTIFY_TIMEOUT_SECONDS,
+    NOTIFY_LEASE_SECONDS,
+)
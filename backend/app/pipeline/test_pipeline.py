@@ -1,7 +1,10 @@
 from pathlib import Path
+import numpy as np
 import pandas as pd
 import joblib
 
+from build_pipeline import CompiledPipeline
+
 BASE_DIR = Path(__file__).resolve().parents[2]  # src/
 PIPELINE_PATH = BASE_DIR / "artifacts" / "churn_pipeline.pkl"
 
@@ -39,6 +42,35 @@ def build_test_dataframe():
     ])
 
 
+def build_parity_dataframe():
+    """A few distinct rows covering every one-hot value of the categorical features."""
+    base = build_test_dataframe().iloc[0].to_dict()
+    variants = [
+        {},
+        {"gender": "Female", "internet_service": "DSL", "contract": "One year",
+         "payment_method": "Mailed check", "online_security": "Yes", "tech_support": "Yes"},
+        {"internet_service": "No", "contract": "Two year", "payment_method": "Bank transfer (automatic)",
+         "senior_citizen": True, "partner": False, "dependents": True, "paperless_billing": False},
+        {"payment_method": "Credit card (automatic)", "monthly_charges": 19.95, "total_charges": 19.95},
+        {"multiple_lines": "No phone service", "online_security": "No internet service",
+         "monthly_charges": 110.0, "total_charges": 7800.0},
+    ]
+    return pd.DataFrame([{**base, **v} for v in variants])
+
+
+def test_compiled_pipeline_parity():
+    """The compiled serving scorer must match the sklearn pipeline."""
+    pipeline = joblib.load(PIPELINE_PATH)
+    compiled = CompiledPipeline.from_pipeline(pipeline)
+
+    X = build_parity_dataframe().drop(columns=["churn"])
+    expected = pipeline.predict_proba(X)[:, 1]
+
+    rows = X.to_dict(orient="records")
+    np.testing.assert_allclose(compiled.predict_proba(rows), expected, rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose([compiled.predict_proba_one(r) for r in rows], expected, rtol=1e-9, atol=1e-12)
+
+
 def main():
     pipeline = joblib.load(PIPELINE_PATH)
 
@@ -53,6 +85,9 @@ def main():
     print("Predictions:", preds)
     print("Probabilities:", probs)
 
+    test_compiled_pipeline_parity()
+    print("Compiled scorer matches the sklearn pipeline")
+
 
 if __name__ == "__main__":
     main()
@@ -1,10 +1,28 @@
-from app.model import load_model
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from app.metrics import model_scoring_duration, timed
+from app.model import LoadedModel, get_active_model
+from config import SCORING_THREADS
 import pandas as pd
 
+# Bounded pool for scoring: the event loop never runs predict_proba itself, and at most
+# SCORING_THREADS requests score at once (NumPy/sklearn release the GIL for most of it)
+_scoring_executor = ThreadPoolExecutor(max_workers=SCORING_THREADS, thread_name_prefix="scoring")
+
+@timed(model_scoring_duration, mode="one")
 def predict_churn(
-        data: dict 
+        data: dict,
+        active: LoadedModel | None = None
         ) -> float:
-    model = load_model()
+    """Score one customer with `active` (the served model when omitted)."""
+    active = active or get_active_model()
+    compiled = active.compiled
+    if compiled is not None:
+        # Single pass: dict -> float vector -> dot product + sigmoid
+        return compiled.predict_proba_one(data)
+
+    model = active.pipeline
 
     # processed_data = process_input(data)   # Commented out after model refactor to process inside predict
     # Use raw data directly as processing is now inside the model
@@ -15,3 +33,39 @@ def predict_churn(
     proba = model.predict_proba(data)[0][1]
 
     return float(proba)
+
+
+@timed(model_scoring_duration, mode="batch")
+def predict_churn_batch(
+        rows: list[dict],
+        active: LoadedModel | None = None
+        ) -> list[float]:
+    """Score many customers with one vectorized predict_proba call."""
+    if not rows:
+        return []
+
+    active = active or get_active_model()
+    compiled = active.compiled
+    if compiled is not None:
+        return compiled.predict_proba(rows).tolist()
+
+    model = active.pipeline
+    data = pd.DataFrame(rows)
+    data.drop(columns=['churn', 'email'], inplace=True, errors='ignore')
+    return model.predict_proba(data)[:, 1].astype(float).tolist()
+
+
+async def predict_churn_async(data: dict, active: LoadedModel | None = None) -> float:
+    """predict_churn on the scoring executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_scoring_executor, predict_churn, data, active)
+
+
+async def predict_churn_batch_async(rows: list[dict], active: LoadedModel | None = None) -> list[float]:
+    """predict_churn_batch on the scoring executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_scoring_executor, predict_churn_batch, rows, active)
+
+
+def shutdown_scoring_executor():
+    _scoring_executor.shutdown(wait=True)
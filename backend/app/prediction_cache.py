@@ -0,0 +1,122 @@
+import hashlib
+import json
+import sys
+import threading
+from collections import OrderedDict
+
+from app.model import registry as model_registry
+from config import PREDICTION_CACHE_MAX_BYTES
+
+# Not model inputs: a change to them must not miss the cache (predict_churn drops them too)
+IGNORED_FIELDS = ("churn", "email")
+
+# OrderedDict node, tuple and key headers per entry, on top of the objects themselves
+ENTRY_OVERHEAD_BYTES = 200
+
+
+def feature_fingerprint(features: dict) -> bytes:
+    """Stable digest of a feature dict: same features, same digest, whatever the key order."""
+    payload = {k: v for k, v in features.items() if k not in IGNORED_FIELDS}
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(body.encode("utf-8"), digest_size=16).digest()
+
+
+class PredictionCache:
+    """
+    LRU cache of churn scores keyed on (model version, feature fingerprint).
+
+    A customer whose row has not changed since its last score is answered
+    without running the model. Entries of a customer are dropped when its row
+    is upserted, everything is dropped when the model is swapped, and the
+    least recently used entries are evicted beyond `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (version, fingerprint) -> (proba, customer_id, size)
+        self._by_customer = {}  # customer_id -> set of keys
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def key(self, features: dict, version: str) -> tuple:
+        return version, feature_fingerprint(features)
+
+    def get(self, key: tuple) -> float | None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: tuple, customer_id, proba: float):
+        if not self.enabled:
+            return
+        customer_id = None if customer_id is None else str(customer_id)
+        size = ENTRY_OVERHEAD_BYTES + sys.getsizeof(key[0]) + sys.getsizeof(key[1]) + sys.getsizeof(customer_id)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = (float(proba), customer_id, size)
+            self._by_customer.setdefault(customer_id, set()).add(key)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_customers(self, customer_ids):
+        """Drop the cached scores of the given customers (their row was rewritten)."""
+        with self._lock:
+            for customer_id in customer_ids:
+                for key in self._by_customer.get(str(customer_id), ()).copy():
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._by_customer.clear()
+            self._bytes = 0
+
+    def _remove(self, key: tuple):
+        _, customer_id, size = self._entries.pop(key)
+        self._bytes -= size
+        keys = self._by_customer.get(customer_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_customer[customer_id]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+prediction_cache = PredictionCache(PREDICTION_CACHE_MAX_BYTES)
+
+# Scores of the previous model are never read again
+model_registry.add_swap_listener(lambda previous, model: prediction_cache.clear())
@@ -0,0 +1,292 @@
+import json
+from collections import Counter
+
+from psycopg2.extras import execute_values
+
+from app.db_connection import (
+    get_pooled_connection,
+    ensure_latest_predictions_table,
+    ensure_prediction_daily_stats_table,
+)
+
+DAILY_STATS_SHARDS = 16
+
+
+# psycopg3 binds every value as a server-side parameter (at most 65535 per statement)
+ASYNC_INSERT_CHUNK_ROWS = 5000
+
+_INSERT_PREDICTIONS_SQL = """
+    INSERT INTO predictions (customer_id, churn_score, churn_label, model_version, features_json, token)
+    VALUES %s
+    RETURNING customer_id, prediction_id, churn_score, churn_label, token, model_version, created_at
+"""
+_PREDICTION_TEMPLATE = "(%s, %s, %s, %s, %s::jsonb, %s)"
+
+# Write-behind rows carry the id reserved for them and their request time; a retried
+# batch that had in fact been committed skips the rows already there
+_INSERT_RESERVED_PREDICTIONS_SQL = """
+    INSERT INTO predictions
+        (prediction_id, customer_id, churn_score, churn_label, model_version, features_json, token, created_at)
+    VALUES %s
+    ON CONFLICT (prediction_id) DO NOTHING
+    RETURNING customer_id, prediction_id, churn_score, churn_label, token, model_version, created_at
+"""
+_RESERVED_PREDICTION_TEMPLATE = "(%s, %s, %s, %s, %s, %s::jsonb, %s, %s)"
+
+_UPSERT_LATEST_SQL = """
+    INSERT INTO latest_predictions
+        (customer_id, prediction_id, churn_score, churn_label, token, model_version, created_at)
+    VALUES %s
+    ON CONFLICT (customer_id) DO UPDATE SET
+        prediction_id = EXCLUDED.prediction_id,
+        churn_score = EXCLUDED.churn_score,
+        churn_label = EXCLUDED.churn_label,
+        token = EXCLUDED.token,
+        model_version = EXCLUDED.model_version,
+        created_at = EXCLUDED.created_at,
+        feedback_id = NULL,
+        notified_at = NULL,
+        feedback_answer = NULL,
+        answered_at = NULL,
+        used_for_training = NULL
+    WHERE (latest_predictions.created_at, latest_predictions.prediction_id)
+        < (EXCLUDED.created_at, EXCLUDED.prediction_id)
+"""
+_LATEST_TEMPLATE = "(%s, %s, %s, %s, %s, %s, %s)"
+
+_INCREMENT_DAILY_SQL = """
+    INSERT INTO prediction_daily_stats (day, shard, total_predictions, churn_predictions)
+    VALUES %s
+    ON CONFLICT (day, shard) DO UPDATE SET
+        total_predictions = prediction_daily_stats.total_predictions + EXCLUDED.total_predictions,
+        churn_predictions = prediction_daily_stats.churn_predictions + EXCLUDED.churn_predictions
+"""
+_DAILY_TEMPLATE = f"(%s, mod(pg_backend_pid(), {DAILY_STATS_SHARDS}), %s, %s)"
+
+
+def _prediction_values(records: list[dict]) -> list[tuple]:
+    return [
+        (
+            str(r["customer_id"]),
+            float(r["churn_score"]),
+            bool(r["churn_label"]),
+            r["model_version"],
+            json.dumps(r["features"]),
+            str(r["token"]),
+        )
+        for r in records
+    ]
+
+
+def _latest_values(rows) -> list[tuple]:
+    # ON CONFLICT cannot touch the same row twice in one statement: keep the newest per customer
+    newest = {}
+    for row in rows:
+        current = newest.get(row[0])
+        if current is None or (row[6], row[1]) > (current[6], current[1]):
+            newest[row[0]] = row
+    return [(r[0], r[1], r[2], r[3], str(r[4]) if r[4] is not None else None, r[5], r[6]) for r in newest.values()]
+
+
+def _daily_values(rows) -> list[tuple]:
+    total = Counter()
+    churn = Counter()
+    for row in rows:
+        # created_at comes back in the session time zone, like DATE(created_at) in SQL
+        day = row[6].date()
+        total[day] += 1
+        churn[day] += 1 if row[3] else 0
+    return [(day, total[day], churn[day]) for day in total]
+
+
+def insert_predictions(conn, records: list[dict]) -> dict[str, int]:
+    """
+    Insert many predictions with a single multi-row INSERT, move the
+    `latest_predictions` projection forward and bump the daily counters (caller commits).
+
+    Each record needs: customer_id, churn_score, churn_label, model_version, features, token.
+    Returns {token: prediction_id}.
+    """
+    if not records:
+        return {}
+
+    values = _prediction_values(records)
+    with conn.cursor() as cur:
+        rows = execute_values(
+            cur,
+            _INSERT_PREDICTIONS_SQL,
+            values,
+            template=_PREDICTION_TEMPLATE,
+            page_size=len(values),
+            fetch=True,
+        )
+        upsert_latest_predictions(cur, rows)
+        increment_daily_stats(cur, rows)
+    return {str(row[4]): row[1] for row in rows}
+
+
+def upsert_latest_predictions(cur, rows):
+    """
+    Point `latest_predictions` at the given predictions
+    (customer_id, prediction_id, churn_score, churn_label, token, model_version, created_at).
+    A newer prediction clears the feedback status carried over from the previous one.
+    """
+    values = _latest_values(rows)
+    if values:
+        execute_values(cur, _UPSERT_LATEST_SQL, values, template=_LATEST_TEMPLATE, page_size=len(values))
+
+
+def increment_daily_stats(cur, rows):
+    """Add the given predictions to `prediction_daily_stats` (rows as returned by insert_predictions)."""
+    values = _daily_values(rows)
+    if values:
+        execute_values(cur, _INCREMENT_DAILY_SQL, values, template=_DAILY_TEMPLATE)
+
+
+async def _execute_values_async(cur, sql: str, values: list[tuple], template: str, fetch: bool = False):
+    """execute_values for psycopg3 async cursors: one multi-row statement per chunk."""
+    rows = []
+    for start in range(0, len(values), ASYNC_INSERT_CHUNK_ROWS):
+        chunk = values[start:start + ASYNC_INSERT_CHUNK_ROWS]
+        await cur.execute(
+            sql.replace("%s", ", ".join([template] * len(chunk)), 1),
+            [v for row in chunk for v in row],
+        )
+        if fetch:
+            rows.extend(await cur.fetchall())
+    return rows
+
+
+async def insert_predictions_async(conn, records: list[dict]) -> dict[str, int]:
+    """Async insert_predictions on a psycopg3 connection from app.async_db (caller commits)."""
+    if not records:
+        return {}
+
+    async with conn.cursor() as cur:
+        rows = await _execute_values_async(
+            cur, _INSERT_PREDICTIONS_SQL, _prediction_values(records), _PREDICTION_TEMPLATE, fetch=True
+        )
+        await _project_predictions_async(cur, rows)
+    return {str(row[4]): row[1] for row in rows}
+
+
+async def reserve_prediction_ids_async(conn, count: int) -> list[int]:
+    """Draw `count` ids from the predictions sequence, for rows written later."""
+    async with conn.cursor() as cur:
+        await cur.execute(
+            "SELECT nextval(pg_get_serial_sequence('predictions', 'prediction_id')) FROM generate_series(1, %s)",
+            (count,),
+        )
+        return [row[0] for row in await cur.fetchall()]
+
+
+async def insert_reserved_predictions_async(conn, records: list[dict]) -> set[int]:
+    """
+    Insert predictions that already hold a reserved `prediction_id` and a
+    `created_at`, then update the projections like insert_predictions (caller commits).
+    Rows already present (e.g. a retry of a batch whose commit went through)
+    are skipped. Returns the prediction_ids actually inserted.
+    """
+    if not records:
+        return set()
+
+    values = [
+        (r["prediction_id"], *v, r["created_at"])
+        for r, v in zip(records, _prediction_values(records))
+    ]
+    async with conn.cursor() as cur:
+        rows = await _execute_values_async(
+            cur, _INSERT_RESERVED_PREDICTIONS_SQL, values, _RESERVED_PREDICTION_TEMPLATE, fetch=True
+        )
+        await _project_predictions_async(cur, rows)
+    return {row[1] for row in rows}
+
+
+async def _project_predictions_async(cur, rows):
+    latest = _latest_values(rows)
+    if latest:
+        await _execute_values_async(cur, _UPSERT_LATEST_SQL, latest, _LATEST_TEMPLATE)
+    daily = _daily_values(rows)
+    if daily:
+        await _execute_values_async(cur, _INCREMENT_DAILY_SQL, daily, _DAILY_TEMPLATE)
+
+
+def backfill_daily_stats(conn) -> int:
+    """Rebuild `prediction_daily_stats` from the full `predictions` history (caller commits)."""
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM prediction_daily_stats")
+        cur.execute(
+            """
+            INSERT INTO prediction_daily_stats (day, shard, total_predictions, churn_predictions)
+            SELECT DATE(created_at), 0, COUNT(*), COUNT(*) FILTER (WHERE churn_label = true)
+            FROM predictions
+            GROUP BY DATE(created_at)
+            """
+        )
+        return cur.rowcount
+
+
+def backfill_latest_predictions(conn) -> int:
+    """Rebuild `latest_predictions` from the full `predictions`/`feedback` history (caller commits)."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO latest_predictions (
+                customer_id, prediction_id, churn_score, churn_label, token, model_version, created_at,
+                feedback_id, notified_at, feedback_answer, answered_at, used_for_training
+            )
+            SELECT
+                p.customer_id, p.prediction_id, p.churn_score, p.churn_label, p.token, p.model_version, p.created_at,
+                f.feedback_id, f.sent_at, f.answer, f.answered_at, f.used_for_training
+            FROM (
+                SELECT DISTINCT ON (customer_id)
+                    customer_id, prediction_id, churn_score, churn_label, token, model_version, created_at
+                FROM predictions
+                ORDER BY customer_id, created_at DESC, prediction_id DESC
+            ) p
+            LEFT JOIN LATERAL (
+                SELECT feedback_id, sent_at, answer, answered_at, used_for_training
+                FROM feedback
+                WHERE prediction_id = p.prediction_id
+                ORDER BY answered_at DESC NULLS LAST
+                LIMIT 1
+            ) f ON true
+            ON CONFLICT (customer_id) DO UPDATE SET
+                prediction_id = EXCLUDED.prediction_id,
+                churn_score = EXCLUDED.churn_score,
+                churn_label = EXCLUDED.churn_label,
+                token = EXCLUDED.token,
+                model_version = EXCLUDED.model_version,
+                created_at = EXCLUDED.created_at,
+                feedback_id = EXCLUDED.feedback_id,
+                notified_at = EXCLUDED.notified_at,
+                feedback_answer = EXCLUDED.feedback_answer,
+                answered_at = EXCLUDED.answered_at,
+                used_for_training = EXCLUDED.used_for_training
+            """
+        )
+        return cur.rowcount
+
+
+def prepare_prediction_tables():
+    """Create `latest_predictions` and `prediction_daily_stats` at startup, backfilling them the first time."""
+    with get_pooled_connection() as conn:
+        if ensure_latest_predictions_table(conn):
+            count = backfill_latest_predictions(conn)
+            print(f"latest_predictions created and backfilled with {count} customers")
+        if ensure_prediction_daily_stats_table(conn):
+            count = backfill_daily_stats(conn)
+            print(f"prediction_daily_stats created and backfilled with {count} days")
+        conn.commit()
+
+
+if __name__ == "__main__":
+    # Backfill command, from the backend folder: python -m app.prediction_store
+    with get_pooled_connection() as conn:
+        ensure_latest_predictions_table(conn)
+        ensure_prediction_daily_stats_table(conn)
+        customers = backfill_latest_predictions(conn)
+        days = backfill_daily_stats(conn)
+        conn.commit()
+    print(f"latest_predictions backfilled: {customers} customers")
+    print(f"prediction_daily_stats backfilled: {days} days")
@@ -0,0 +1,281 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timezone
+
+import psycopg
+
+from app.async_db import get_async_connection
+from app.dashboard_cache import add_daily_predictions, dashboard_cache
+from app.drift_monitor import monitor as drift_monitor
+from app.metrics import count_dropped_predictions, count_predictions
+from app.prediction_store import (
+    insert_predictions_async,
+    insert_reserved_predictions_async,
+    reserve_prediction_ids_async,
+)
+from config import (
+    PREDICTION_WRITE_BEHIND,
+    PREDICTION_WRITE_QUEUE_SIZE,
+    PREDICTION_WRITE_BATCH_SIZE,
+    PREDICTION_WRITE_FLUSH_MS,
+    PREDICTION_WRITE_ENQUEUE_TIMEOUT_MS,
+    PREDICTION_WRITE_SHUTDOWN_TIMEOUT_SECONDS,
+    PREDICTION_ID_BLOCK,
+    PREDICTION_WRITE_MAX_RETRIES,
+    PREDICTION_DEAD_LETTER_PATH,
+)
+
+MAX_RETRY_DELAY_SECONDS = 5
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionWriter:
+    """
+    Writes prediction records, synchronously or write-behind.
+
+    Synchronous (default): one INSERT and commit before the response, as before.
+
+    Write-behind: each record gets a prediction_id from a block reserved on
+    the predictions sequence and its created_at, then waits in a bounded queue.
+    A background task writes the queue in multi-row transactions once
+    `batch_size` records wait or `flush_ms` passed. When the queue stays full
+    for `enqueue_timeout_ms` (the flusher is behind), the request writes its
+    own records synchronously instead. Shutdown flushes what is left.
+
+    A batch gets `max_retries` retries of connection errors in all; rows the
+    database rejects, the rest of a batch out of retries and the queue left
+    at shutdown are appended to `dead_letter_path` (JSON lines) to be replayed.
+    """
+
+    def __init__(self, write_behind: bool, queue_size: int, batch_size: int, flush_ms: float,
+                 enqueue_timeout_ms: float, shutdown_timeout: float, id_block: int,
+                 max_retries: int = 10, dead_letter_path: str = ""):
+        self.write_behind = write_behind
+        self.queue_size = queue_size
+        self.batch_size = max(batch_size, 1)
+        self.flush_interval = flush_ms / 1000
+        self.enqueue_timeout = enqueue_timeout_ms / 1000
+        self.shutdown_timeout = shutdown_timeout
+        self.id_block = max(id_block, 1)
+        self.max_retries = max(max_retries, 0)
+        self.dead_letter_path = dead_letter_path
+        self._queue = None
+        self._worker = None
+        self._ids = []
+        self._ids_lock = None
+        self.enqueued = 0
+        self.written = 0
+        self.already_written = 0
+        self.batches = 0
+        self.sync_writes = 0
+        self.retries = 0
+        self.dropped = 0
+        self.last_flush_ms = 0.0
+
+    async def start(self):
+        if not self.write_behind:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._batch_ready = asyncio.Event()
+        self._ids_lock = asyncio.Lock()
+        self._worker = asyncio.create_task(self._run())
+        logger.info("Write-behind on (batch=%d, flush=%.0fms)", self.batch_size, self.flush_interval * 1000)
+
+    async def stop(self):
+        """Flush the queue (up to shutdown_timeout) and stop the background task."""
+        if self._worker is None:
+            return
+        worker, self._worker = self._worker, None
+        try:
+            await asyncio.wait_for(self._queue.join(), self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            logger.error("Shutdown flush timed out, %d predictions not written", self._queue.qsize())
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+        left = []
+        while not self._queue.empty():
+            left.append(self._queue.get_nowait())
+        if left:
+            await self._drop(left, "shutdown flush timed out")
+
+    async def write(self, records: list[dict]) -> dict[str, int]:
+        """
+        Store prediction records (customer_id, churn_score, churn_label,
+        model_version, features, token) and return {token: prediction_id}.
+        """
+        if not records:
+            return {}
+        if self._worker is None:
+            return await self._write_now(records)
+
+        ids = await self._reserve_ids(len(records))
+        created_at = datetime.now(timezone.utc)
+        for record, prediction_id in zip(records, ids):
+            record["prediction_id"] = prediction_id
+            record["created_at"] = created_at
+
+        # Backpressure: wait a little for room, then stop queueing and write inline
+        deadline = time.monotonic() + self.enqueue_timeout
+        for i, record in enumerate(records):
+            try:
+                self._queue.put_nowait(record)
+            except asyncio.QueueFull:
+                try:
+                    await asyncio.wait_for(self._queue.put(record), max(deadline - time.monotonic(), 0))
+                except asyncio.TimeoutError:
+                    await self._write_reserved_now(records[i:])
+                    break
+            self.enqueued += 1
+            if self._queue.qsize() >= self.batch_size:
+                self._batch_ready.set()
+        return {str(r["token"]): r["prediction_id"] for r in records}
+
+    async def _write_now(self, records: list[dict]) -> dict[str, int]:
+        async with get_async_connection() as conn:
+            prediction_ids = await insert_predictions_async(conn, records)
+            await conn.commit()
+        self._committed(records)
+        return prediction_ids
+
+    async def _write_reserved_now(self, records: list[dict]):
+        self.sync_writes += 1
+        async with get_async_connection() as conn:
+            inserted = await insert_reserved_predictions_async(conn, records)
+            await conn.commit()
+        self._committed(self._inserted(records, inserted))
+
+    def _inserted(self, records: list[dict], inserted: set[int]) -> list[dict]:
+        """Keep the records this write inserted; the others were already in the table."""
+        written = [r for r in records if r["prediction_id"] in inserted]
+        self.written += len(written)
+        self.already_written += len(records) - len(written)
+        return written
+
+    def _committed(self, records: list[dict]):
+        """Bookkeeping once `records` are committed; rows still queued or dropped are not counted."""
+        if not records:
+            return
+        count_predictions(records)
+        drift_monitor.observe_many([r["features"] for r in records])
+        # The daily rollup gains exactly these rows; the headline stats depend on each
+        # customer's previous latest prediction and are left to the cache TTL
+        churn = sum(1 for r in records if r["churn_label"])
+        dashboard_cache.update("daily", lambda rollup: add_daily_predictions(rollup, len(records), churn))
+
+    async def _reserve_ids(self, count: int) -> list[int]:
+        async with self._ids_lock:
+            if len(self._ids) < count:
+                async with get_async_connection() as conn:
+                    self._ids.extend(await reserve_prediction_ids_async(conn, max(count - len(self._ids), self.id_block)))
+            ids, self._ids = self._ids[:count], self._ids[count:]
+        return ids
+
+    async def _run(self):
+        while True:
+            first = await self._queue.get()
+            if self._queue.qsize() + 1 < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._batch_ready.clear()
+
+            batch = [first]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch: list[dict]):
+        """
+        Write one batch, retrying connection errors and isolating rows the database rejects.
+        The retries are shared by the whole batch, the row-by-row writes included.
+        """
+        attempt = 0
+        pending = [batch]
+        while pending:
+            rows = pending.pop()
+            started = time.perf_counter()
+            try:
+                async with get_async_connection() as conn:
+                    inserted = await insert_reserved_predictions_async(conn, rows)
+                    await conn.commit()
+            except (psycopg.IntegrityError, psycopg.DataError) as e:
+                if len(rows) == 1:
+                    # e.g. a customer_id that is not in customers: retrying cannot help
+                    await self._drop(rows, e)
+                else:
+                    pending.extend([record] for record in reversed(rows))
+                continue
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    left = rows + [record for chunk in pending for record in chunk]
+                    await self._drop(left, f"gave up after {attempt} retries: {e}")
+                    return
+                attempt += 1
+                self.retries += 1
+                delay = min(0.1 * 2 ** attempt, MAX_RETRY_DELAY_SECONDS)
+                logger.warning("Write of %d predictions failed, retrying in %.1fs: %s", len(rows), delay, e)
+                pending.append(rows)
+                await asyncio.sleep(delay)
+                continue
+            self.batches += 1
+            self.last_flush_ms = (time.perf_counter() - started) * 1000
+            # A retry after a commit whose acknowledgement was lost finds its rows already there
+            self._committed(self._inserted(rows, inserted))
+
+    async def _drop(self, records: list[dict], reason):
+        """Give up on `records`: count them and append them to the dead-letter file."""
+        self.dropped += len(records)
+        count_dropped_predictions(records)
+        ids = [r["prediction_id"] for r in records]
+        logger.error("Dropped %d predictions (first ids %s): %s", len(records), ids[:5], reason)
+        if not self.dead_letter_path:
+            return
+        try:
+            await asyncio.to_thread(self._append_dead_letters, records, str(reason))
+        except OSError:
+            logger.exception("Could not write predictions %s to %s", ids, self.dead_letter_path)
+
+    def _append_dead_letters(self, records: list[dict], reason: str):
+        dropped_at = datetime.now(timezone.utc).isoformat()
+        lines = "".join(
+            json.dumps({**record, "error": reason, "dropped_at": dropped_at}, default=str) + "\n"
+            for record in records
+        )
+        with open(self.dead_letter_path, "a") as f:
+            f.write(lines)
+
+    def stats(self) -> dict:
+        return {
+            "write_behind": self._worker is not None,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "queue_size": self.queue_size,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "already_written": self.already_written,
+            "batches": self.batches,
+            "sync_writes": self.sync_writes,
+            "retries": self.retries,
+            "dropped": self.dropped,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+
+writer = PredictionWriter(
+    PREDICTION_WRITE_BEHIND,
+    PREDICTION_WRITE_QUEUE_SIZE,
+    PREDICTION_WRITE_BATCH_SIZE,
+    PREDICTION_WRITE_FLUSH_MS,
+    PREDICTION_WRITE_ENQUEUE_TIMEOUT_MS,
+    PREDICTION_WRITE_SHUTDOWN_TIMEOUT_SECONDS,
+    PREDICTION_ID_BLOCK,
+    PREDICTION_WRITE_MAX_RETRIES,
+    PREDICTION_DEAD_LETTER_PATH,
+)
@@ -0,0 +1,193 @@
+import asyncio
+import time
+from bisect import bisect_left
+
+from app.model import LoadedModel, get_active_model
+from app.predict import predict_churn_async, predict_churn_batch_async
+from app.prediction_cache import prediction_cache
+from config import SCORING_BATCH_MAX_SIZE, SCORING_BATCH_MAX_DELAY_MS, SCORING_THREADS
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+QUEUE_DELAY_BUCKETS_MS = [0.5, 1, 2, 5, 10, 25, 50, 100]
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus style): count, sum, max and `le` buckets."""
+
+    def __init__(self, buckets: list[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def snapshot(self) -> dict:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip([*self.buckets, "+Inf"], self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "max": self.max,
+            "buckets": buckets,
+        }
+
+
+class ScoringBatcher:
+    """
+    Coalesces concurrent single-customer scoring requests.
+
+    Callers `await score(features)`; requests arriving within `max_delay_ms`
+    of the first pending one (or until `max_batch_size` are waiting) are
+    scored with one predict_churn_batch call on the scoring executor, and
+    each caller gets its own probability back. Batches are split by model,
+    so every request is scored by the model it resolved at call time.
+    """
+
+    def __init__(self, max_batch_size: int, max_delay_ms: float, max_in_flight: int):
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.max_in_flight = max(max_in_flight, 1)
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_delays_ms = Histogram(QUEUE_DELAY_BUCKETS_MS)
+        self.fallbacks = 0
+        self._pending = []  # (features, active, future, enqueued_at)
+        self._worker = None
+        self._in_flight = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_batch_size > 1
+
+    async def start(self):
+        if not self.enabled:
+            return
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        await asyncio.gather(self._worker, return_exceptions=True)
+        self._worker = None
+        # Score whatever was still waiting, then let running batches finish
+        while self._pending:
+            batch, self._pending = self._pending[:self.max_batch_size], self._pending[self.max_batch_size:]
+            self._in_flight.add(asyncio.create_task(self._score_batch(batch)))
+        await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    async def score(self, features: dict, active: LoadedModel | None = None) -> float:
+        """
+        Probability of churn for `features`: from the prediction cache when
+        this model already scored the same features, otherwise scored
+        together with concurrent requests.
+        """
+        active = active or get_active_model()
+        key = prediction_cache.key(features, active.version)
+        proba = prediction_cache.get(key)
+        if proba is not None:
+            return proba
+
+        if self._worker is None:
+            proba = await predict_churn_async(features, active)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._pending.append((features, active, future, time.perf_counter()))
+            if len(self._pending) == 1:
+                self._wakeup.set()
+            if len(self._pending) >= self.max_batch_size:
+                self._full.set()
+            proba = await future
+        prediction_cache.put(key, features.get("customer_id"), proba)
+        return proba
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            if len(self._pending) < self.max_batch_size:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+            self._full.clear()
+
+            batch, self._pending = self._pending[:self.max_batch_size], self._pending[self.max_batch_size:]
+            if self._pending:
+                self._wakeup.set()
+
+            # Keep collecting while earlier batches score, up to max_in_flight of them
+            await self._slots.acquire()
+            task = asyncio.create_task(self._score_batch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._batch_done)
+
+    def _batch_done(self, task):
+        self._in_flight.discard(task)
+        self._slots.release()
+
+    async def _score_batch(self, batch: list[tuple]):
+        started = time.perf_counter()
+        self.batch_sizes.observe(len(batch))
+        for _, _, _, enqueued_at in batch:
+            self.queue_delays_ms.observe((started - enqueued_at) * 1000)
+
+        groups = {}
+        for item in batch:
+            groups.setdefault(id(item[1]), []).append(item)
+        for items in groups.values():
+            active = items[0][1]
+            try:
+                probas = await predict_churn_batch_async([features for features, _, _, _ in items], active)
+                # The sklearn pipeline drops duplicate rows (same customer scored twice at once)
+                if len(probas) != len(items):
+                    raise ValueError(f"{len(probas)} scores for {len(items)} rows")
+            except Exception:
+                # One bad row must not fail the others: score them one by one
+                self.fallbacks += 1
+                for features, _, future, _ in items:
+                    try:
+                        _resolve(future, await predict_churn_async(features, active))
+                    except Exception as e:
+                        _fail(future, e)
+                continue
+            for (_, _, future, _), proba in zip(items, probas):
+                _resolve(future, proba)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self._worker is not None,
+            "max_batch_size": self.max_batch_size,
+            "max_delay_ms": self.max_delay * 1000,
+            "pending": len(self._pending),
+            "batches_in_flight": len(self._in_flight),
+            "batch_fallbacks": self.fallbacks,
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_delay_ms": self.queue_delays_ms.snapshot(),
+        }
+
+
+def _resolve(future, value):
+    # The caller may have gone away (client disconnect cancels the request task)
+    if not future.done():
+        future.set_result(value)
+
+
+def _fail(future, error):
+    if not future.done():
+        future.set_exception(error)
+
+
+batcher = ScoringBatcher(SCORING_BATCH_MAX_SIZE, SCORING_BATCH_MAX_DELAY_MS, SCORING_THREADS)
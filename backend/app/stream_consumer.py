@@ -0,0 +1,465 @@
+"""
+Streaming consumer: scores the customers published on the `new-customers` topic.
+
+Each poll returns up to STREAM_BATCH_SIZE messages, processed in one transaction:
+the customers are upserted (same bulk path as /customers/upload_csv), scored
+with one vectorized call and their predictions bulk-inserted. Offsets are
+committed to the broker only after the database commit, so a crash replays
+the batch (at-least-once); replays are idempotent because each prediction
+token is derived from the message's topic/partition/offset.
+
+Run from the backend folder:
+    python -m app.stream_consumer                  # Kafka (KAFKA_BOOTSTRAP_SERVERS)
+    python -m app.stream_consumer --in-memory 5000 # in-memory broker fed with generated customers
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import NamedTuple
+from uuid import NAMESPACE_URL, uuid5
+
+import pandas as pd
+from prometheus_client import start_http_server
+
+from app.customer_loader import UPLOAD_COLUMNS, load_customers
+from app.data_fetch import fetch_customers_features
+from app.db_connection import get_pooled_connection, ensure_customers_table, init_pool, close_pool
+from app.metrics import (
+    stream_batch_duration,
+    stream_batches_total,
+    stream_consumer_lag,
+    stream_failed_batches_total,
+    stream_invalid_messages_total,
+    stream_last_batch_timestamp,
+    stream_messages_total,
+    stream_predictions_total,
+    stream_rejected_rows_total,
+    stream_replayed_predictions_total,
+)
+from app.model import registry as model_registry
+from app.predict import predict_churn, predict_churn_batch
+from app.prediction_store import insert_predictions
+from config import (
+    KAFKA_BOOTSTRAP_SERVERS,
+    EVENT_HUBS_CONNECTION_STRING,
+    KAFKA_TOPIC,
+    KAFKA_GROUP_ID,
+    STREAM_BATCH_SIZE,
+    STREAM_POLL_TIMEOUT_MS,
+    STREAM_METRICS_PORT,
+)
+
+# The producer uses shorter labels than the customers table / training data
+VALUE_ALIASES = {
+    "internet_service": {"None": "No"},
+    "payment_method": {
+        "Bank transfer": "Bank transfer (automatic)",
+        "Credit card": "Credit card (automatic)",
+    },
+}
+
+MAX_RETRY_DELAY_SECONDS = 30
+THROUGHPUT_WINDOW_SECONDS = 60
+# --in-memory draws its customers with the producer's generator
+PRODUCER_DIR = Path(__file__).resolve().parents[2] / "pipeline" / "producer"
+
+
+class StreamRecord(NamedTuple):
+    topic: str
+    partition: int
+    offset: int
+    value: bytes
+
+
+# > Sources
+
+class KafkaSource:
+    """kafka-python consumer with manual offset commits."""
+
+    def __init__(self, topic: str, group_id: str, bootstrap_servers: str, batch_size: int, poll_timeout_ms: int):
+        from kafka import KafkaConsumer
+
+        security = {}
+        if EVENT_HUBS_CONNECTION_STRING:
+            security = {
+                "security_protocol": "SASL_SSL",
+                "sasl_mechanism": "PLAIN",
+                "sasl_plain_username": "$ConnectionString",
+                "sasl_plain_password": EVENT_HUBS_CONNECTION_STRING,
+            }
+        self.batch_size = batch_size
+        self.poll_timeout_ms = poll_timeout_ms
+        self._consumer = KafkaConsumer(
+            topic,
+            bootstrap_servers=bootstrap_servers,
+            group_id=group_id,
+            enable_auto_commit=False,
+            auto_offset_reset="earliest",
+            max_poll_records=batch_size,
+            **security,
+        )
+
+    def poll(self) -> list[StreamRecord]:
+        polled = self._consumer.poll(timeout_ms=self.poll_timeout_ms, max_records=self.batch_size)
+        return [
+            StreamRecord(r.topic, r.partition, r.offset, r.value)
+            for records in polled.values()
+            for r in records
+        ]
+
+    def commit(self, records: list[StreamRecord]):
+        # Positions are exactly past `records`: nothing else was polled since
+        self._consumer.commit()
+
+    def rewind(self, records: list[StreamRecord]):
+        from kafka import TopicPartition
+
+        first = {}
+        for r in records:
+            first[(r.topic, r.partition)] = min(r.offset, first.get((r.topic, r.partition), r.offset))
+        for (topic, partition), offset in first.items():
+            self._consumer.seek(TopicPartition(topic, partition), offset)
+
+    def lag(self) -> dict[str, int]:
+        assigned = list(self._consumer.assignment())
+        if not assigned:
+            return {}
+        end_offsets = self._consumer.end_offsets(assigned)
+        return {
+            f"{tp.topic}-{tp.partition}": max(end_offsets[tp] - self._consumer.position(tp), 0)
+            for tp in assigned
+        }
+
+    def close(self):
+        self._consumer.close()
+
+
+class InMemoryBroker:
+    """Single-process stand-in for a Kafka cluster: topics, partitions and committed offsets."""
+
+    def __init__(self, partitions: int = 1):
+        self.partitions = partitions
+        self.topics = {}  # topic -> [[value, ...] per partition]
+        self.committed = {}  # (group, topic, partition) -> next offset
+        self._lock = threading.Lock()
+
+    def send(self, topic: str, value, key: str | None = None):
+        if not isinstance(value, bytes):
+            value = json.dumps(value).encode("utf-8")
+        with self._lock:
+            partitions = self.topics.setdefault(topic, [[] for _ in range(self.partitions)])
+            partition = hash(key) % self.partitions if key is not None else min(
+                range(self.partitions), key=lambda p: len(partitions[p])
+            )
+            partitions[partition].append(value)
+
+
+class InMemorySource:
+    """Consumer of an InMemoryBroker, with the same interface as KafkaSource."""
+
+    def __init__(self, broker: InMemoryBroker, topic: str, group_id: str, batch_size: int):
+        self.broker = broker
+        self.topic = topic
+        self.group_id = group_id
+        self.batch_size = batch_size
+        self._positions = {}
+
+    def _partitions(self) -> list:
+        return self.broker.topics.get(self.topic, [])
+
+    def poll(self) -> list[StreamRecord]:
+        records = []
+        for partition, values in enumerate(self._partitions()):
+            position = self._positions.get(
+                partition, self.broker.committed.get((self.group_id, self.topic, partition), 0)
+            )
+            chunk = values[position:position + self.batch_size - len(records)]
+            records.extend(StreamRecord(self.topic, partition, position + i, v) for i, v in enumerate(chunk))
+            self._positions[partition] = position + len(chunk)
+            if len(records) >= self.batch_size:
+                break
+        if not records:
+            time.sleep(0.05)
+        return records
+
+    def commit(self, records: list[StreamRecord]):
+        for r in records:
+            key = (self.group_id, r.topic, r.partition)
+            self.broker.committed[key] = max(self.broker.committed.get(key, 0), r.offset + 1)
+
+    def rewind(self, records: list[StreamRecord]):
+        for r in records:
+            self._positions[r.partition] = min(r.offset, self._positions.get(r.partition, r.offset))
+
+    def lag(self) -> dict[str, int]:
+        return {
+            f"{self.topic}-{partition}": len(values) - self._positions.get(partition, 0)
+            for partition, values in enumerate(self._partitions())
+        }
+
+    def close(self):
+        pass
+
+
+# > Processing
+
+def prediction_token(record: StreamRecord) -> str:
+    """Same message, same token: replays of a batch find their predictions already written."""
+    return str(uuid5(NAMESPACE_URL, f"kafka://{record.topic}/{record.partition}/{record.offset}"))
+
+
+def decode_batch(records: list[StreamRecord]) -> tuple[pd.DataFrame, dict[str, StreamRecord], int]:
+    """
+    Parse messages into raw CSV-like strings for the upload validator.
+    Returns (raw, last_record_by_customer, invalid_count).
+    """
+    rows = []
+    sources = {}
+    invalid = 0
+    for record in records:
+        try:
+            customer = json.loads(record.value)
+            customer_id = str(customer["customer_id"]).strip()
+        except (ValueError, TypeError, KeyError):
+            invalid += 1
+            continue
+        if not customer_id:
+            invalid += 1
+            continue
+        for column, aliases in VALUE_ALIASES.items():
+            customer[column] = aliases.get(customer.get(column), customer.get(column))
+        rows.append({
+            column: None if customer.get(column) is None else str(customer[column])
+            for column in UPLOAD_COLUMNS
+            if column in customer
+        } | {"customer_id": customer_id})
+        sources[customer_id] = record  # a later message for the same customer wins
+    return pd.DataFrame(rows, dtype=object), sources, invalid
+
+
+class StreamMetrics:
+    """
+    Consumer counters: exported to Prometheus (app/metrics.py, served on STREAM_METRICS_PORT)
+    and kept here for stats() and the summary printed on exit.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.messages = 0
+        self.invalid = 0
+        self.rejected = 0
+        self.predictions = 0
+        self.duplicates = 0
+        self.batches = 0
+        self.failures = 0
+        self.last_batch_seconds = 0.0
+        self.last_batch_at = None
+        self._window = deque()  # (timestamp, messages)
+        self._partitions = set()
+        self._lock = threading.Lock()
+
+    def record_batch(self, messages: int, seconds: float, invalid: int = 0, rejected: int = 0,
+                     predictions: int = 0, duplicates: int = 0):
+        """Count a committed batch (a batch that failed is counted again when it is replayed)."""
+        now = time.time()
+        with self._lock:
+            self.batches += 1
+            self.messages += messages
+            self.invalid += invalid
+            self.rejected += rejected
+            self.predictions += predictions
+            self.duplicates += duplicates
+            self.last_batch_seconds = seconds
+            self.last_batch_at = now
+            self._window.append((now, messages))
+            while self._window and self._window[0][0] < now - THROUGHPUT_WINDOW_SECONDS:
+                self._window.popleft()
+        stream_batches_total.inc()
+        stream_messages_total.inc(messages)
+        stream_invalid_messages_total.inc(invalid)
+        stream_rejected_rows_total.inc(rejected)
+        stream_predictions_total.inc(predictions)
+        stream_replayed_predictions_total.inc(duplicates)
+        stream_batch_duration.observe(seconds)
+        stream_last_batch_timestamp.set(now)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+        stream_failed_batches_total.inc()
+
+    def record_lag(self, lag: dict[str, int]):
+        for partition, behind in lag.items():
+            stream_consumer_lag.labels(partition=partition).set(behind)
+        # Partitions moved to another consumer by a rebalance stop being reported
+        for partition in self._partitions - lag.keys():
+            stream_consumer_lag.remove(partition)
+        self._partitions = set(lag)
+
+    def throughput(self) -> float:
+        with self._lock:
+            if not self._window:
+                return 0.0
+            span = max(time.time() - self._window[0][0], 1.0)
+            return sum(n for _, n in self._window) / span
+
+    def snapshot(self, lag: dict) -> dict:
+        return {
+            "messages": self.messages,
+            "invalid_messages": self.invalid,
+            "rejected_rows": self.rejected,
+            "predictions": self.predictions,
+            "replayed_predictions": self.duplicates,
+            "batches": self.batches,
+            "failed_batches": self.failures,
+            "messages_per_second": self.throughput(),
+            "last_batch_seconds": self.last_batch_seconds,
+            "last_batch_at": self.last_batch_at,
+            "lag": lag,
+            "total_lag": sum(lag.values()),
+            "uptime_seconds": time.time() - self.started_at,
+        }
+
+
+class StreamConsumer:
+    def __init__(self, source, metrics: StreamMetrics | None = None):
+        self.source = source
+        self.metrics = metrics or StreamMetrics()
+        self._stop = threading.Event()
+        self._lag = {}
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self, max_idle_polls: int | None = None):
+        """Consume until stop() (or `max_idle_polls` empty polls in a row, used by --in-memory)."""
+        attempt = 0
+        idle = 0
+        while not self._stop.is_set():
+            records = self.source.poll()
+            self._lag = self.source.lag()
+            self.metrics.record_lag(self._lag)
+            if not records:
+                idle += 1
+                if max_idle_polls is not None and idle >= max_idle_polls:
+                    return
+                continue
+            idle = 0
+            try:
+                self.process(records)
+                attempt = 0
+            except Exception as e:
+                # Nothing was committed: replay the same messages after a pause
+                attempt += 1
+                self.metrics.record_failure()
+                delay = min(2 ** attempt, MAX_RETRY_DELAY_SECONDS)
+                print(f"[STREAM] Batch of {len(records)} messages failed, retrying in {delay}s: {e}")
+                self.source.rewind(records)
+                self._stop.wait(delay)
+
+    def process(self, records: list[StreamRecord]):
+        started = time.perf_counter()
+        raw, sources, invalid = decode_batch(records)
+
+        rejected = written = duplicates = 0
+        if len(raw):
+            active = model_registry.get()
+            with get_pooled_connection() as conn:
+                # 1) upsert the customers (validated, COPY + one INSERT ... ON CONFLICT); fields a
+                # message leaves out, such as the churn label, keep their stored value
+                processed, errors, _, upserted_ids = load_customers(conn, [raw], keep_existing=True)
+                rejected = len(errors)
+
+                # 2) score them as stored, in one vectorized call
+                features_by_id = fetch_customers_features(conn, list(upserted_ids))
+                found = [(cid, f) for cid, f in features_by_id.items() if cid in sources]
+                probas = predict_churn_batch([f for _, f in found], active)
+                if len(probas) != len(found):
+                    probas = [predict_churn(f, active) for _, f in found]
+
+                # 3) bulk-insert the predictions a previous delivery did not already write
+                tokens = {cid: prediction_token(sources[cid]) for cid, _ in found}
+                with conn.cursor() as cur:
+                    cur.execute("SELECT token FROM predictions WHERE token = ANY(%s)", (list(tokens.values()),))
+                    existing = {row[0] for row in cur.fetchall()}
+                records_to_insert = [
+                    {
+                        "customer_id": cid,
+                        "churn_score": proba,
+                        "churn_label": proba >= 0.5,
+                        "model_version": active.version,
+                        "features": features,
+                        "token": tokens[cid],
+                    }
+                    for (cid, features), proba in zip(found, probas)
+                    if tokens[cid] not in existing
+                ]
+                insert_predictions(conn, records_to_insert)
+                conn.commit()
+                written = len(records_to_insert)
+                duplicates = len(found) - written
+
+        # 4) only now move the committed offsets forward
+        self.source.commit(records)
+        self.metrics.record_batch(len(records), time.perf_counter() - started, invalid=invalid,
+                                  rejected=rejected, predictions=written, duplicates=duplicates)
+
+    def stats(self) -> dict:
+        return self.metrics.snapshot(self._lag)
+
+
+def _fill_broker(broker: InMemoryBroker, count: int):
+    """Publish `count` customers drawn by the producer's own generator (needs numpy and Faker)."""
+    import numpy as np
+
+    if str(PRODUCER_DIR) not in sys.path:
+        sys.path.insert(0, str(PRODUCER_DIR))
+    from utils import NamePool, generate_customer_batch
+
+    for customer in generate_customer_batch(count, np.random.default_rng(), NamePool(size=min(count, 1000))):
+        broker.send(KAFKA_TOPIC, customer, key=customer["customer_id"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score customers published on Kafka")
+    parser.add_argument("--in-memory", type=int, metavar="N",
+                        help="consume N generated customers from an in-memory broker, then exit")
+    args = parser.parse_args()
+
+    init_pool()
+    with get_pooled_connection() as conn:
+        ensure_customers_table(conn)
+        with conn.cursor() as cur:
+            # Replays look predictions up by token
+            cur.execute("CREATE INDEX IF NOT EXISTS predictions_token_idx ON predictions (token)")
+        conn.commit()
+    model_registry.start()
+
+    if args.in_memory:
+        broker = InMemoryBroker(partitions=4)
+        _fill_broker(broker, args.in_memory)
+        source = InMemorySource(broker, KAFKA_TOPIC, KAFKA_GROUP_ID, STREAM_BATCH_SIZE)
+    else:
+        source = KafkaSource(KAFKA_TOPIC, KAFKA_GROUP_ID, KAFKA_BOOTSTRAP_SERVERS, STREAM_BATCH_SIZE, STREAM_POLL_TIMEOUT_MS)
+
+    consumer = StreamConsumer(source)
+    if STREAM_METRICS_PORT > 0:
+        start_http_server(STREAM_METRICS_PORT)
+        print(f"[STREAM] Prometheus metrics on http://0.0.0.0:{STREAM_METRICS_PORT}/metrics")
+    try:
+        consumer.run(max_idle_polls=3 if args.in_memory else None)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        source.close()
+        model_registry.stop()
+        close_pool()
+        print(f"[STREAM] {json.dumps(consumer.stats())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+from app.dashboard_cache import AggregateCache, add_daily_predictions
+
+
+def daily_rollup():
+    return {"today": "2025-03-02", "days": [{"date": "2025-03-01", "churn": 2, "total": 10}]}
+
+
+def test_prediction_writes_patch_the_cached_rollup():
+    cache = AggregateCache(ttl_seconds=60)
+    queries = []
+
+    def compute():
+        queries.append(1)
+        return daily_rollup()
+
+    _, first_modified = cache.get("daily", compute)
+    cache.update("daily", lambda rollup: add_daily_predictions(rollup, 3, 1))
+    cache.update("daily", lambda rollup: add_daily_predictions(rollup, 2, 2))
+    value, last_modified = cache.get("daily", compute)
+
+    assert len(queries) == 1
+    assert value["days"] == [
+        {"date": "2025-03-01", "churn": 2, "total": 10},
+        {"date": "2025-03-02", "churn": 3, "total": 5},
+    ]
+    assert last_modified >= first_modified
+
+
+def test_update_skips_stale_or_missing_keys():
+    cache = AggregateCache(ttl_seconds=60)
+    cache.update("daily", lambda rollup: add_daily_predictions(rollup, 1, 1))
+    assert cache.get("daily", daily_rollup)[0] == daily_rollup()
+
+    cache.invalidate("daily")
+    cache.update("daily", lambda rollup: add_daily_predictions(rollup, 1, 1))
+    # Recomputed from the database rather than patched
+    assert cache.get("daily", daily_rollup)[0] == daily_rollup()
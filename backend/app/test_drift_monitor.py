@@ -0,0 +1,173 @@
+import random
+import re
+from bisect import bisect_right
+
+import pytest
+
+from app.drift_monitor import (
+    CATEGORICAL_FEATURES,
+    NUMERIC_FEATURES,
+    DriftMonitor,
+    build_reference_profile,
+    category_key,
+)
+
+
+def percentile_cont(values: list[float], fractions: list[float]) -> list[float]:
+    """Postgres percentile_cont: linear interpolation between the two nearest ranks."""
+    values = sorted(values)
+    result = []
+    for fraction in fractions:
+        position = fraction * (len(values) - 1)
+        low = int(position)
+        high = min(low + 1, len(values) - 1)
+        result.append(values[low] + (values[high] - values[low]) * (position - low))
+    return result
+
+
+def width_bucket(value: float, thresholds: list[float]) -> int:
+    """Postgres width_bucket(operand, thresholds): 0 below the first threshold, i when thresholds[i-1] <= operand."""
+    bucket = 0
+    while bucket < len(thresholds) and value >= thresholds[bucket]:
+        bucket += 1
+    return bucket
+
+
+def pg_text(value) -> str:
+    """value::text in Postgres: booleans print as true/false."""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+class FakeCursor:
+    """Runs the queries of build_reference_profile over a list of rows, with Postgres semantics."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, query, params=()):
+        labelled = [row for row in self.rows if row["churn"] is not None]
+        if "COUNT(*)" in query and "GROUP BY" not in query:
+            self.result = [(len(labelled),)]
+            return
+        feature = re.search(r'"(\w+)"::(float8|text)', query).group(1)
+        values = [row[feature] for row in labelled if row[feature] is not None]
+        if "percentile_cont" in query:
+            self.result = [(percentile_cont([float(v) for v in values], params[0]),)]
+        elif "width_bucket" in query:
+            counts = {}
+            for value in values:
+                bucket = width_bucket(float(value), params[0])
+                counts[bucket] = counts.get(bucket, 0) + 1
+            self.result = list(counts.items())
+        else:
+            counts = {}
+            for value in values:
+                counts[pg_text(value)] = counts.get(pg_text(value), 0) + 1
+            self.result = list(counts.items())
+
+    def fetchone(self):
+        return self.result.pop(0)
+
+    def fetchall(self):
+        result, self.result = self.result, []
+        return result
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self):
+        return FakeCursor(self.rows)
+
+
+def make_rows(n, seed=0, shift=0):
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        # Integer tenure: many values fall exactly on the quantile edges
+        tenure = rng.randint(0, 72) + shift
+        monthly = round(rng.uniform(20, 120), 2)
+        row = {
+            "churn": rng.random() < 0.3,
+            "tenure": tenure,
+            "monthly_charges": monthly,
+            "total_charges": None if rng.random() < 0.05 else round(monthly * tenure, 2),
+        }
+        for feature in CATEGORICAL_FEATURES:
+            if feature in ("senior_citizen", "partner", "dependents", "phone_service", "paperless_billing"):
+                row[feature] = rng.random() < 0.4
+            else:
+                row[feature] = rng.choice(["Yes", "No", "No internet service"])
+        rows.append(row)
+    return rows
+
+
+def monitor_with(profile) -> DriftMonitor:
+    monitor = DriftMonitor(bucket_seconds=60, windows=[3600], min_samples=1, publish_seconds=60)
+    monitor.set_profile(profile)
+    return monitor
+
+
+def test_width_bucket_matches_bisect_right_on_the_edges():
+    rows = make_rows(2000)
+    profile = build_reference_profile(FakeConnection(rows), "customers")
+    for feature in NUMERIC_FEATURES:
+        edges = profile["columns"][feature]["bin_edges"]
+        inner = edges[1:-1]
+        for value in edges + [edges[0] - 1, edges[-1] + 1]:
+            assert width_bucket(value, inner) == bisect_right(inner, value)
+
+
+def test_boolean_text_keys_match_category_key():
+    assert [pg_text(v) for v in (True, False, "Yes", "Fiber optic")] == \
+        [category_key(v) for v in (True, False, "Yes", "Fiber optic")]
+
+    profile = build_reference_profile(FakeConnection(make_rows(500)), "customers")
+    assert set(profile["columns"]["senior_citizen"]["frequencies"]) == {"true", "false"}
+
+
+def test_live_values_matching_the_reference_have_no_drift():
+    rows = make_rows(5000)
+    profile = build_reference_profile(FakeConnection(rows), "customers")
+    monitor = monitor_with(profile)
+    monitor.observe_many([{k: v for k, v in row.items() if k != "churn"} for row in rows])
+
+    result = monitor.drift(3600)
+    assert result["predictions"] == len(rows)
+    assert set(result["features"]) == set(NUMERIC_FEATURES) | set(CATEGORICAL_FEATURES)
+    for feature, scores in result["features"].items():
+        assert scores["psi"] == pytest.approx(0, abs=1e-9), feature
+        assert scores["jensenshannon"] == pytest.approx(0, abs=1e-6), feature
+
+
+def test_shifted_values_drift():
+    profile = build_reference_profile(FakeConnection(make_rows(5000)), "customers")
+    monitor = monitor_with(profile)
+    monitor.observe_many(make_rows(5000, seed=1, shift=24))
+
+    scores = monitor.drift(3600)["features"]
+    assert scores["tenure"]["psi"] > 0.25
+    assert scores["monthly_charges"]["psi"] < 0.1
+
+
+def test_constant_feature_has_a_single_bin():
+    rows = make_rows(200)
+    for row in rows:
+        row["tenure"] = 12
+    profile = build_reference_profile(FakeConnection(rows), "customers")
+    assert profile["columns"]["tenure"]["bin_edges"] == [12.0]
+    assert profile["columns"]["tenure"]["bin_counts"] == [200]
+
+    monitor = monitor_with(profile)
+    monitor.observe_many(rows)
+    assert monitor.drift(3600)["features"]["tenure"]["psi"] == pytest.approx(0, abs=1e-9)
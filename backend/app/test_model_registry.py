@@ -0,0 +1,115 @@
+import hashlib
+import os
+from contextlib import contextmanager
+
+import pytest
+
+from app import db_connection, model
+
+
+class FakeTrainedModels:
+    """trained_models rows with the columns the registry reads and writes (artifact, sha256, promoted_at)."""
+
+    def __init__(self):
+        self.rows = {}  # model_version -> {"artifact", "artifact_sha256", "promoted_at"}
+        self.clock = 0
+        self.down = False
+
+    @contextmanager
+    def connection(self):
+        if self.down:
+            raise ConnectionError("database unreachable")
+        yield self
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.row = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, query, params=()):
+        rows = self.db.rows
+        if query.lstrip().startswith("INSERT INTO trained_models"):
+            version, artifact, sha256 = params
+            self.db.clock += 1
+            rows[version] = {"artifact": artifact, "artifact_sha256": sha256, "promoted_at": self.db.clock}
+        elif "ORDER BY promoted_at DESC" in query:
+            promoted = sorted((r["promoted_at"], v) for v, r in rows.items() if r["promoted_at"])
+            self.row = (promoted[-1][1], rows[promoted[-1][1]]["artifact_sha256"]) if promoted else None
+        elif "SELECT artifact FROM" in query:
+            self.row = (memoryview(rows[params[0]]["artifact"]),)
+
+    def fetchone(self):
+        return self.row
+
+
+@pytest.fixture
+def replicas(tmp_path, monkeypatch):
+    """Two pods sharing the database, each with its own MODEL_ARTIFACTS_DIR."""
+    db = FakeTrainedModels()
+    monkeypatch.setattr(db_connection, "get_pooled_connection", db.connection)
+
+    def pod(name):
+        directory = tmp_path / name
+        directory.mkdir()
+        return str(directory)
+
+    return db, pod("trainer"), pod("other")
+
+
+def test_promoted_model_reaches_the_other_replica(replicas, monkeypatch):
+    db, trainer_dir, other_dir = replicas
+    artifact = os.path.join(trainer_dir, "churn_pipeline_v20250301.pkl")
+    with open(artifact, "wb") as f:
+        f.write(b"fitted pipeline")
+
+    monkeypatch.setattr(model, "MODEL_ARTIFACTS_DIR", trainer_dir)
+    model._store_promoted_artifact("v20250301", artifact)
+
+    monkeypatch.setattr(model, "MODEL_ARTIFACTS_DIR", other_dir)
+    version, path = model.resolve_artifact()
+
+    assert version == "v20250301"
+    assert path == os.path.join(other_dir, "churn_pipeline_v20250301.pkl")
+    with open(path, "rb") as f:
+        assert f.read() == b"fitted pipeline"
+    assert db.rows["v20250301"]["artifact_sha256"] == hashlib.sha256(b"fitted pipeline").hexdigest()
+
+    # While the database is down, the pod keeps the last promoted model it saw
+    db.down = True
+    assert model.resolve_artifact() == (version, path)
+
+
+def test_no_promoted_model_serves_model_path(replicas, monkeypatch):
+    db, _, other_dir = replicas
+    monkeypatch.setattr(model, "MODEL_ARTIFACTS_DIR", other_dir)
+
+    assert model.resolve_artifact() == (model.MODEL_VERSION, model.MODEL_PATH)
+    db.down = True
+    assert model.resolve_artifact() == (model.MODEL_VERSION, model.MODEL_PATH)
+
+
+def test_corrupted_download_is_not_served(replicas, monkeypatch):
+    db, trainer_dir, other_dir = replicas
+    artifact = os.path.join(trainer_dir, "churn_pipeline_v2.pkl")
+    with open(artifact, "wb") as f:
+        f.write(b"fitted pipeline")
+    model._store_promoted_artifact("v2", artifact)
+    db.rows["v2"]["artifact"] = b"truncated"
+
+    monkeypatch.setattr(model, "MODEL_ARTIFACTS_DIR", other_dir)
+
+    assert model.resolve_artifact() == (model.MODEL_VERSION, model.MODEL_PATH)
+    assert os.listdir(other_dir) == []
@@ -0,0 +1,161 @@
+import asyncio
+import threading
+import time
+
+from app import notifier
+from app.notifier import NotificationDispatcher
+
+
+class FakeJobStore:
+    """notification_jobs / notification_job_items in memory, with the lease rules of the SQL in notifier.py."""
+
+    def __init__(self):
+        self.jobs = {}  # job id -> {"status", "owner", "lease_until", "created_at"}
+        self.items = {}  # job id -> {customer_id: status}
+        self._lock = threading.Lock()
+
+    def add_job(self, job_id, customer_ids, owner, lease_until):
+        self.jobs[job_id] = {"status": "running", "owner": owner, "lease_until": lease_until,
+                             "created_at": time.time()}
+        self.items[job_id] = {customer_id: "pending" for customer_id in customer_ids}
+
+    def create_job(self, job_id, customer_ids, owner, lease_seconds):
+        with self._lock:
+            self.add_job(str(job_id), customer_ids, owner, time.time() + lease_seconds)
+            self.jobs[str(job_id)]["status"] = "queued"
+
+    def start_job(self, job_id, owner):
+        with self._lock:
+            job = self.jobs[str(job_id)]
+            if job["owner"] != owner or job["status"] not in ("queued", "running"):
+                return None
+            job["status"] = "running"
+            return [(c, 1, f"token-{c}") for c, status in self.items[str(job_id)].items() if status == "pending"]
+
+    def set_item_status(self, job_id, customer_id, status, prediction_id=None, attempts=0, error=None):
+        with self._lock:
+            self.items[str(job_id)][customer_id] = status
+
+    def finish_job(self, job_id, status, owner):
+        with self._lock:
+            job = self.jobs[str(job_id)]
+            if job["owner"] == owner:
+                job["status"] = status
+
+    def renew_leases(self, owner, lease_seconds):
+        with self._lock:
+            renewed = set()
+            for job_id, job in self.jobs.items():
+                if job["owner"] == owner and job["status"] in ("queued", "running"):
+                    job["lease_until"] = time.time() + lease_seconds
+                    renewed.add(job_id)
+            return renewed
+
+    def claim_expired_jobs(self, owner, lease_seconds):
+        with self._lock:
+            claimed = []
+            for job_id, job in sorted(self.jobs.items(), key=lambda item: item[1]["created_at"]):
+                if job["status"] in ("queued", "running") and job["lease_until"] < time.time():
+                    job["owner"], job["lease_until"] = owner, time.time() + lease_seconds
+                    claimed.append(job_id)
+            return claimed
+
+
+class FakeResponse:
+    def raise_for_status(self):
+        pass
+
+
+def use_store(monkeypatch, store):
+    monkeypatch.setattr(notifier, "_prepare_tables", lambda: None)
+    monkeypatch.setattr(notifier, "_create_job", store.create_job)
+    monkeypatch.setattr(notifier, "_start_job", store.start_job)
+    monkeypatch.setattr(notifier, "_set_item_status", store.set_item_status)
+    monkeypatch.setattr(notifier, "_finish_job", store.finish_job)
+    monkeypatch.setattr(notifier, "_renew_leases", store.renew_leases)
+    monkeypatch.setattr(notifier, "_claim_expired_jobs", store.claim_expired_jobs)
+
+
+def make_dispatcher(sent):
+    dispatcher = NotificationDispatcher("http://n8n.test/webhook", rate=0, burst=1, concurrency=4,
+                                        max_attempts=1, backoff_seconds=0, timeout_seconds=1, lease_seconds=3)
+
+    async def post(payload):
+        sent.append((dispatcher.owner, payload["customer_id"]))
+        return FakeResponse()
+
+    dispatcher._post = post
+    return dispatcher
+
+
+async def run_replicas(dispatchers, until):
+    for dispatcher in dispatchers:
+        await dispatcher.start()
+    deadline = time.monotonic() + 5
+    while not until() and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    for dispatcher in dispatchers:
+        await dispatcher.stop()
+
+
+def test_orphaned_job_is_resumed_by_one_replica(monkeypatch):
+    store = FakeJobStore()
+    use_store(monkeypatch, store)
+    # Left running by a pod that died; its lease has run out
+    store.add_job("orphan", [f"C{i}" for i in range(20)], owner="dead-pod", lease_until=time.time() - 1)
+    sent = []
+    replicas = [make_dispatcher(sent), make_dispatcher(sent)]
+
+    asyncio.run(run_replicas(replicas, lambda: store.jobs["orphan"]["status"] == "completed"))
+
+    assert store.jobs["orphan"]["status"] == "completed"
+    assert sorted(customer for _, customer in sent) == sorted(f"C{i}" for i in range(20))
+    assert len({owner for owner, _ in sent}) == 1
+
+
+def test_live_replica_keeps_its_job(monkeypatch):
+    store = FakeJobStore()
+    use_store(monkeypatch, store)
+    # Held by a live pod (lease not expired): a restarting replica must not pick it up
+    store.add_job("held", ["C1", "C2"], owner="live-pod", lease_until=time.time() + 60)
+    sent = []
+    restarted = make_dispatcher(sent)
+
+    async def scenario():
+        await restarted.start()
+        job_id = await restarted.enqueue(["C3"])
+        deadline = time.monotonic() + 5
+        while store.jobs[str(job_id)]["status"] != "completed" and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        await restarted.stop()
+
+    asyncio.run(scenario())
+
+    assert [customer for _, customer in sent] == ["C3"]
+    assert store.jobs["held"]["owner"] == "live-pod"
+    assert set(store.items["held"].values()) == {"pending"}
+
+
+def test_taken_over_job_stops_sending(monkeypatch):
+    store = FakeJobStore()
+    use_store(monkeypatch, store)
+    sent = []
+    dispatcher = make_dispatcher(sent)
+
+    async def scenario():
+        await dispatcher.start()
+        await asyncio.sleep(0.1)
+        store.add_job("stolen", ["C1"], owner=dispatcher.owner, lease_until=time.time() + 60)
+        dispatcher._held["stolen"] = time.monotonic()
+        # Another process claims it (e.g. after a pause longer than the lease)
+        store.jobs["stolen"]["owner"] = "other-pod"
+        await asyncio.sleep(1.2)  # next lease renewal
+        dispatcher._queue.put_nowait("stolen")
+        await asyncio.sleep(0.2)
+        await dispatcher.stop()
+
+    asyncio.run(scenario())
+
+    assert sent == []
+    assert store.jobs["stolen"]["status"] == "running"
+    assert store.items["stolen"]["C1"] == "pending"
@@ -0,0 +1,69 @@
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+from app import prediction_writer
+from app.prediction_writer import PredictionWriter
+
+
+class FlakyPredictions:
+    """predictions table whose first commit goes through but loses its acknowledgement."""
+
+    def __init__(self):
+        self.table = {}
+        self.lost_acks = 1
+
+    @asynccontextmanager
+    async def connection(self):
+        yield self
+
+    async def insert(self, conn, records):
+        self._pending = {r["prediction_id"]: r for r in records if r["prediction_id"] not in self.table}
+        return set(self._pending)
+
+    async def commit(self):
+        self.table.update(self._pending)
+        if self.lost_acks:
+            self.lost_acks -= 1
+            raise ConnectionError("server closed the connection unexpectedly")
+
+
+def record(prediction_id):
+    return {"prediction_id": prediction_id, "customer_id": f"C{prediction_id}", "churn_score": 0.9,
+            "churn_label": True, "model_version": "v1", "features": {}, "token": f"t{prediction_id}"}
+
+
+def test_retry_after_lost_commit_counts_rows_once(monkeypatch):
+    db = FlakyPredictions()
+    counted = []
+    monkeypatch.setattr(prediction_writer, "get_async_connection", db.connection)
+    monkeypatch.setattr(prediction_writer, "insert_reserved_predictions_async", db.insert)
+    monkeypatch.setattr(prediction_writer, "count_predictions", counted.extend)
+    monkeypatch.setattr(prediction_writer, "drift_monitor", SimpleNamespace(observe_many=lambda features: None))
+    writer = PredictionWriter(True, 100, 10, 10, 100, 1, 10, max_retries=3)
+
+    batch = [record(i) for i in range(1, 4)]
+    asyncio.run(writer._flush(batch))
+
+    assert sorted(db.table) == [1, 2, 3]
+    assert writer.retries == 1
+    # The retry inserted nothing: the rows were committed by the first attempt
+    assert (writer.written, writer.already_written, writer.dropped) == (0, 3, 0)
+    assert counted == []
+
+
+def test_partly_written_batch_counts_the_new_rows(monkeypatch):
+    db = FlakyPredictions()
+    db.lost_acks = 0
+    db.table[2] = record(2)
+    counted = []
+    monkeypatch.setattr(prediction_writer, "get_async_connection", db.connection)
+    monkeypatch.setattr(prediction_writer, "insert_reserved_predictions_async", db.insert)
+    monkeypatch.setattr(prediction_writer, "count_predictions", counted.extend)
+    monkeypatch.setattr(prediction_writer, "drift_monitor", SimpleNamespace(observe_many=lambda features: None))
+    writer = PredictionWriter(True, 100, 10, 10, 100, 1, 10)
+
+    asyncio.run(writer._flush([record(i) for i in range(1, 4)]))
+
+    assert (writer.written, writer.already_written) == (2, 1)
+    assert [r["prediction_id"] for r in counted] == [1, 3]
@@ -0,0 +1,141 @@
+import csv
+import re
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from prometheus_client import REGISTRY
+
+from app import stream_consumer
+from app.stream_consumer import InMemoryBroker, InMemorySource, StreamConsumer
+
+
+class FakeCursor:
+    """The staging COPY and INSERT ... ON CONFLICT of load_customers, over a dict of customers."""
+
+    def __init__(self, db):
+        self.db = db
+        self.result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, query, params=()):
+        self.result = []
+        if "CREATE TEMP TABLE" in query:
+            self.db.stage = []
+        elif "INSERT INTO customers" in query:
+            self._upsert(query)
+        # SELECT token FROM predictions: no prediction written yet
+
+    def copy_expert(self, query, buffer):
+        columns = [c.strip() for c in re.search(r"\((.*?)\) FROM STDIN", query).group(1).split(",")]
+        for values in csv.reader(buffer):
+            self.db.stage.append({c: None if v == "\\N" else v for c, v in zip(columns, values)})
+
+    def _upsert(self, query):
+        columns = [c.strip() for c in re.search(r"INSERT INTO customers \((.*?)\)", query).group(1).split(",")]
+        updates = dict(re.findall(r"(\w+)=(COALESCE\(EXCLUDED\.\w+, customers\.\w+\)|EXCLUDED\.\w+)", query))
+        latest = {}
+        for row in sorted(self.db.stage, key=lambda r: int(r["row_num"])):
+            latest[row["customer_id"]] = row
+        for customer_id, row in latest.items():
+            stored = self.db.customers.get(customer_id)
+            if stored is None:
+                self.db.customers[customer_id] = {c: row[c] for c in columns}
+                continue
+            for column, expression in updates.items():
+                if expression.startswith("COALESCE") and row[column] is None:
+                    continue
+                stored[column] = row[column]
+
+    def fetchall(self):
+        return self.result
+
+
+class FakeDatabase:
+    def __init__(self, customers):
+        self.customers = customers
+        self.stage = []
+        self.predictions = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+
+def run_consumer(monkeypatch, db, messages):
+    @contextmanager
+    def connection():
+        yield db
+
+    monkeypatch.setattr(stream_consumer, "get_pooled_connection", connection)
+    monkeypatch.setattr(stream_consumer, "model_registry", SimpleNamespace(get=lambda: SimpleNamespace(version="v1")))
+    monkeypatch.setattr(stream_consumer, "fetch_customers_features",
+                        lambda conn, ids: {cid: dict(db.customers[cid]) for cid in ids})
+    monkeypatch.setattr(stream_consumer, "predict_churn_batch", lambda features, active: [0.2] * len(features))
+    monkeypatch.setattr(stream_consumer, "insert_predictions", lambda conn, records: db.predictions.extend(records))
+
+    broker = InMemoryBroker()
+    for message in messages:
+        broker.send("new-customers", message, key=message["customer_id"])
+    consumer = StreamConsumer(InMemorySource(broker, "new-customers", "test", batch_size=100))
+    consumer.run(max_idle_polls=1)
+    return consumer
+
+
+def producer_message(customer_id, tenure, **extra):
+    # Fields of pipeline/producer/utils.py:generate_customer: no churn, status or notified
+    return {
+        "customer_id": customer_id, "gender": "Female", "senior_citizen": False, "partner": True,
+        "dependents": False, "tenure": tenure, "phone_service": True, "multiple_lines": "No",
+        "internet_service": "Fiber optic", "online_security": "No", "online_backup": "Yes",
+        "device_protection": "No", "tech_support": "No", "streaming_tv": "Yes", "streaming_movies": "No",
+        "contract": "Month-to-month", "paperless_billing": True, "payment_method": "Credit card",
+        "monthly_charges": 80.5, "total_charges": 80.5 * tenure,
+        "first_name": "Ada", "last_name": "Lovelace", "email": "ada@example.com", **extra,
+    }
+
+
+def test_replayed_message_keeps_the_churn_label(monkeypatch):
+    labelled = {
+        "customer_id": "1234-ABCDE", "tenure": "10", "churn": "t", "status": "active", "notified": "t",
+    }
+    db = FakeDatabase({"1234-ABCDE": labelled})
+
+    consumer = run_consumer(monkeypatch, db, [
+        producer_message("1234-ABCDE", 11),
+        producer_message("5678-FGHIJ", 3, churn=False),
+    ])
+
+    customer = db.customers["1234-ABCDE"]
+    assert customer["tenure"] == "11"
+    assert customer["payment_method"] == "Credit card (automatic)"
+    assert (customer["churn"], customer["status"], customer["notified"]) == ("t", "active", "t")
+    # A label the message does carry is written, in the same batch
+    assert db.customers["5678-FGHIJ"]["churn"] == "f"
+    assert len(db.predictions) == 2
+    assert consumer.stats()["rejected_rows"] == 0
+
+
+def test_prometheus_metrics_count_committed_batches(monkeypatch):
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    before = {name: sample(name) for name in (
+        "stream_messages_total", "stream_invalid_messages_total", "stream_predictions_total", "stream_batches_total",
+    )}
+    db = FakeDatabase({})
+
+    run_consumer(monkeypatch, db, [producer_message("1234-ABCDE", 4), producer_message("5678-FGHIJ", 7)])
+
+    assert sample("stream_messages_total") - before["stream_messages_total"] == 2
+    assert sample("stream_invalid_messages_total") - before["stream_invalid_messages_total"] == 0
+    assert sample("stream_predictions_total") - before["stream_predictions_total"] == 2
+    assert sample("stream_batches_total") - before["stream_batches_total"] == 1
+    # Everything consumed: the lag gauge of the in-memory partition is back to 0
+    assert sample("stream_consumer_lag", partition="new-customers-0") == 0
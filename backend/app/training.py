@@ -1,23 +1,115 @@
-from fastapi import HTTPException
-from app.db_connection import get_db_connection
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
 
-from config import COOLDOWN_MINUTES
+from app.db_connection import get_pooled_connection, ensure_training_tables
+from app.model import registry as model_registry
+from app.training_job import run_training_job
 
-def retrain_and_reload_model(reason: str):
+from config import (
+    COOLDOWN_MINUTES,
+    TRAINING_REFERENCE_TABLE,
+    MODEL_ARTIFACTS_DIR,
+    RETRAIN_HOLDOUT_FRACTION,
+    RETRAIN_MAX_AUC_DROP,
+    RETRAIN_TIMEOUT_SECONDS,
+)
+
+def _set_trained_model_status(model_version: str, status: str, notes: dict | str):
+    with get_pooled_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE trained_models SET status=%s, ended_at=NOW(), notes=%s WHERE model_version=%s",
+                (status, notes if isinstance(notes, str) else json.dumps(notes), model_version),
+            )
+        conn.commit()
+
+
+def retrain_and_reload_model(reason: str) -> dict:
     """
-    Branche ici votre vrai retrain.
-    - tu peux réentraîner sur ref + TOUT feedback (même anciens)
-    - le reset used_for_training sert juste à gérer le déclenchement
+    Réentraîne sur ref + TOUT feedback (même anciens) et recharge le modèle servi.
+    - le fit tourne dans un process séparé (spawn) pour ne pas bloquer les workers de l'API
+    - le nouveau pipeline est évalué sur un holdout, à côté du modèle actuel
+    - l'artefact versionné est enregistré dans trained_models
+    - il est promu dans le registre de modèles (sans redémarrage), sauf si son ROC AUC baisse de plus de RETRAIN_MAX_AUC_DROP
     """
-    print(f"Retraining... reason={reason} (placeholder)")
+    started = time.perf_counter()
+    model_version = "v" + datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+    artifact_path = os.path.join(MODEL_ARTIFACTS_DIR, f"churn_pipeline_{model_version}.pkl")
 
+    with get_pooled_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO trained_models (model_version, training_reason, status) VALUES (%s, %s, 'running')",
+                (model_version, reason),
+            )
+        conn.commit()
 
-def start_retrain(reason: str):
-    conn = None
     try:
-        conn = get_db_connection()
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            future = executor.submit(
+                run_training_job,
+                TRAINING_REFERENCE_TABLE,
+                artifact_path,
+                model_registry.get().path,
+                RETRAIN_HOLDOUT_FRACTION,
+            )
+            result = future.result(timeout=RETRAIN_TIMEOUT_SECONDS)
+
+        metrics = result["metrics"]
+        baseline = result["baseline_metrics"]
+        promoted = baseline is None or metrics["roc_auc"] >= baseline["roc_auc"] - RETRAIN_MAX_AUC_DROP
+
+        if promoted:
+            # Validated on the canned batch, then served here and picked up by the other workers
+            model_registry.promote(model_version, artifact_path)
+            print(f"[RETRAIN] Serving {model_version} (holdout ROC AUC {metrics['roc_auc']:.4f})")
+        else:
+            print(
+                f"[RETRAIN] Keeping current model: {model_version} ROC AUC {metrics['roc_auc']:.4f} "
+                f"vs {baseline['roc_auc']:.4f}"
+            )
+    except Exception as e:
+        _set_trained_model_status(model_version, "failed", str(e))
+        raise
+
+    summary = dict(result)
+    summary.update(
+        model_version=model_version,
+        promoted=promoted,
+        wall_time_seconds=time.perf_counter() - started,
+    )
+    _set_trained_model_status(model_version, "success", {
+        "artifact_path": artifact_path,
+        "promoted": promoted,
+        "rows_used": summary["rows_used"],
+        "metrics": metrics,
+        "metric_deltas": summary["metric_deltas"],
+    })
+    return summary
+
+
+def prepare_training_tables():
+    """Create/upgrade `trained_models` and `training_runs` at startup: the model watcher reads the promoted model there."""
+    with get_pooled_connection() as conn:
+        ensure_training_tables(conn)
+        conn.commit()
+
+
+def open_retrain_run(reason: str) -> dict:
+    """
+    Ouvre un run dans training_runs (cooldown + lock soft) et marque le feedback comme utilisé.
+    Rapide : renvoie {"status": "started", "run_id", ...} ou {"status": "skipped", "message"}.
+    L'entraînement lui-même est fait par run_retrain.
+    """
+    with get_pooled_connection() as conn:
         conn.autocommit = False
 
+        ensure_training_tables(conn)
+
         with conn.cursor() as cur:
             # 1) cooldown: si retrain récent, skip
             cur.execute(
@@ -72,36 +164,91 @@ def start_retrain(reason: str):
 
         conn.commit()
 
-        # 6) retrain réel (à brancher)
-        retrain_and_reload_model(reason=reason)
+    return {"status": "started", "run_id": run_id, "reason": reason, "used_new_feedback": new_feedback}
+
 
-        # 7) success
-        conn = get_db_connection()
+def run_retrain(run_id: int, reason: str, new_feedback: int) -> dict:
+    """
+    Entraîne pour un run ouvert par open_retrain_run et enregistre son issue dans training_runs.
+    Lancé en tâche de fond : une erreur est enregistrée (status='failed') et renvoyée, pas levée.
+    """
+    # 6) retrain réel — sans garder de connexion du pool pendant l'entraînement
+    try:
+        result = retrain_and_reload_model(reason=reason)
+    except Exception as e:
+        print(f"[RETRAIN] Run {run_id} failed: {e}")
+        with get_pooled_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE training_runs SET status='failed', ended_at=NOW(), notes=%s WHERE run_id=%s",
+                    (f"used_new_feedback={new_feedback} error={e}", run_id),
+                )
+            conn.commit()
+        return {"status": "failed", "run_id": run_id, "reason": reason, "error": str(e)}
+
+    # 7) success
+    with get_pooled_connection() as conn:
         with conn.cursor() as cur:
             cur.execute(
                 """
                 UPDATE training_runs
-                SET status='success', ended_at=NOW(), notes=%s
+                SET status='success', ended_at=NOW(), notes=%s,
+                    model_version=%s, promoted=%s, rows_used=%s, feedback_rows=%s,
+                    wall_time_seconds=%s, metrics=%s, metric_deltas=%s
                 WHERE run_id=%s
                 """,
-                (f"used_new_feedback={new_feedback}", run_id),
+                (
+                    f"used_new_feedback={new_feedback}",
+                    result["model_version"],
+                    result["promoted"],
+                    result["rows_used"],
+                    result["feedback_rows"],
+                    result["wall_time_seconds"],
+                    json.dumps(result["metrics"]),
+                    json.dumps(result["metric_deltas"]) if result["metric_deltas"] else None,
+                    run_id,
+                ),
             )
         conn.commit()
 
-        return {
-            "status": "ok",
-            "run_id": run_id,
-            "reason": reason,
-            "used_new_feedback": new_feedback,
-        }
+    return {
+        "status": "ok",
+        "run_id": run_id,
+        "reason": reason,
+        "used_new_feedback": new_feedback,
+        "model_version": result["model_version"],
+        "promoted": result["promoted"],
+        "metrics": result["metrics"],
+        "metric_deltas": result["metric_deltas"],
+    }
+
 
+def start_retrain(reason: str) -> dict:
+    """Ouvre un run puis entraîne dans le même appel (tâche de fond de /feedback)."""
+    try:
+        run = open_retrain_run(reason)
     except Exception as e:
-        try:
-            if conn:
-                conn.rollback()
-        except Exception:
-            pass
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if conn:
-            conn.close()
+        print(f"[RETRAIN] Could not open a training run: {e}")
+        return {"status": "failed", "reason": reason, "error": str(e)}
+    if run["status"] != "started":
+        return run
+    return run_retrain(run["run_id"], reason, run["used_new_feedback"])
+
+
+def get_training_run(run_id: int) -> dict | None:
+    """Ligne de training_runs, pour suivre un run lancé par POST /retrain."""
+    with get_pooled_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT run_id, reason, status, started_at, ended_at, notes, model_version, promoted,
+                       rows_used, feedback_rows, wall_time_seconds, metrics, metric_deltas
+                FROM training_runs
+                WHERE run_id=%s
+                """,
+                (run_id,),
+            )
+            row = cur.fetchone()
+            columns = [d[0] for d in cur.description]
+        conn.commit()
+    return dict(zip(columns, row)) if row else None
@@ -0,0 +1,131 @@
+"""
+Retraining job, run in a separate process by app.training so the API workers
+keep serving while the pipeline is fitted.
+
+Everything here is picklable and imports nothing from FastAPI: the parent
+passes plain arguments and gets a plain dict back.
+"""
+import os
+import time
+
+import joblib
+import pandas as pd
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score, roc_auc_score
+from sklearn.model_selection import train_test_split
+
+from app.db_connection import get_db_connection
+from app.data_fetch import FEATURE_COLUMNS
+from app.model import add_pipeline_to_path
+
+TARGET = "churn"
+MODEL_INPUTS = [c for c in FEATURE_COLUMNS if c != "email"]
+NUMERIC_COLUMNS = ["monthly_charges", "total_charges", "tenure"]
+
+
+def load_training_data(reference_table: str) -> tuple[pd.DataFrame, int, int]:
+    """
+    Reference rows (labelled `churn`) plus every answered feedback, whose
+    features come from the prediction it answers (`predictions.features_json`).
+    Returns (data, reference_rows, feedback_rows).
+    """
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f'SELECT * FROM "{reference_table}" WHERE {TARGET} IS NOT NULL')
+            columns = [desc[0] for desc in cur.description]
+            reference = pd.DataFrame(cur.fetchall(), columns=columns)
+
+            cur.execute(
+                """
+                SELECT p.features_json, f.feedback_label
+                FROM feedback f
+                JOIN predictions p ON p.prediction_id = f.prediction_id
+                WHERE f.feedback_label IS NOT NULL
+                ORDER BY f.answered_at NULLS FIRST, f.feedback_id
+                """
+            )
+            rows = cur.fetchall()
+    finally:
+        conn.close()
+
+    feedback = pd.DataFrame.from_records([features for features, _ in rows])
+    if len(feedback):
+        feedback[TARGET] = [bool(label) for _, label in rows]
+
+    # Only the model inputs: contact details and status columns only exist on the reference side
+    inputs = [c for c in MODEL_INPUTS if c in reference.columns]
+    columns = ["customer_id", *inputs, TARGET]
+    data = pd.concat([reference.reindex(columns=columns), feedback.reindex(columns=columns)], ignore_index=True)
+
+    for column in NUMERIC_COLUMNS:
+        if column in data.columns:
+            data[column] = pd.to_numeric(data[column], errors="coerce")
+    # total_charges is imputed by the pipeline, every other input must be present
+    required = [c for c in inputs if c != "total_charges"]
+    data = data.dropna(subset=required)
+    data[TARGET] = data[TARGET].astype(bool)
+
+    # The pipeline drops duplicate rows on transform, which would misalign X and y:
+    # keep the most recent label for identical feature rows
+    features = [c for c in data.columns if c != TARGET]
+    data = data.drop_duplicates(subset=features, keep="last").reset_index(drop=True)
+    return data, len(reference), len(feedback)
+
+
+def evaluate(model, X: pd.DataFrame, y: pd.Series) -> dict:
+    proba = model.predict_proba(X)[:, 1]
+    predicted = proba >= 0.5
+    return {
+        "roc_auc": float(roc_auc_score(y, proba)),
+        "accuracy": float(accuracy_score(y, predicted)),
+        "precision": float(precision_score(y, predicted, zero_division=0)),
+        "recall": float(recall_score(y, predicted, zero_division=0)),
+        "f1": float(f1_score(y, predicted, zero_division=0)),
+    }
+
+
+def run_training_job(reference_table: str, artifact_path: str, current_model_path: str,
+                     holdout_fraction: float, random_state: int = 42) -> dict:
+    """
+    Fit build_pipeline() on reference + feedback data, score it and the current
+    model on the same stratified holdout, and write the new pipeline to `artifact_path`.
+    """
+    add_pipeline_to_path()
+    from build_pipeline import build_pipeline
+
+    started = time.perf_counter()
+    data, reference_rows, feedback_rows = load_training_data(reference_table)
+    X = data.drop(columns=[TARGET])
+    y = data[TARGET].astype(int)
+    X_train, X_holdout, y_train, y_holdout = train_test_split(
+        X, y, test_size=holdout_fraction, stratify=y, random_state=random_state
+    )
+
+    pipeline = build_pipeline()
+    pipeline.fit(X_train, y_train)
+    metrics = evaluate(pipeline, X_holdout, y_holdout)
+
+    try:
+        baseline = evaluate(joblib.load(current_model_path), X_holdout, y_holdout)
+    except Exception as e:
+        print(f"[RETRAIN] Current model could not be scored on the holdout: {e}")
+        baseline = None
+    deltas = {k: metrics[k] - baseline[k] for k in metrics} if baseline else None
+
+    # Write next to the final name and rename, so a watcher never sees a partial file
+    os.makedirs(os.path.dirname(artifact_path), exist_ok=True)
+    partial_path = artifact_path + ".partial"
+    joblib.dump(pipeline, partial_path)
+    os.replace(partial_path, artifact_path)
+    return {
+        "artifact_path": artifact_path,
+        "rows_used": len(data),
+        "reference_rows": reference_rows,
+        "feedback_rows": feedback_rows,
+        "train_rows": len(X_train),
+        "holdout_rows": len(X_holdout),
+        "metrics": metrics,
+        "baseline_metrics": baseline,
+        "metric_deltas": deltas,
+        "fit_seconds": time.perf_counter() - started,
+    }
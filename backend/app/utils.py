@@ -7,3 +7,16 @@ def generate_customer_id() -> str:
     def part() -> str:
         return "".join(random.choice(alphabet) for _ in range(4))
     return f"{part()}-{part()}"
+
+
+def generate_customer_ids(count: int) -> list[str]:
+    """Generate `count` distinct IDs in the generate_customer_id format, in one pass."""
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+    ids = set()
+    while len(ids) < count:
+        chars = random.choices(alphabet, k=8 * (count - len(ids)))
+        ids.update(
+            "".join(chars[i:i + 4]) + "-" + "".join(chars[i + 4:i + 8])
+            for i in range(0, len(chars), 8)
+        )
+    return list(ids)[:count]
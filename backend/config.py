@@ -8,10 +8,72 @@ _DEFAULT_MODEL_PATH = _BASE_DIR / "artifacts" / "churn_pipeline.pkl"
 
 # Allow overriding via environment variable MODEL_PATH
 MODEL_PATH = os.getenv("MODEL_PATH", str(_DEFAULT_MODEL_PATH))
+MODEL_VERSION = os.getenv("MODEL_VERSION", "v1")  # version stamped on predictions made with MODEL_PATH
+MODEL_WATCH_INTERVAL_SECONDS = float(os.getenv("MODEL_WATCH_INTERVAL_SECONDS", 10))  # <= 0 disables hot reload
+
+# Score requests with the flat NumPy export of the pipeline instead of sklearn/pandas
+COMPILED_SCORING = os.getenv("COMPILED_SCORING", "true").lower() == "true"
+# Threads that run model scoring off the event loop (async endpoints)
+SCORING_THREADS = int(os.getenv("SCORING_THREADS", 4))
+# Concurrent /predict calls are scored together: up to this many rows per batch...
+SCORING_BATCH_MAX_SIZE = int(os.getenv("SCORING_BATCH_MAX_SIZE", 64))  # <= 1 disables micro-batching
+# ...waiting at most this long after the first request of a batch
+SCORING_BATCH_MAX_DELAY_MS = float(os.getenv("SCORING_BATCH_MAX_DELAY_MS", 2))
+
+# Memory bound of the in-process score cache (app/prediction_cache.py), 0 disables it
+PREDICTION_CACHE_MAX_BYTES = int(os.getenv("PREDICTION_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+# Write-behind for prediction inserts (app/prediction_writer.py): answer first, insert in batches
+PREDICTION_WRITE_BEHIND = os.getenv("PREDICTION_WRITE_BEHIND", "false").lower() == "true"
+PREDICTION_WRITE_QUEUE_SIZE = int(os.getenv("PREDICTION_WRITE_QUEUE_SIZE", 10000))  # predictions waiting to be written
+PREDICTION_WRITE_BATCH_SIZE = int(os.getenv("PREDICTION_WRITE_BATCH_SIZE", 500))
+PREDICTION_WRITE_FLUSH_MS = float(os.getenv("PREDICTION_WRITE_FLUSH_MS", 50))
+PREDICTION_WRITE_ENQUEUE_TIMEOUT_MS = float(os.getenv("PREDICTION_WRITE_ENQUEUE_TIMEOUT_MS", 100))  # then write synchronously
+PREDICTION_WRITE_SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("PREDICTION_WRITE_SHUTDOWN_TIMEOUT_SECONDS", 30))
+PREDICTION_ID_BLOCK = int(os.getenv("PREDICTION_ID_BLOCK", 1000))  # ids reserved per sequence round trip
+PREDICTION_WRITE_MAX_RETRIES = int(os.getenv("PREDICTION_WRITE_MAX_RETRIES", 10))  # per batch, then dead-lettered
+# Predictions the writer gives up on are appended here as JSON lines; empty only logs them
+PREDICTION_DEAD_LETTER_PATH = os.getenv("PREDICTION_DEAD_LETTER_PATH", str(_BASE_DIR / "prediction_dead_letter.jsonl"))
 
 K_RETRAIN = int(os.getenv("K_RETRAIN", 20))  # example
 COOLDOWN_MINUTES = int(os.getenv("COOLDOWN_MINUTES", 10))  # anti-boucle
 
+# Retraining (app/training.py)
+TRAINING_REFERENCE_TABLE = os.getenv("TRAINING_REFERENCE_TABLE", os.getenv("TABLE_NAME", "customers"))  # labelled `churn` rows
+MODEL_ARTIFACTS_DIR = os.getenv("MODEL_ARTIFACTS_DIR", str(_BASE_DIR / "artifacts" / "models"))  # versioned retrained pipelines
+RETRAIN_HOLDOUT_FRACTION = float(os.getenv("RETRAIN_HOLDOUT_FRACTION", 0.2))
+RETRAIN_MAX_AUC_DROP = float(os.getenv("RETRAIN_MAX_AUC_DROP", 0.01))  # keep the current model if ROC AUC drops more than this
+RETRAIN_TIMEOUT_SECONDS = float(os.getenv("RETRAIN_TIMEOUT_SECONDS", 1800))
+
+# Dashboard aggregates are cached in memory and recomputed after this many seconds (or on writes)
+DASHBOARD_CACHE_TTL_SECONDS = float(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", 30))
+
 # Service URLs
 N8N_URL = os.getenv("N8N_URL", "http://n8n:5678")
-FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
\ No newline at end of file
+FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
+
+# Notification dispatcher (/notify)
+NOTIFY_WEBHOOK_URL = os.getenv("NOTIFY_WEBHOOK_URL", f"{N8N_URL}/webhook/notify-churn")
+NOTIFY_RATE_PER_SECOND = float(os.getenv("NOTIFY_RATE_PER_SECOND", 0.1))  # token bucket refill rate, <= 0 disables
+NOTIFY_BURST = int(os.getenv("NOTIFY_BURST", 1))  # token bucket capacity
+NOTIFY_CONCURRENCY = int(os.getenv("NOTIFY_CONCURRENCY", 4))  # webhook calls in flight
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", 3))
+NOTIFY_BACKOFF_SECONDS = float(os.getenv("NOTIFY_BACKOFF_SECONDS", 2))  # doubled after each failed attempt
+NOTIFY_TIMEOUT_SECONDS = float(os.getenv("NOTIFY_TIMEOUT_SECONDS", 30))
+NOTIFY_LEASE_SECONDS = float(os.getenv("NOTIFY_LEASE_SECONDS", 60))  # a job whose owner stops renewing is taken over after this
+
+# Streaming consumer (python -m app.stream_consumer): scores customers published on Kafka
+KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", os.getenv("EVENT_HUBS_BROKER", "localhost:9092"))
+EVENT_HUBS_CONNECTION_STRING = os.getenv("EVENT_HUBS_CONNECTION_STRING", "")  # set: SASL_SSL to Event Hubs, empty: plaintext broker
+KAFKA_TOPIC = os.getenv("KAFKA_TOPIC", "new-customers")
+KAFKA_GROUP_ID = os.getenv("KAFKA_GROUP_ID", "churn-scoring")
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 500))  # messages per poll / transaction
+STREAM_POLL_TIMEOUT_MS = int(os.getenv("STREAM_POLL_TIMEOUT_MS", 1000))
+STREAM_METRICS_PORT = int(os.getenv("STREAM_METRICS_PORT", 8081))  # Prometheus /metrics, 0 disables
+
+# Online drift of the model inputs (app/drift_monitor.py), fed by the prediction write path
+DRIFT_WINDOWS_SECONDS = [float(w) for w in os.getenv("DRIFT_WINDOWS_SECONDS", "3600,86400").split(",") if w.strip()]  # empty disables
+DRIFT_BUCKET_SECONDS = float(os.getenv("DRIFT_BUCKET_SECONDS", 60))  # windows slide by this step
+DRIFT_MIN_SAMPLES = int(os.getenv("DRIFT_MIN_SAMPLES", 100))  # fewer predictions in a window: no drift value
+DRIFT_PUBLISH_SECONDS = float(os.getenv("DRIFT_PUBLISH_SECONDS", 30))  # gauge refresh period
+DRIFT_PROFILE_DIR = os.getenv("DRIFT_PROFILE_DIR", str(_BASE_DIR / "artifacts" / "drift"))  # reference profiles per model version
@@ -0,0 +1,292 @@
+"""
+Load benchmark of the API against a local Postgres.
+
+Seeds the database named by the RDS_* variables with synthetic customers
+(drawn like pipeline/producer's generate_customer), starts the app with uvicorn
+unless --base-url points at a running one, drives each endpoint at a fixed
+concurrency and writes throughput and latency percentiles per endpoint to JSON.
+
+Usage (from the backend folder):
+    python scripts/benchmark_api.py --customers 10000 --requests 2000 --concurrency 32 --output bench.json
+    python scripts/benchmark_api.py --skip-seed --compare bench.json --max-regression 0.2
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+PRODUCER_DIR = BACKEND_DIR.parent / "pipeline" / "producer"
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(PRODUCER_DIR))
+
+from app.customer_loader import UPLOAD_COLUMNS  # noqa: E402
+from app.stream_consumer import VALUE_ALIASES  # noqa: E402
+from utils import NamePool, generate_customer_batch  # noqa: E402
+
+ENDPOINTS = ["predict", "predict_batch", "customers", "customer_by_id", "dashboard_stats", "upload_csv"]
+
+
+# > Synthetic data
+
+def synthetic_customers(count: int, rng, names) -> pd.DataFrame:
+    """`count` customers as CSV-like strings, with the producer's labels mapped to the table's."""
+    rows = generate_customer_batch(count, rng, names)
+    data = pd.DataFrame(rows)
+    for column, aliases in VALUE_ALIASES.items():
+        data[column] = data[column].replace(aliases)
+    columns = [c for c in UPLOAD_COLUMNS if c in data.columns]
+    return data[columns].astype(str)
+
+
+def seed_customers(count: int, rng, names, chunk_rows: int = 50_000) -> list[str]:
+    """Upsert `count` customers through the upload loader and return their IDs."""
+    from app.customer_loader import load_customers
+    from app.db_connection import get_db_connection, ensure_customers_table
+
+    conn = get_db_connection()
+    try:
+        ensure_customers_table(conn)
+        chunks = [synthetic_customers(min(chunk_rows, count - start), rng, names)
+                  for start in range(0, count, chunk_rows)]
+        _, errors, _, upserted_ids = load_customers(conn, chunks)
+        conn.commit()
+    finally:
+        conn.close()
+    if errors:
+        print(f"{len(errors)} seed rows rejected, first: {errors[0]}")
+    return sorted(upserted_ids)
+
+
+def existing_customer_ids(limit: int) -> list[str]:
+    from app.db_connection import get_db_connection
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT customer_id FROM customers ORDER BY random() LIMIT %s", (limit,))
+            return [row[0] for row in cur.fetchall()]
+    finally:
+        conn.close()
+
+
+# > Server
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers: int, timeout: float = 120) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"API not up after {timeout}s")
+
+
+# > Load
+
+def build_requests(endpoint: str, customer_ids: list[str], rng, names, args):
+    """Return a function producing the (method, path, kwargs) of the next request to `endpoint`."""
+    if endpoint == "predict":
+        return lambda: ("POST", "/predict", {"json": {"customer_id": random.choice(customer_ids)}})
+    if endpoint == "predict_batch":
+        return lambda: ("POST", "/predict/batch",
+                        {"json": {"customer_ids": random.sample(customer_ids, min(args.batch_ids, len(customer_ids)))}})
+    if endpoint == "customers":
+        return lambda: ("GET", "/customers", {"params": {"limit": args.page_size}})
+    if endpoint == "customer_by_id":
+        return lambda: ("GET", f"/customers/{random.choice(customer_ids)}", {})
+    if endpoint == "dashboard_stats":
+        return lambda: ("GET", "/dashboard/stats", {})
+    if endpoint == "upload_csv":
+        def upload():
+            buffer = io.StringIO()
+            synthetic_customers(args.upload_rows, rng, names).to_csv(buffer, index=False, quoting=csv.QUOTE_MINIMAL)
+            return "POST", "/customers/upload_csv", {"files": {"file": ("customers.csv", buffer.getvalue(), "text/csv")}}
+        return upload
+    raise ValueError(f"Unknown endpoint {endpoint}")
+
+
+async def drive(client: httpx.AsyncClient, next_request, total: int, concurrency: int) -> dict:
+    latencies = []
+    statuses = {}
+    remaining = total
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            method, path, kwargs = next_request()
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                # Several endpoints answer {"error": ...} with a 200
+                ok = response.status_code < 400 and not (
+                    response.headers.get("content-type", "").startswith("application/json")
+                    and "error" in (response.json() if response.content.startswith(b"{") else {})
+                )
+                status = str(response.status_code) if ok else f"{response.status_code}-error"
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+    elapsed = time.perf_counter() - started
+
+    ms = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    errors = sum(n for status, n in statuses.items() if not status.isdigit() or int(status) >= 400)
+    return {
+        "requests": total,
+        "errors": errors,
+        "statuses": statuses,
+        "seconds": elapsed,
+        "requests_per_second": total / elapsed,
+        "latency_ms": {"mean": float(ms.mean()), "p50": float(p50), "p95": float(p95),
+                       "p99": float(p99), "max": float(ms.max())},
+    }
+
+
+async def run_benchmark(base_url: str, endpoints: list[str], customer_ids: list[str], rng, names, args) -> dict:
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        for endpoint in endpoints:
+            next_request = build_requests(endpoint, customer_ids, rng, names, args)
+            total = args.upload_requests if endpoint == "upload_csv" else args.requests
+            if args.warmup:
+                await drive(client, next_request, min(args.warmup, total), args.concurrency)
+            results[endpoint] = result = await drive(client, next_request, total, args.concurrency)
+            latency = result["latency_ms"]
+            print(f"{endpoint:16} {result['requests_per_second']:9.1f} req/s  p50={latency['p50']:7.1f}ms  "
+                  f"p95={latency['p95']:7.1f}ms  p99={latency['p99']:7.1f}ms  errors={result['errors']}")
+    return results
+
+
+def compare(results: dict, baseline_path: str, max_regression: float) -> list[str]:
+    """Endpoints whose p95 latency or throughput is worse than the baseline by more than `max_regression`."""
+    baseline = json.loads(Path(baseline_path).read_text())["endpoints"]
+    regressions = []
+    for endpoint, result in results.items():
+        before = baseline.get(endpoint)
+        if before is None:
+            continue
+        p95_change = result["latency_ms"]["p95"] / before["latency_ms"]["p95"] - 1
+        rate_change = result["requests_per_second"] / before["requests_per_second"] - 1
+        print(f"{endpoint:16} p95 {p95_change:+7.1%}  throughput {rate_change:+7.1%}")
+        if p95_change > max_regression or rate_change < -max_regression:
+            regressions.append(endpoint)
+    return regressions
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the churn API endpoints")
+    parser.add_argument("--customers", type=int, default=10_000, help="synthetic customers to seed")
+    parser.add_argument("--skip-seed", action="store_true", help="use customers already in the database")
+    parser.add_argument("--requests", type=int, default=1000, help="requests per endpoint")
+    parser.add_argument("--upload-requests", type=int, default=20, help="requests to /customers/upload_csv")
+    parser.add_argument("--upload-rows", type=int, default=1000, help="rows per uploaded CSV")
+    parser.add_argument("--batch-ids", type=int, default=50, help="customer IDs per /predict/batch request")
+    parser.add_argument("--page-size", type=int, default=500, help="limit of /customers requests")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per endpoint")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help=f"comma-separated subset of {ENDPOINTS}")
+    parser.add_argument("--base-url", help="benchmark a running API instead of starting one")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers of the started API")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json")
+    parser.add_argument("--compare", help="previous result file to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="allowed p95 increase / throughput decrease before exiting with status 1")
+    args = parser.parse_args()
+
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {sorted(unknown)}")
+
+    random.seed(args.seed)
+    rng = np.random.default_rng(args.seed)
+    names = NamePool(seed=args.seed)
+
+    if args.skip_seed:
+        customer_ids = existing_customer_ids(args.customers)
+    else:
+        started = time.perf_counter()
+        customer_ids = seed_customers(args.customers, rng, names)
+        print(f"Seeded {len(customer_ids)} customers in {time.perf_counter() - started:.1f}s")
+    if not customer_ids:
+        sys.exit("No customers to benchmark with")
+
+    process = None
+    base_url = args.base_url
+    if base_url is None:
+        process, base_url = start_server(args.workers)
+    try:
+        results = asyncio.run(run_benchmark(base_url, endpoints, customer_ids, rng, names, args))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+                  | {"customers_used": len(customer_ids), "env": {k: v for k, v in os.environ.items()
+                                                                  if k.startswith(("SCORING_", "PREDICTION_", "DB_POOL_", "COMPILED_"))}},
+        "endpoints": results,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.max_regression)
+        if regressions:
+            print(f"Regressions beyond {args.max_regression:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Local stand-in for the n8n `notify-churn` webhook, to exercise /notify without sending emails.
+
+Usage (from the backend folder):
+    python scripts/stub_webhook.py --port 5679 --fail-rate 0.2 --latency 0.5
+    NOTIFY_WEBHOOK_URL=http://localhost:5679/webhook/notify-churn uvicorn app.main:app --port 8080
+"""
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(fail_rate: float, latency: float):
+    class StubWebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            time.sleep(latency)
+
+            status = 503 if random.random() < fail_rate else 200
+            print(f"{self.path} {payload} -> {status}")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps({"received": payload}).encode("utf-8"))
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubWebhookHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub n8n webhook server")
+    parser.add_argument("--port", type=int, default=5679)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("0.0.0.0", args.port), make_handler(args.fail_rate, args.latency))
+    print(f"Stub webhook listening on http://localhost:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
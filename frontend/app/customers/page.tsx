@@ -1,5 +1,7 @@
+import { z } from "zod"
+
 import { AppSidebar } from "@/components/app-sidebar"
-import { DataTable } from "@/components/data-table"
+import { DataTable, schema } from "@/components/data-table"
 import { SiteHeader } from "@/components/site-header"
 import {
   SidebarInset,
@@ -9,17 +11,23 @@ import {
 
 export default async function Page() {
 
-  const res = await fetch(
-    `${process.env.API_INTERNAL_URL}/customers`,
-    { cache: "no-store" }
-  );
+  // /customers is paginated: follow next_cursor until the last page
+  const customers: z.infer<typeof schema>[] = [];
+  let cursor: string | null = null;
+  do {
+    const params = new URLSearchParams({ limit: "5000" });
+    if (cursor) params.set("after", cursor);
+
+    const res = await fetch(
+      `${process.env.API_INTERNAL_URL}/customers?${params}`,
+      { cache: "no-store" }
+    );
 
-  const rawCustomers = await res.json();
-  
-  // Backend now returns objects directly, not arrays
-  const customers = Array.isArray(rawCustomers.customers)
-    ? rawCustomers.customers
-    : [];
+    const rawCustomers = await res.json();
+    if (!Array.isArray(rawCustomers.customers)) break;
+    customers.push(...rawCustomers.customers);
+    cursor = rawCustomers.next_cursor ?? null;
+  } while (cursor);
 
   return (
     <SidebarProvider
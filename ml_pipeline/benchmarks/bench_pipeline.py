@@ -0,0 +1,88 @@
+"""
+Timings of the preprocessing steps, the full transform and predict_proba.
+
+Run from the ml_pipeline folder:
+    pytest benchmarks
+    pytest benchmarks --rows 1,1000,1000000 --dtypes compact -k "transform or predict"
+    pytest benchmarks --benchmark-autosave        # then: pytest-benchmark compare
+"""
+import tracemalloc
+
+import pytest
+
+import preprocess
+from build_pipeline import CompiledPipeline
+
+# Steps in the order PreprocessingTransformer._apply_static_transforms chains them
+STEPS = [
+    preprocess.drop_duplicates,
+    preprocess.fill_total_charges_median,
+    preprocess.encode_boolean_features,
+    preprocess.drop_customer_id,
+    preprocess.encode_service_features,
+    preprocess.encode_categorical_features,
+    preprocess.drop_redundant_columns,
+    preprocess.drop_low_impact_features,
+    preprocess.remove_newly_added_columns,
+]
+
+
+def _rounds(rows: int) -> int:
+    if rows <= 1000:
+        return 50
+    if rows <= 100_000:
+        return 10
+    return 3
+
+
+def _peak_mib(func, *args) -> float:
+    """Peak memory allocated by one call (numpy and pandas buffers are traced too)."""
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def run(benchmark, peak_memory, rows, func, make_input):
+    """Time `func(make_input())`; the input is rebuilt before each round, outside the timing."""
+    peak = round(_peak_mib(func, make_input()), 3)
+    peak_memory[benchmark.name] = peak
+    benchmark.extra_info["rows"] = rows
+    benchmark.extra_info["peak_mib"] = peak
+    benchmark.pedantic(func, setup=lambda: ((make_input(),), {}), rounds=_rounds(rows), warmup_rounds=1)
+
+
+@pytest.mark.parametrize("step", STEPS, ids=[s.__name__ for s in STEPS])
+def test_step(benchmark, peak_memory, customers, rows, dtype, step):
+    # Each step sees the frame the previous steps produced, as in the pipeline
+    df = customers.copy()
+    for previous in STEPS[:STEPS.index(step)]:
+        df = previous(df)
+    benchmark.group = f"steps {rows} rows {dtype}"
+    run(benchmark, peak_memory, rows, step, df.copy)
+
+
+def test_copy(benchmark, peak_memory, customers, rows, dtype):
+    """The X.copy() done by fit/transform before the steps."""
+    benchmark.group = f"steps {rows} rows {dtype}"
+    run(benchmark, peak_memory, rows, lambda df: df.copy(), lambda: customers)
+
+
+def test_transform(benchmark, peak_memory, fitted_pipeline, customers, rows, dtype):
+    benchmark.group = f"pipeline {rows} rows {dtype}"
+    run(benchmark, peak_memory, rows, fitted_pipeline.named_steps["preprocess"].transform, lambda: customers)
+
+
+def test_predict_proba(benchmark, peak_memory, fitted_pipeline, customers, rows, dtype):
+    benchmark.group = f"pipeline {rows} rows {dtype}"
+    run(benchmark, peak_memory, rows, fitted_pipeline.predict_proba, lambda: customers)
+
+
+def test_compiled_predict_proba(benchmark, peak_memory, fitted_pipeline, customers, rows, dtype):
+    """The serving scorer on the same rows, as the dicts the API receives."""
+    compiled = CompiledPipeline.from_pipeline(fitted_pipeline)
+    records = customers.to_dict(orient="records")
+    benchmark.group = f"pipeline {rows} rows {dtype}"
+    run(benchmark, peak_memory, rows, compiled.predict_proba, lambda: records)
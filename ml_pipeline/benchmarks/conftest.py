@@ -0,0 +1,114 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+SRC_DIR = Path(__file__).resolve().parents[1] / "src"
+sys.path.insert(0, str(SRC_DIR / "pipeline"))  # build_pipeline imports `preprocess` directly
+sys.path.insert(0, str(SRC_DIR))
+
+from build_pipeline import build_pipeline  # noqa: E402
+from utils.data_loader import TRAINING_COLUMNS  # noqa: E402
+
+DEFAULT_ROWS = "1,1000,100000"
+DTYPES = ["object", "compact"]
+
+# Category -> weight, as in the customers table
+CATEGORIES = {
+    "gender": {"Male": 0.5, "Female": 0.5},
+    "multiple_lines": {"Yes": 0.3, "No": 0.6, "No phone service": 0.1},
+    "internet_service": {"DSL": 0.4, "Fiber optic": 0.5, "No": 0.1},
+    "online_security": {"Yes": 0.3, "No": 0.6, "No internet service": 0.1},
+    "online_backup": {"Yes": 0.3, "No": 0.6, "No internet service": 0.1},
+    "device_protection": {"Yes": 0.3, "No": 0.6, "No internet service": 0.1},
+    "tech_support": {"Yes": 0.3, "No": 0.6, "No internet service": 0.1},
+    "streaming_tv": {"Yes": 0.4, "No": 0.5, "No internet service": 0.1},
+    "streaming_movies": {"Yes": 0.4, "No": 0.5, "No internet service": 0.1},
+    "contract": {"Month-to-month": 0.5, "One year": 0.3, "Two year": 0.2},
+    "payment_method": {"Electronic check": 0.4, "Mailed check": 0.2,
+                       "Bank transfer (automatic)": 0.2, "Credit card (automatic)": 0.2},
+}
+# Benchmark name -> peak MiB allocated by one call, printed after the timings
+PEAK_MIB = {}
+
+BOOLEANS = {"senior_citizen": 0.2, "partner": 0.5, "dependents": 0.4, "phone_service": 0.9, "paperless_billing": 0.7}
+
+
+def pytest_addoption(parser):
+    parser.addoption("--rows", default=DEFAULT_ROWS, help=f"comma-separated row counts (default {DEFAULT_ROWS})")
+    parser.addoption("--dtypes", default=",".join(DTYPES), help="'object' (as read by psycopg2), 'compact' (TRAINING_COLUMNS)")
+
+
+def pytest_generate_tests(metafunc):
+    if "rows" in metafunc.fixturenames:
+        rows = [int(n) for n in metafunc.config.getoption("rows").split(",")]
+        metafunc.parametrize("rows", rows, ids=[f"{n}rows" for n in rows], scope="session")
+    if "dtype" in metafunc.fixturenames:
+        dtypes = metafunc.config.getoption("dtypes").split(",")
+        metafunc.parametrize("dtype", dtypes, scope="session")
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not PEAK_MIB:
+        return
+    terminalreporter.section("peak memory (MiB, tracemalloc)")
+    width = max(len(name) for name in PEAK_MIB)
+    for name, peak in sorted(PEAK_MIB.items()):
+        terminalreporter.write_line(f"{name:{width}}  {peak:10.3f}")
+
+
+@pytest.fixture(scope="session")
+def peak_memory():
+    return PEAK_MIB
+
+
+def make_customers(n: int, seed: int = 0) -> pd.DataFrame:
+    """`n` distinct customers shaped like rows of the customers table, with a churn label."""
+    rng = np.random.default_rng(seed)
+    tenure = rng.integers(0, 73, n)
+    monthly = np.round(rng.uniform(20, 150, n), 2)
+    total = np.round(monthly * tenure * rng.uniform(0.9, 1.1, n), 2)
+    total[rng.random(n) < 0.002] = np.nan
+
+    data = {"customer_id": [f"{i:07d}-BENCH" for i in range(n)]}
+    for column, p in BOOLEANS.items():
+        data[column] = rng.random(n) < p
+    data["tenure"] = tenure
+    for column, weights in CATEGORIES.items():
+        values = np.array(list(weights), dtype=object)
+        p = np.array(list(weights.values()))
+        data[column] = values[rng.choice(len(values), n, p=p / p.sum())]
+    data["monthly_charges"] = monthly
+    data["total_charges"] = total
+
+    # Churn loosely driven by contract and charges, so the model has something to learn
+    logit = -1.5 + 1.5 * (data["contract"] == "Month-to-month") + (monthly - 80) / 40 - tenure / 36
+    data["churn"] = rng.random(n) < 1 / (1 + np.exp(-logit))
+
+    data["status"] = "active"
+    data["notified"] = False
+    data["updated_at"] = pd.Timestamp("2024-01-15 10:00:00")
+    data["first_name"] = "Mariam"
+    data["last_name"] = "Al-Hussein"
+    data["email"] = [f"customer{i}@example.com" for i in range(n)]
+    return pd.DataFrame(data)
+
+
+def with_dtype(df: pd.DataFrame, dtype: str) -> pd.DataFrame:
+    if dtype == "object":
+        return df
+    return df.astype({c: d for c, d in TRAINING_COLUMNS.items() if c in df.columns})
+
+
+@pytest.fixture(scope="session")
+def fitted_pipeline():
+    data = make_customers(5000, seed=1)
+    return build_pipeline().fit(data.drop(columns=["churn"]), data["churn"])
+
+
+@pytest.fixture(scope="session")
+def customers(rows, dtype):
+    """Inference input: `rows` customers without the label, in the requested dtypes."""
+    return with_dtype(make_customers(rows).drop(columns=["churn"]), dtype)
@@ -98,6 +98,11 @@ ALTER TABLE predictions
   ON UPDATE CASCADE
   ON DELETE CASCADE; 
 
+-- /feedback and the streaming consumer's replays look predictions up by token
+CREATE INDEX IF NOT EXISTS predictions_token_idx ON predictions (token);
+-- reporting/backfill.py reads predictions one time window at a time
+CREATE INDEX IF NOT EXISTS predictions_created_at_idx ON predictions (created_at);
+
 -- 3) feedback
 
 CREATE TABLE IF NOT EXISTS feedback (
@@ -117,3 +122,70 @@ ALTER TABLE feedback
   ON UPDATE CASCADE
   ON DELETE CASCADE;
 
+
+-- 4) notification jobs (/notify background dispatcher, created by the backend at startup)
+
+CREATE TABLE IF NOT EXISTS notification_jobs (
+  job_id          UUID PRIMARY KEY,
+  status          TEXT NOT NULL DEFAULT 'queued',                 -- queued | running | completed | failed
+  total           INTEGER NOT NULL,
+  created_at      TIMESTAMPTZ NOT NULL DEFAULT now(),
+  started_at      TIMESTAMPTZ,
+  finished_at     TIMESTAMPTZ
+);
+
+CREATE TABLE IF NOT EXISTS notification_job_items (
+  job_id          UUID NOT NULL REFERENCES notification_jobs(job_id) ON DELETE CASCADE,
+  customer_id     TEXT NOT NULL,
+  status          TEXT NOT NULL DEFAULT 'pending',                -- pending | sent | failed
+  prediction_id   BIGINT,
+  attempts        INTEGER NOT NULL DEFAULT 0,
+  error           TEXT,
+  updated_at      TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (job_id, customer_id)
+);
+
+-- 5) latest prediction per customer (maintained by the backend prediction write path + trigger on feedback)
+
+CREATE TABLE IF NOT EXISTS latest_predictions (
+  customer_id         TEXT PRIMARY KEY,
+  prediction_id       BIGINT NOT NULL,
+  churn_score         DOUBLE PRECISION NOT NULL,
+  churn_label         BOOLEAN NOT NULL,
+  token               TEXT,
+  model_version       TEXT,
+  created_at          TIMESTAMPTZ NOT NULL,
+  feedback_id         BIGINT,
+  notified_at         TIMESTAMPTZ,                              -- feedback.sent_at
+  feedback_answer     TEXT,
+  answered_at         TIMESTAMPTZ,
+  used_for_training   BOOLEAN
+);
+
+-- 6) per-day prediction counters for /dashboard/churn-over-time (sum the shards of a day)
+
+CREATE TABLE IF NOT EXISTS prediction_daily_stats (
+  day                 DATE NOT NULL,
+  shard               SMALLINT NOT NULL DEFAULT 0,              -- mod(pg_backend_pid(), 16) of the writer
+  total_predictions   BIGINT NOT NULL DEFAULT 0,
+  churn_predictions   BIGINT NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, shard)
+);
+
+-- 7) training runs (one row per retrain, written by backend/app/training.py)
+
+CREATE TABLE IF NOT EXISTS training_runs (
+  run_id              BIGSERIAL PRIMARY KEY,
+  reason              TEXT NOT NULL,                            -- feedback | drift
+  status              TEXT NOT NULL DEFAULT 'started',          -- started | success | failed
+  started_at          TIMESTAMPTZ NOT NULL DEFAULT now(),
+  ended_at            TIMESTAMPTZ,
+  notes               TEXT,
+  model_version       TEXT,                                     -- trained_models.model_version of the candidate
+  promoted            BOOLEAN,                                  -- false when the candidate lost on the holdout
+  rows_used           INTEGER,                                  -- reference + feedback rows after cleaning
+  feedback_rows       INTEGER,
+  wall_time_seconds   DOUBLE PRECISION,
+  metrics             JSONB,                                    -- holdout roc_auc / accuracy / precision / recall / f1
+  metric_deltas       JSONB                                     -- candidate minus serving model, same holdout
+);
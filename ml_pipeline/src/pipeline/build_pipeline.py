@@ -1,4 +1,8 @@
+import math
+
+import numpy as np
 import pandas as pd
+from scipy.special import expit
 from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.pipeline import Pipeline
 from sklearn.linear_model import LogisticRegression
@@ -13,7 +17,10 @@ from preprocess import (
     encode_categorical_features,
     drop_redundant_columns,
     drop_low_impact_features,
-    remove_newly_added_columns
+    remove_newly_added_columns,
+    BOOLEAN_COLUMNS,
+    SERVICE_COLUMNS,
+    ONE_HOT_FEATURES,
 )
 
 class PreprocessingTransformer(BaseEstimator, TransformerMixin):
@@ -60,3 +67,129 @@ def build_pipeline():
         ("preprocess", PreprocessingTransformer()),
         ("model", model)
     ])
+
+
+class CompiledPipeline:
+    """
+    Flat NumPy export of a fitted churn pipeline for serving.
+
+    Holds the fitted column order, the scaler mean/scale and the logistic
+    regression coefficients. The scaler is folded into the weights, so a
+    request dict is encoded straight into a float vector and scored with a
+    single dot product and a sigmoid, without going through pandas.
+    """
+
+    def __init__(self, feature_names, encoders, mean, scale, coef, intercept):
+        self.feature_names = list(feature_names)
+        self.encoders = encoders
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+
+        # (x - mean) / scale . coef + b  ==  x . (coef / scale) + (b - sum(coef * mean / scale))
+        self.weights = self.coef / self.scale
+        self.bias = self.intercept - float(np.dot(self.weights, self.mean))
+        self._total_charges_index = self.feature_names.index('total_charges') \
+            if 'total_charges' in self.feature_names else None
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        """
+        Export a fitted `build_pipeline()` pipeline.
+        Raises ValueError if the pipeline cannot be expressed as a linear scorer.
+        """
+        preprocess = pipeline.named_steps['preprocess']
+        model = pipeline.named_steps['model']
+
+        if not isinstance(model, LogisticRegression) or model.coef_.shape[0] != 1:
+            raise ValueError("Only binary LogisticRegression models can be compiled")
+        if not hasattr(model, 'feature_names_in_'):
+            raise ValueError("Model was not fitted on a DataFrame, column order is unknown")
+
+        feature_names = model.feature_names_in_.tolist()
+        n_features = len(feature_names)
+
+        mean = np.zeros(n_features)
+        scale = np.ones(n_features)
+        scaler = preprocess.scaler
+        scaler_mean = scaler.mean_ if scaler.with_mean else np.zeros(len(preprocess.numeric_columns))
+        scaler_scale = scaler.scale_ if scaler.with_std else np.ones(len(preprocess.numeric_columns))
+        for col, m, sc in zip(preprocess.numeric_columns, scaler_mean, scaler_scale):
+            if col not in feature_names:
+                raise ValueError(f"Scaled column {col} is not a model feature")
+            i = feature_names.index(col)
+            mean[i] = m
+            scale[i] = sc
+
+        encoders = []
+        for i, name in enumerate(feature_names):
+            if name in preprocess.numeric_columns:
+                encoders.append((i, 'numeric', name, None))
+            elif name in BOOLEAN_COLUMNS:
+                encoders.append((i, 'boolean', name, None))
+            elif name in SERVICE_COLUMNS:
+                encoders.append((i, 'service', name, None))
+            elif name in ONE_HOT_FEATURES:
+                source, value = ONE_HOT_FEATURES[name]
+                encoders.append((i, 'one_hot', source, value))
+            else:
+                raise ValueError(f"No compiled encoder for feature {name}")
+
+        return cls(feature_names, encoders, mean, scale, model.coef_[0], model.intercept_[0])
+
+    def encode(self, data: dict, out=None) -> np.ndarray:
+        """
+        Encode one raw customer dict into the model's feature vector (unscaled).
+        A missing total_charges is left as NaN for the caller to fill.
+        """
+        x = np.zeros(len(self.feature_names)) if out is None else out
+        for i, kind, key, value in self.encoders:
+            raw = data.get(key)
+            if kind == 'numeric':
+                if raw is None:
+                    if key != 'total_charges':
+                        raise ValueError(f"{key} is required")
+                    x[i] = math.nan
+                else:
+                    x[i] = float(raw)
+            elif kind == 'boolean':
+                x[i] = int(raw)
+            elif kind == 'service':
+                x[i] = 1.0 if raw == 'Yes' else 0.0
+            else:
+                x[i] = 1.0 if raw == value else 0.0
+        return x
+
+    def encode_batch(self, rows) -> np.ndarray:
+        """
+        Encode a list of raw customer dicts into a (n_rows, n_features) matrix.
+        Missing total_charges are filled with the batch median, like fill_total_charges_median.
+        """
+        X = np.zeros((len(rows), len(self.feature_names)))
+        for r, data in enumerate(rows):
+            self.encode(data, out=X[r])
+
+        i = self._total_charges_index
+        if i is not None:
+            missing = np.isnan(X[:, i])
+            if missing.any():
+                present = X[~missing, i]
+                # No value to take a median from: fall back to the training mean
+                X[missing, i] = np.median(present) if present.size else self.mean[i]
+        return X
+
+    def decision_function(self, X: np.ndarray) -> np.ndarray:
+        return X @ self.weights + self.bias
+
+    def predict_proba(self, rows) -> np.ndarray:
+        """Return the churn probability (positive class) for each raw customer dict."""
+        return expit(self.decision_function(self.encode_batch(rows)))
+
+    def predict_proba_one(self, data: dict) -> float:
+        """Score a single raw customer dict."""
+        x = self.encode(data)
+        i = self._total_charges_index
+        if i is not None and math.isnan(x[i]):
+            x[i] = self.mean[i]
+        return float(expit(np.dot(x, self.weights) + self.bias))
@@ -3,6 +3,33 @@ from sklearn.preprocessing import StandardScaler
 from dotenv import load_dotenv
 load_dotenv()
 
+BOOLEAN_COLUMNS = ['senior_citizen', 'partner', 'dependents', 'phone_service', 'paperless_billing', 'churn']
+
+SERVICE_COLUMNS = [
+    'multiple_lines', 'online_security', 'online_backup',
+    'device_protection', 'tech_support', 'streaming_tv',
+    'streaming_movies'
+]
+
+# One-hot column -> (source column, matching value)
+ONE_HOT_FEATURES = {
+    # Gender
+    'gender_Male': ('gender', 'Male'),
+    'gender_Female': ('gender', 'Female'),
+    # Internet Service (Excluding 'No')
+    'internet_service_DSL': ('internet_service', 'DSL'),
+    'internet_service_Fiber_optic': ('internet_service', 'Fiber optic'),
+    # Contract
+    'contract_Month_to_month': ('contract', 'Month-to-month'),
+    'contract_One_year': ('contract', 'One year'),
+    'contract_Two_year': ('contract', 'Two year'),
+    # Payment Method
+    'payment_method_Electronic_check': ('payment_method', 'Electronic check'),
+    'payment_method_Mailed_check': ('payment_method', 'Mailed check'),
+    'payment_method_Bank_transfer': ('payment_method', 'Bank transfer (automatic)'),
+    'payment_method_Credit_card': ('payment_method', 'Credit card (automatic)'),
+}
+
 # drop duplicates function
 def drop_duplicates(df: pd.DataFrame) -> pd.DataFrame:
     return df.drop_duplicates()
@@ -15,8 +42,7 @@ def fill_total_charges_median(df: pd.DataFrame) -> pd.DataFrame:
 
 # Converts specific boolean columns to integers (0/1)
 def encode_boolean_features(df: pd.DataFrame) -> pd.DataFrame:
-    boolean_columns = ['senior_citizen', 'partner', 'dependents', 'phone_service', 'paperless_billing', 'churn']
-    for col in boolean_columns:
+    for col in BOOLEAN_COLUMNS:
         if col in df.columns:
             df[col] = df[col].astype(int)
     return df
@@ -30,37 +56,16 @@ def drop_customer_id(df: pd.DataFrame) -> pd.DataFrame:
 # Since "No phone/internet service" is redundant (already in phone_service/internet_service), treat as 0
 
 def encode_service_features(df: pd.DataFrame) -> pd.DataFrame:
-    service_columns = [
-        'multiple_lines', 'online_security', 'online_backup', 
-        'device_protection', 'tech_support', 'streaming_tv', 
-        'streaming_movies'
-    ]
-    for col in service_columns:
+    for col in SERVICE_COLUMNS:
         if col in df.columns:
             df[col] = df[col].apply(lambda x: 1 if x == 'Yes' else 0)
     return df
 
 # Applies custom one-hot encoding to categorical features
 def encode_categorical_features(df: pd.DataFrame) -> pd.DataFrame:
-    # Gender
-    df['gender_Male'] = (df['gender'] == 'Male').astype(int)
-    df['gender_Female'] = (df['gender'] == 'Female').astype(int)
-    
-    # Internet Service (Excluding 'No')
-    df['internet_service_DSL'] = (df['internet_service'] == 'DSL').astype(int)
-    df['internet_service_Fiber_optic'] = (df['internet_service'] == 'Fiber optic').astype(int)
-    
-    # Contract
-    df['contract_Month_to_month'] = (df['contract'] == 'Month-to-month').astype(int)
-    df['contract_One_year'] = (df['contract'] == 'One year').astype(int)
-    df['contract_Two_year'] = (df['contract'] == 'Two year').astype(int)
-    
-    # Payment Method
-    df['payment_method_Electronic_check'] = (df['payment_method'] == 'Electronic check').astype(int)
-    df['payment_method_Mailed_check'] = (df['payment_method'] == 'Mailed check').astype(int)
-    df['payment_method_Bank_transfer'] = (df['payment_method'] == 'Bank transfer (automatic)').astype(int)
-    df['payment_method_Credit_card'] = (df['payment_method'] == 'Credit card (automatic)').astype(int)
-    
+    for col, (source, value) in ONE_HOT_FEATURES.items():
+        df[col] = (df[source] == value).astype(int)
+
     return df.drop(columns=['gender', 'internet_service', 'contract', 'payment_method'])
 
 def drop_redundant_columns(df: pd.DataFrame) -> pd.DataFrame:
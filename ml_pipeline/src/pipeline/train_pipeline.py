@@ -1,8 +1,8 @@
 from build_pipeline import build_pipeline
-from utils.data_loader import read_postgres_table
+from utils.snapshot_store import load_training_frame
 
 def train_pipeline(target="churn"):
-    df = read_postgres_table()
+    df = load_training_frame()
     X = df.drop(columns=[target])
     y = df[target]
 
@@ -1,32 +1,121 @@
+import os
+
 import pandas as pd
 import psycopg2
+from pandas.api.types import union_categoricals
 from dotenv import load_dotenv
-import os
+
 load_dotenv()
 
-def read_postgres_table():
-    """
-    Reads an AWS RDS PostgreSQL table and returns it as a Pandas DataFrame.
+# Columns read for training, with the dtype each one gets at read time.
+# Contact details and status columns are never read: the pipeline drops them anyway.
+TRAINING_COLUMNS = {
+    "customer_id": "string",
+    "gender": "category",
+    "senior_citizen": "bool",
+    "partner": "bool",
+    "dependents": "bool",
+    "tenure": "int16",
+    "phone_service": "bool",
+    "multiple_lines": "category",
+    "internet_service": "category",
+    "online_security": "category",
+    "online_backup": "category",
+    "device_protection": "category",
+    "tech_support": "category",
+    "streaming_tv": "category",
+    "streaming_movies": "category",
+    "contract": "category",
+    "paperless_billing": "bool",
+    "payment_method": "category",
+    "monthly_charges": "float64",
+    "total_charges": "float64",
+    "churn": "bool",
+}
 
-    Returns:
-        pd.DataFrame: Data from the table
-    """
-    conn = psycopg2.connect(
+# Nullable counterparts, used when a chunk has NULLs in a column
+NULLABLE_DTYPES = {"bool": "boolean", "int16": "Int16"}
+
+TRAINING_CHUNK_ROWS = int(os.getenv("TRAINING_CHUNK_ROWS", 50_000))
+
+
+def get_connection():
+    return psycopg2.connect(
         dbname=os.getenv("RDS_DB_NAME"),
         user=os.getenv("RDS_USER"),
         password=os.getenv("RDS_PASSWORD"),
         host=os.getenv("RDS_HOST"),
         port=os.getenv("RDS_PORT"),
     )
-    
-    # Build query as a string safely
-    query = f'SELECT * FROM "{os.getenv("TABLE_NAME")}"' 
-    
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+
+
+def to_frame(rows: list[tuple], columns: dict) -> pd.DataFrame:
+    """One chunk of rows as a DataFrame with compact dtypes."""
+    df = pd.DataFrame.from_records(rows, columns=list(columns), coerce_float=True)
+    for column, dtype in columns.items():
+        if dtype in NULLABLE_DTYPES and df[column].isna().any():
+            dtype = NULLABLE_DTYPES[dtype]
+        df[column] = df[column].astype(dtype)
     return df
 
 
+def concat_chunks(chunks: list[pd.DataFrame], columns: dict) -> pd.DataFrame:
+    """Concatenate chunks, merging the categories of each chunk instead of falling back to object."""
+    if not chunks:
+        return to_frame([], columns)
+    if len(chunks) == 1:
+        return chunks[0]
+    data = {}
+    for column, dtype in columns.items():
+        parts = [chunk[column] for chunk in chunks]
+        if dtype == "category":
+            data[column] = pd.Series(union_categoricals(parts), name=column)
+        else:
+            data[column] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(data)
+
+
+def stream_table(conn, table: str, columns: dict, where: str = "", params=(),
+                 chunk_rows: int = TRAINING_CHUNK_ROWS):
+    """Yield `table` in DataFrame chunks of `chunk_rows`, read through a server-side cursor."""
+    column_list = ", ".join(f'"{c}"' for c in columns)
+    query = f'SELECT {column_list} FROM "{table}"'
+    if where:
+        query += f" WHERE {where}"
+    with conn.cursor(name="training_data") as cur:
+        cur.itersize = chunk_rows
+        cur.execute(query, params)
+        while True:
+            rows = cur.fetchmany(chunk_rows)
+            if not rows:
+                return
+            yield to_frame(rows, columns)
+
+
+def read_postgres_table(table: str | None = None, columns: dict | None = None,
+                        chunk_rows: int = TRAINING_CHUNK_ROWS) -> pd.DataFrame:
+    """
+    Reads the labelled rows of an AWS RDS PostgreSQL table for training.
+
+    Only `columns` (TRAINING_COLUMNS by default) are read, in chunks of
+    `chunk_rows` through a server-side cursor, and each chunk gets compact
+    dtypes (category, bool, int16) before the next one is fetched.
+    See utils.snapshot_store.load_training_frame for the cached, incremental variant.
+
+    Returns:
+        pd.DataFrame: Data from the table
+    """
+    table = table or os.getenv("TABLE_NAME")
+    columns = columns or TRAINING_COLUMNS
+    where = "churn IS NOT NULL" if "churn" in columns else ""
+
+    conn = get_connection()
+    try:
+        return concat_chunks(list(stream_table(conn, table, columns, where, chunk_rows=chunk_rows)), columns)
+    finally:
+        conn.close()
+
+
 # Example usage
 # Load environment variables from .env file
 # load_dotenv()
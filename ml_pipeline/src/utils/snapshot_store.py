@@ -0,0 +1,157 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from utils.data_loader import (
+    TRAINING_COLUMNS,
+    TRAINING_CHUNK_ROWS,
+    concat_chunks,
+    get_connection,
+    read_postgres_table,
+    stream_table,
+)
+
+load_dotenv()
+
+# Directory of the local training snapshot; empty reads the table from Postgres every time
+TRAINING_CACHE_DIR = os.getenv("TRAINING_CACHE_DIR", "")
+# Rows updated this long before the high-water mark are fetched again, for transactions
+# that committed after a later updated_at had already been read
+SNAPSHOT_OVERLAP_SECONDS = float(os.getenv("SNAPSHOT_OVERLAP_SECONDS", 300))
+
+# customers.updated_at is a TIMESTAMP without time zone: it stays naive here, in the
+# high-water mark and in the `updated_at > %s` parameter, so all three compare alike
+SNAPSHOT_COLUMNS = {**TRAINING_COLUMNS, "updated_at": "datetime64[ns]"}
+
+
+class TrainingSnapshot:
+    """
+    Local Parquet copy of a customers table, kept current incrementally.
+
+    The snapshot holds every row (labelled or not) plus the high-water mark
+    of `updated_at` it was read up to. A refresh only reads rows updated since
+    then and merges them by `customer_id`. Deleted rows cannot be seen that
+    way: when the merged row count no longer matches the table, the snapshot
+    is rebuilt from scratch.
+    """
+
+    def __init__(self, directory: str, table: str, columns: dict = SNAPSHOT_COLUMNS,
+                 overlap_seconds: float = SNAPSHOT_OVERLAP_SECONDS, chunk_rows: int = TRAINING_CHUNK_ROWS):
+        self.directory = Path(directory)
+        self.table = table
+        self.columns = columns
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self.chunk_rows = chunk_rows
+        self.data_path = self.directory / f"{table}.parquet"
+        self.meta_path = self.directory / f"{table}.json"
+
+    def refresh(self, conn) -> pd.DataFrame:
+        """Bring the snapshot up to date with the table and return it."""
+        meta = self._read_meta()
+        if meta is None:
+            data = self._read(conn)
+            print(f"Snapshot of {self.table} built: {len(data)} rows")
+        else:
+            data = pd.read_parquet(self.data_path)
+            since = datetime.fromisoformat(meta["high_water_mark"]) - self.overlap
+            changed = self._read(conn, "updated_at > %s", (since,))
+            if len(changed):
+                kept = data[~data["customer_id"].isin(changed["customer_id"])]
+                data = concat_chunks([kept.reset_index(drop=True), changed], self.columns)
+
+            if len(data) != self._count(conn):
+                data = self._read(conn)
+                print(f"Snapshot of {self.table} rebuilt (rows were deleted): {len(data)} rows")
+            else:
+                print(f"Snapshot of {self.table} updated: {len(changed)} changed rows merged, {len(data)} rows")
+
+        self._write(data, meta)
+        return data
+
+    def _read(self, conn, where: str = "", params=()) -> pd.DataFrame:
+        chunks = stream_table(conn, self.table, self.columns, where, params, chunk_rows=self.chunk_rows)
+        return concat_chunks(list(chunks), self.columns)
+
+    def _count(self, conn) -> int:
+        with conn.cursor() as cur:
+            cur.execute(f'SELECT COUNT(*) FROM "{self.table}"')
+            return cur.fetchone()[0]
+
+    def _read_meta(self) -> dict | None:
+        """Metadata of a usable snapshot, None when it has to be built from scratch."""
+        try:
+            meta = json.loads(self.meta_path.read_text())
+        except (OSError, ValueError):
+            return None
+        if meta.get("columns") != list(self.columns) or not meta.get("high_water_mark"):
+            return None
+        if not self.data_path.exists():
+            return None
+        return meta
+
+    def _write(self, data: pd.DataFrame, previous: dict | None):
+        high_water_mark = data["updated_at"].max()
+        if pd.isna(high_water_mark):
+            # No updated_at at all: keep the previous mark, or re-read everything next time
+            high_water_mark = previous["high_water_mark"] if previous else None
+        else:
+            high_water_mark = high_water_mark.isoformat()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        partial = self.data_path.with_suffix(".partial")
+        data.to_parquet(partial, index=False)
+        os.replace(partial, self.data_path)
+        # Written after the data: a crash in between only re-reads the overlap next time
+        self.meta_path.write_text(json.dumps({
+            "table": self.table,
+            "columns": list(self.columns),
+            "high_water_mark": high_water_mark,
+            "rows": len(data),
+            "refreshed_at": datetime.now(timezone.utc).isoformat(),
+        }, indent=2))
+
+
+def load_training_frame(table: str | None = None, snapshot_dir: str | None = None,
+                        labelled_only: bool = True) -> pd.DataFrame:
+    """
+    Training data of `table` (TABLE_NAME by default), with the dtypes of TRAINING_COLUMNS.
+
+    With `snapshot_dir` (TRAINING_CACHE_DIR by default) the rows come from the
+    local snapshot, refreshed with the rows changed since the last call;
+    without it, or without pyarrow, the table is streamed from Postgres.
+    `labelled_only` keeps the rows whose `churn` is known.
+    """
+    table = table or os.getenv("TABLE_NAME")
+    snapshot_dir = TRAINING_CACHE_DIR if snapshot_dir is None else snapshot_dir
+
+    if snapshot_dir:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print("pyarrow is not installed, training data is read from Postgres")
+            snapshot_dir = ""
+
+    if not snapshot_dir:
+        if labelled_only:
+            return read_postgres_table(table)
+        conn = get_connection()
+        try:
+            return concat_chunks(list(stream_table(conn, table, TRAINING_COLUMNS)), TRAINING_COLUMNS)
+        finally:
+            conn.close()
+
+    conn = get_connection()
+    try:
+        data = TrainingSnapshot(snapshot_dir, table).refresh(conn)
+    finally:
+        conn.close()
+
+    data = data.drop(columns=["updated_at"])
+    if labelled_only:
+        data = data[data["churn"].notna()].reset_index(drop=True)
+        data["churn"] = data["churn"].astype(bool)
+    return data
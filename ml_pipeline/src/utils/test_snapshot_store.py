@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+from utils.snapshot_store import SNAPSHOT_COLUMNS, TrainingSnapshot
+
+
+class FakeCursor:
+    """The part of a psycopg2 cursor stream_table and TrainingSnapshot use, over a list of rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, query, params=()):
+        if "COUNT(*)" in query:
+            self.result = [(len(self.rows),)]
+        elif "updated_at > %s" in query:
+            # Same comparison as Postgres: a timestamp column against the parameter
+            updated_at = list(SNAPSHOT_COLUMNS).index("updated_at")
+            self.result = [row for row in self.rows if row[updated_at] > params[0]]
+        else:
+            self.result = list(self.rows)
+
+    def fetchone(self):
+        return self.result.pop(0)
+
+    def fetchmany(self, size):
+        chunk, self.result = self.result[:size], self.result[size:]
+        return chunk
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self, name=None):
+        return FakeCursor(self.rows)
+
+
+def make_row(customer_id, tenure, updated_at, churn=False):
+    values = {
+        "customer_id": customer_id, "gender": "Male", "senior_citizen": False, "partner": True,
+        "dependents": False, "tenure": tenure, "phone_service": True, "multiple_lines": "No",
+        "internet_service": "DSL", "online_security": "No", "online_backup": "No",
+        "device_protection": "No", "tech_support": "No", "streaming_tv": "No", "streaming_movies": "No",
+        "contract": "Month-to-month", "paperless_billing": True, "payment_method": "Mailed check",
+        "monthly_charges": 50.0, "total_charges": 50.0 * tenure, "churn": churn, "updated_at": updated_at,
+    }
+    return tuple(values[column] for column in SNAPSHOT_COLUMNS)
+
+
+def test_refresh_twice_with_naive_timestamps(tmp_path):
+    # customers.updated_at is a TIMESTAMP without time zone: the driver returns naive datetimes
+    start = datetime(2025, 1, 1, 12, 0)
+    rows = [make_row(f"C{i}", i + 1, start + timedelta(minutes=i)) for i in range(5)]
+    snapshot = TrainingSnapshot(str(tmp_path), "customers", chunk_rows=2)
+
+    first = snapshot.refresh(FakeConnection(rows))
+    assert len(first) == 5
+    assert str(first["updated_at"].dtype) == "datetime64[ns]"
+
+    # One row changes, one is added; the second refresh only merges those
+    rows[2] = make_row("C2", 40, start + timedelta(hours=2), churn=True)
+    rows.append(make_row("C5", 7, start + timedelta(hours=3)))
+    second = snapshot.refresh(FakeConnection(rows))
+
+    assert len(second) == 6
+    assert sorted(second["customer_id"]) == [f"C{i}" for i in range(6)]
+    assert second.loc[second["customer_id"] == "C2", "tenure"].item() == 40
+    assert str(second["updated_at"].dtype) == "datetime64[ns]"
+    meta = snapshot._read_meta()
+    assert datetime.fromisoformat(meta["high_water_mark"]) == start + timedelta(hours=3)
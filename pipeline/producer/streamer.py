@@ -1,7 +1,9 @@
+import argparse
 import json
 import time
 from kafka import KafkaProducer
-from utils import generate_customer
+from utils import generate_customer, generate_customer_batch, NamePool
+import numpy as np
 import os
 from dotenv import load_dotenv
 
@@ -10,27 +12,193 @@ load_dotenv()
 
 EVENT_HUBS_BROKER = os.getenv("EVENT_HUBS_BROKER")
 EVENT_HUBS_CONNECTION_STRING = os.getenv("EVENT_HUBS_CONNECTION_STRING")
+TOPIC = os.getenv("KAFKA_TOPIC", "new-customers")
 
+# Producer batching, used by the load mode (kafka-python defaults: 16 KiB, 0 ms, no compression)
+PRODUCER_BATCH_BYTES = int(os.getenv("PRODUCER_BATCH_BYTES", 256 * 1024))
+PRODUCER_LINGER_MS = int(os.getenv("PRODUCER_LINGER_MS", 20))
+PRODUCER_COMPRESSION = os.getenv("PRODUCER_COMPRESSION", "gzip")  # gzip, snappy, lz4, zstd or none
 
-producer = KafkaProducer(
-    bootstrap_servers=EVENT_HUBS_BROKER,
-    security_protocol="SASL_SSL",
-    sasl_mechanism="PLAIN",
-    sasl_plain_username="$ConnectionString",
-    sasl_plain_password=EVENT_HUBS_CONNECTION_STRING,
-    value_serializer=lambda v: json.dumps(v).encode("utf-8")
-)
+# Send latencies kept for the percentiles of a load run: a uniform sample, so memory stays flat on long runs
+LATENCY_SAMPLE_SIZE = 10_000
 
-def simulate_customers(interval_sec=3):
+
+def make_producer(**settings):
+    # Event Hubs needs SASL_SSL; without a connection string, a plain local broker is assumed
+    security = {}
+    if EVENT_HUBS_CONNECTION_STRING:
+        security = {
+            "security_protocol": "SASL_SSL",
+            "sasl_mechanism": "PLAIN",
+            "sasl_plain_username": "$ConnectionString",
+            "sasl_plain_password": EVENT_HUBS_CONNECTION_STRING,
+        }
+    return KafkaProducer(
+        bootstrap_servers=EVENT_HUBS_BROKER or "localhost:9092",
+        value_serializer=lambda v: json.dumps(v).encode("utf-8"),
+        **security,
+        **settings,
+    )
+
+
+def simulate_customers(producer, interval_sec=3):
     while True:
         new_customer = generate_customer()
-        print('new_customer: ' + new_customer['customer_id'])  
+        print('new_customer: ' + new_customer['customer_id'])
         # send to Kafka
-        producer.send("new-customers", value=new_customer)
+        producer.send(TOPIC, value=new_customer)
         time.sleep(interval_sec)
 
 
-if __name__ == "__main__":
+# > Load generation
+
+class LatencySample:
+    """Reservoir sample (algorithm R) of send latencies: every latency seen has the same chance to be kept."""
+
+    def __init__(self, size=LATENCY_SAMPLE_SIZE, seed=None):
+        self.size = size
+        self.values = []
+        self.seen = 0
+        self._rng = np.random.default_rng(seed)
+
+    def append(self, latency):
+        self.seen += 1
+        if len(self.values) < self.size:
+            self.values.append(latency)
+        else:
+            slot = self._rng.integers(self.seen)
+            if slot < self.size:
+                self.values[slot] = latency
+
+    def percentiles(self, q):
+        return np.percentile(np.array(self.values), q)
+
+    def __len__(self):
+        return len(self.values)
+
+
+class KafkaSink:
+    """Batched, compressed sends; latency is measured from send() to the broker ack."""
+
+    def __init__(self, producer, topic):
+        self.producer = producer
+        self.topic = topic
+        self.latencies = LatencySample()
+        self.errors = 0
+
+    def send(self, customers):
+        for customer in customers:
+            sent_at = time.perf_counter()
+            future = self.producer.send(self.topic, value=customer)
+            future.add_callback(self._acked, sent_at)
+            future.add_errback(self._failed)
+
+    def _acked(self, sent_at, _metadata):
+        self.latencies.append(time.perf_counter() - sent_at)
+
+    def _failed(self, _error):
+        self.errors += 1
+
+    def close(self):
+        self.producer.flush()
+        self.producer.close()
 
-    simulate_customers(5)
 
+class FileSink:
+    """JSON lines on disk, for offline benchmarks; latency is the write time of each batch."""
+
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8", buffering=1024 * 1024)
+        self.latencies = LatencySample()
+        self.errors = 0
+
+    def send(self, customers):
+        started = time.perf_counter()
+        self.file.write("".join(json.dumps(c) + "\n" for c in customers))
+        self.latencies.append(time.perf_counter() - started)
+
+    def close(self):
+        self.file.close()
+
+
+def report(sent, elapsed, sink, final=False):
+    line = f"{'total' if final else 'sent'}: {sent} events in {elapsed:.1f}s ({sent / max(elapsed, 1e-9):,.0f}/s)"
+    if sink.latencies:
+        p50, p95, p99 = sink.latencies.percentiles([50, 95, 99]) * 1000
+        line += f", send latency p50={p50:.2f}ms p95={p95:.2f}ms p99={p99:.2f}ms"
+    if sink.errors:
+        line += f", {sink.errors} failed"
+    print(line)
+
+
+def generate_load(sink, rate, duration=None, count=None, batch_size=500, seed=None, report_every=5.0):
+    """
+    Send generated customers to `sink` at `rate` events/s until `duration` seconds
+    or `count` events. Batches are spaced so the average rate holds; a batch that
+    is late is sent at once, so a sink slower than `rate` shows as a lower achieved rate.
+    A `rate` of 0 sends as fast as the sink takes the batches.
+    """
+    if not rate >= 0:  # also rejects nan
+        raise ValueError(f"rate must be >= 0, got {rate}")
+    rng = np.random.default_rng(seed)
+    names = NamePool(seed=seed)
+    batch_size = max(1, batch_size if rate == 0 else min(batch_size, int(rate) or 1))
+
+    sent = 0
+    started = last_report = time.perf_counter()
+    try:
+        while True:
+            elapsed = time.perf_counter() - started
+            if (duration is not None and elapsed >= duration) or (count is not None and sent >= count):
+                break
+            n = batch_size if count is None else min(batch_size, count - sent)
+            sink.send(generate_customer_batch(n, rng, names))
+            sent += n
+
+            # Pacing: batch k is due at k * batch_size / rate
+            delay = started + sent / rate - time.perf_counter() if rate else 0
+            if delay > 0:
+                time.sleep(delay)
+            if time.perf_counter() - last_report >= report_every:
+                last_report = time.perf_counter()
+                report(sent, last_report - started, sink)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.close()  # waits for the last acks
+    report(sent, time.perf_counter() - started, sink, final=True)
+    return sent
+
+
+def non_negative_rate(value):
+    rate = float(value)
+    if not rate >= 0:  # also rejects nan
+        raise argparse.ArgumentTypeError(f"must be >= 0 (0 for unpaced), got {value}")
+    return rate
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publish generated customers")
+    parser.add_argument("--load", action="store_true", help="load-generation mode instead of one customer every few seconds")
+    parser.add_argument("--rate", type=non_negative_rate, default=1000, help="target events per second, 0 for as fast as possible")
+    parser.add_argument("--duration", type=float, help="seconds to run (default: until --count or Ctrl+C)")
+    parser.add_argument("--count", type=int, help="events to send")
+    parser.add_argument("--batch-size", type=int, default=500, help="customers generated per NumPy batch")
+    parser.add_argument("--sink", choices=["kafka", "file"], default="kafka")
+    parser.add_argument("--output", default="customers.jsonl", help="file written by --sink file")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    if not args.load:
+        simulate_customers(make_producer(), 5)
+    else:
+        if args.sink == "file":
+            sink = FileSink(args.output)
+        else:
+            sink = KafkaSink(make_producer(
+                batch_size=PRODUCER_BATCH_BYTES,
+                linger_ms=PRODUCER_LINGER_MS,
+                compression_type=None if PRODUCER_COMPRESSION == "none" else PRODUCER_COMPRESSION,
+                acks=1,
+            ), TOPIC)
+        generate_load(sink, args.rate, args.duration, args.count, args.batch_size, args.seed)
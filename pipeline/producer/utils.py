@@ -2,6 +2,8 @@ import random
 import string
 import time
 from datetime import datetime
+
+import numpy as np
 from faker import Faker
 
 
@@ -40,6 +42,28 @@ def random_choice_weighted(choices):
         upto += weight
     assert False, "Shouldn't reach here"
 
+# Distributions of the generated customers, shared by generate_customer and generate_customer_batch
+GENDERS = ["Male", "Female"]
+CATEGORICAL_WEIGHTS = {
+    "multiple_lines": [("Yes", 0.3), ("No", 0.6), ("No phone service", 0.1)],
+    "internet_service": [("DSL", 0.4), ("Fiber optic", 0.5), ("None", 0.1)],
+    "online_security": [("Yes", 0.3), ("No", 0.6), ("No internet service", 0.1)],
+    "online_backup": [("Yes", 0.3), ("No", 0.6), ("No internet service", 0.1)],
+    "device_protection": [("Yes", 0.3), ("No", 0.6), ("No internet service", 0.1)],
+    "tech_support": [("Yes", 0.3), ("No", 0.6), ("No internet service", 0.1)],
+    "streaming_tv": [("Yes", 0.4), ("No", 0.5), ("No internet service", 0.1)],
+    "streaming_movies": [("Yes", 0.4), ("No", 0.5), ("No internet service", 0.1)],
+    "contract": [("Month-to-month", 0.5), ("One year", 0.3), ("Two year", 0.2)],
+    "payment_method": [("Electronic check", 0.4), ("Mailed check", 0.2), ("Bank transfer", 0.2), ("Credit card", 0.2)],
+}
+BOOL_PROBABILITIES = {
+    "senior_citizen": 0.2,
+    "partner": 0.5,
+    "dependents": 0.4,
+    "phone_service": 0.9,
+    "paperless_billing": 0.7,
+}
+
 # Customer generator
 def generate_customer():
     tenure = random.randint(0, 72)  # 0-6 years
@@ -49,28 +73,78 @@ def generate_customer():
 
     customer = {
         "customer_id": generate_customer_id(),
-        "gender": random.choice(["Male", "Female"]),
-        "senior_citizen": random_bool(0.2),
-        "partner": random_bool(0.5),
-        "dependents": random_bool(0.4),
+        "gender": random.choice(GENDERS),
         "tenure": tenure,
-        "phone_service": random_bool(0.9),
-        "multiple_lines": random_choice_weighted([("Yes",0.3), ("No",0.6), ("No phone service",0.1)]),
-        "internet_service": random_choice_weighted([("DSL",0.4), ("Fiber optic",0.5), ("None",0.1)]),
-        "online_security": random_choice_weighted([("Yes",0.3), ("No",0.6), ("No internet service",0.1)]),
-        "online_backup": random_choice_weighted([("Yes",0.3), ("No",0.6), ("No internet service",0.1)]),
-        "device_protection": random_choice_weighted([("Yes",0.3), ("No",0.6), ("No internet service",0.1)]),
-        "tech_support": random_choice_weighted([("Yes",0.3), ("No",0.6), ("No internet service",0.1)]),
-        "streaming_tv": random_choice_weighted([("Yes",0.4), ("No",0.5), ("No internet service",0.1)]),
-        "streaming_movies": random_choice_weighted([("Yes",0.4), ("No",0.5), ("No internet service",0.1)]),
-        "contract": random_choice_weighted([("Month-to-month",0.5), ("One year",0.3), ("Two year",0.2)]),
-        "paperless_billing": random_bool(0.7),
-        "payment_method": random_choice_weighted([("Electronic check",0.4), ("Mailed check",0.2), ("Bank transfer",0.2), ("Credit card",0.2)]),
         "monthly_charges": monthly_charges,
         "total_charges": total_charges,
+    }
+    for column, p in BOOL_PROBABILITIES.items():
+        customer[column] = random_bool(p)
+    for column, choices in CATEGORICAL_WEIGHTS.items():
+        customer[column] = random_choice_weighted(choices)
+    customer.update({
         "updated_at": datetime.utcnow().isoformat() + "Z",
         "first_name": fake.first_name(),
         "last_name": fake.last_name(),
-        "email": fake.email()
-    }
+        "email": fake.email(),
+    })
     return customer
+
+
+# > Load generation: whole batches of customers drawn with NumPy
+
+_DIGITS = np.array(list(string.digits))
+_LETTERS = np.array(list(string.ascii_uppercase))
+
+
+class NamePool:
+    """Names and emails drawn once from Faker, then sampled: Faker costs ~100µs per call."""
+
+    def __init__(self, size=5000, seed=None):
+        faker = Faker()
+        if seed is not None:
+            faker.seed_instance(seed)
+        self.first_names = np.array([faker.first_name() for _ in range(size)], dtype=object)
+        self.last_names = np.array([faker.last_name() for _ in range(size)], dtype=object)
+        self.emails = np.array([faker.email() for _ in range(size)], dtype=object)
+
+    def sample(self, rng, n):
+        first = self.first_names[rng.integers(0, len(self.first_names), n)]
+        last = self.last_names[rng.integers(0, len(self.last_names), n)]
+        emails = self.emails[rng.integers(0, len(self.emails), n)]
+        return first, last, emails
+
+
+def generate_customer_ids(rng, n):
+    digits = _DIGITS[rng.integers(0, 10, (n, 4))]
+    letters = _LETTERS[rng.integers(0, 26, (n, 5))]
+    return ["".join(d) + "-" + "".join(l) for d, l in zip(digits, letters)]
+
+
+def generate_customer_batch(n, rng, names):
+    """
+    `n` customers with the same marginal distributions as generate_customer,
+    drawn column by column. Returns a list of dicts ready for json.dumps.
+    """
+    tenure = rng.integers(0, 73, n)
+    monthly = np.round(rng.uniform(20, 150, n), 2)
+    total = np.round(monthly * tenure * rng.uniform(0.9, 1.1, n), 2)
+
+    columns = {
+        "customer_id": generate_customer_ids(rng, n),
+        "gender": np.array(GENDERS, dtype=object)[rng.integers(0, len(GENDERS), n)],
+        "tenure": tenure.tolist(),
+        "monthly_charges": monthly.tolist(),
+        "total_charges": total.tolist(),
+    }
+    for column, p in BOOL_PROBABILITIES.items():
+        columns[column] = (rng.random(n) < p).tolist()
+    for column, choices in CATEGORICAL_WEIGHTS.items():
+        values = np.array([value for value, _ in choices], dtype=object)
+        weights = np.array([weight for _, weight in choices])
+        columns[column] = values[rng.choice(len(values), n, p=weights / weights.sum())]
+    columns["first_name"], columns["last_name"], columns["email"] = names.sample(rng, n)
+
+    updated_at = datetime.utcnow().isoformat() + "Z"
+    fields = list(columns)
+    return [{**dict(zip(fields, row)), "updated_at": updated_at} for row in zip(*columns.values())]
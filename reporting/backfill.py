@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Drift et métriques de classification par fenêtre de temps sur l'historique des prédictions.
+
+Chaque fenêtre (jour ou semaine) lit les features de `predictions.features_json`,
+la prédiction servie et le label de `feedback` par paquets, puis est comparée au
+profil de référence (reference_profile.py). Les fenêtres sont calculées en
+parallèle dans un pool de processus ; le résultat est une série temporelle
+(une ligne par fenêtre) en CSV, et optionnellement en OpenMetrics pour
+`promtool tsdb create-blocks-from openmetrics`.
+
+Depuis le dossier reporting :
+    python backfill.py --start 2025-01-01 --window week
+    python backfill.py --window day --workers 8 --openmetrics drift_history.om
+"""
+
+import argparse
+import csv
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score
+
+from data_loader import ML_PIPELINE_SRC, DataLoader
+from model_loader import ModelLoader
+from project import DRIFT_GAUGE_COLUMNS
+from reference_profile import ReferenceProfileStore, drift_against_profile
+
+# Lignes lues par aller-retour avec la base (curseur côté serveur)
+BACKFILL_CHUNK_ROWS = int(os.getenv("BACKFILL_CHUNK_ROWS", 50_000))
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", os.cpu_count() or 1))
+BACKFILL_OUTPUT = os.getenv("BACKFILL_OUTPUT", "drift_history.csv")
+
+WINDOW_DAYS = {"day": 1, "week": 7}
+
+# Dernier label connu de chaque prédiction (feedback répondu le plus récent)
+WINDOW_QUERY = """
+    SELECT p.features_json, p.churn_label, f.feedback_label, p.model_version
+    FROM predictions p
+    LEFT JOIN LATERAL (
+        SELECT feedback_label FROM feedback
+        WHERE prediction_id = p.prediction_id AND feedback_label IS NOT NULL
+        ORDER BY answered_at DESC NULLS LAST
+        LIMIT 1
+    ) f ON true
+    WHERE p.created_at >= %s AND p.created_at < %s
+      AND (%s::text IS NULL OR p.model_version = %s::text)
+"""
+
+# Colonnes de la série, dans l'ordre du CSV ; mêmes noms que les gauges de metrics_exporter.py
+SERIES_COLUMNS = (
+    ["current_data_count", "labelled_count", "drift_count", "drift_share"]
+    + [f"{column}_drift" for column in DRIFT_GAUGE_COLUMNS]
+    + ["accuracy", "precision", "recall", "f1_score"]
+)
+
+
+def get_connection():
+    if ML_PIPELINE_SRC not in sys.path:
+        sys.path.append(ML_PIPELINE_SRC)
+    from utils.data_loader import get_connection as connect
+
+    return connect()
+
+
+def time_windows(start: datetime, end: datetime, size: str) -> list[tuple[datetime, datetime]]:
+    """Fenêtres [début, fin) alignées sur minuit (jour) ou le lundi (semaine), en UTC."""
+    first = datetime(start.year, start.month, start.day, tzinfo=timezone.utc)
+    if size == "week":
+        first -= timedelta(days=first.weekday())
+    step = timedelta(days=WINDOW_DAYS[size])
+    windows = []
+    while first < end:
+        windows.append((first, first + step))
+        first += step
+    return windows
+
+
+def first_prediction_time(model_version: str | None) -> datetime | None:
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT MIN(created_at) FROM predictions WHERE %s::text IS NULL OR model_version = %s::text",
+                (model_version, model_version),
+            )
+            return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+
+# === CALCUL D'UNE FENÊTRE (processus du pool) ===
+
+_worker = {}
+
+
+def _init_worker(profile: dict, model_version: str | None, chunk_rows: int):
+    """Une connexion et un preprocessor par processus, gardés pour toutes ses fenêtres."""
+    _worker["profile"] = profile
+    _worker["model_version"] = model_version
+    _worker["chunk_rows"] = chunk_rows
+    _worker["preprocessor"] = ModelLoader.load_model().named_steps["preprocess"]
+    _worker["conn"] = get_connection()
+
+
+def transform_features(preprocessor, features: pd.DataFrame) -> pd.DataFrame:
+    """
+    preprocessor.transform, une ligne par prédiction : le preprocessor supprime les
+    doublons, or un même client rescoré sans changement est une prédiction de plus.
+    """
+    transformed = preprocessor.transform(features)
+    if len(transformed) < len(features):
+        row_hash = pd.util.hash_pandas_object(features, index=False)
+        first_index = pd.Series(row_hash.index, index=row_hash.to_numpy()).groupby(level=0).first()
+        transformed = transformed.loc[first_index[row_hash.to_numpy()].to_numpy()]
+    return transformed.reset_index(drop=True)
+
+
+def read_window(start: datetime, end: datetime) -> tuple[pd.DataFrame | None, set]:
+    """Prédictions de la fenêtre, transformées paquet par paquet, avec leurs colonnes predictions et churn."""
+    frames = []
+    versions = set()
+    conn = _worker["conn"]
+    model_version = _worker["model_version"]
+    try:
+        with conn.cursor(name="backfill_window") as cur:
+            cur.itersize = _worker["chunk_rows"]
+            cur.execute(WINDOW_QUERY, (start, end, model_version, model_version))
+            while rows := cur.fetchmany(_worker["chunk_rows"]):
+                data = transform_features(_worker["preprocessor"], pd.DataFrame.from_records([row[0] for row in rows]))
+                data["predictions"] = [int(row[1]) for row in rows]
+                # Pas de feedback : label manquant (NaN), exclu des métriques de classification
+                data["churn"] = pd.Series([row[2] for row in rows], dtype="object").map({False: 0, True: 1})
+                versions.update(row[3] for row in rows)
+                frames.append(data)
+    finally:
+        conn.rollback()
+    return (pd.concat(frames, ignore_index=True) if frames else None), versions
+
+
+def compute_window(start: datetime, end: datetime) -> dict:
+    started = time.perf_counter()
+    current, versions = read_window(start, end)
+    row = {"window_start": start.isoformat(), "window_end": end.isoformat(),
+           "model_versions": "|".join(sorted(versions))}
+    row.update({column: float("nan") for column in SERIES_COLUMNS})
+    row["current_data_count"] = 0 if current is None else len(current)
+    row["labelled_count"] = 0
+    if current is None:
+        row["seconds"] = round(time.perf_counter() - started, 3)
+        return row
+
+    drift = drift_against_profile(_worker["profile"], current)
+    row["drift_count"] = drift["count"]
+    row["drift_share"] = drift["share"]
+    for column in DRIFT_GAUGE_COLUMNS:
+        row[f"{column}_drift"] = drift["scores"].get(column, float("nan"))
+
+    labelled = current.dropna(subset=["churn"])
+    row["labelled_count"] = len(labelled)
+    if len(labelled):
+        y_true, y_pred = labelled["churn"].astype(int), labelled["predictions"]
+        row["accuracy"] = accuracy_score(y_true, y_pred)
+        row["precision"] = precision_score(y_true, y_pred, zero_division=0)
+        row["recall"] = recall_score(y_true, y_pred, zero_division=0)
+        row["f1_score"] = f1_score(y_true, y_pred, zero_division=0)
+    row["seconds"] = round(time.perf_counter() - started, 3)
+    return row
+
+
+# === SÉRIE TEMPORELLE ===
+
+def write_csv(rows: list[dict], path: str):
+    columns = ["window_start", "window_end", "model_versions"] + SERIES_COLUMNS + ["seconds"]
+    with open(path + ".partial", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(path + ".partial", path)
+
+
+def write_openmetrics(rows: list[dict], path: str):
+    """Une famille par métrique, un échantillon par fenêtre horodaté à la fin de la fenêtre."""
+    with open(path + ".partial", "w") as f:
+        for column in SERIES_COLUMNS:
+            f.write(f"# TYPE {column} gauge\n")
+            for row in rows:
+                value = row[column]
+                if isinstance(value, float) and math.isnan(value):
+                    continue
+                timestamp = datetime.fromisoformat(row["window_end"]).timestamp()
+                f.write(f"{column} {value} {timestamp:.0f}\n")
+        f.write("# EOF\n")
+    os.replace(path + ".partial", path)
+
+
+def parse_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start", type=parse_time, help="Début (ISO, UTC) ; par défaut la première prédiction")
+    parser.add_argument("--end", type=parse_time, help="Fin (ISO, UTC) ; par défaut maintenant. La dernière fenêtre est complète")
+    parser.add_argument("--window", choices=sorted(WINDOW_DAYS), default="day")
+    parser.add_argument("--model-version", help="Seulement les prédictions de cette version du modèle")
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS)
+    parser.add_argument("--chunk-rows", type=int, default=BACKFILL_CHUNK_ROWS)
+    parser.add_argument("--output", default=BACKFILL_OUTPUT, help="Série temporelle en CSV")
+    parser.add_argument("--openmetrics", help="Aussi écrire la série en OpenMetrics (promtool)")
+    args = parser.parse_args()
+
+    end = args.end or datetime.now(timezone.utc)
+    start = args.start or first_prediction_time(args.model_version)
+    if start is None:
+        print("Aucune prédiction en base, rien à calculer.")
+        return
+    windows = time_windows(start, end, args.window)
+
+    # Le profil est calculé (ou relu) une seule fois, puis envoyé à chaque processus
+    profile = ReferenceProfileStore().load(DataLoader(load_reference=False, load_current=False))
+    print(f"{len(windows)} fenêtres ({args.window}) du {windows[0][0]:%Y-%m-%d} au {windows[-1][1]:%Y-%m-%d}, "
+          f"{args.workers} processus")
+
+    started = time.perf_counter()
+    rows = []
+    with ProcessPoolExecutor(max_workers=max(args.workers, 1), initializer=_init_worker,
+                             initargs=(profile, args.model_version, args.chunk_rows)) as pool:
+        futures = {pool.submit(compute_window, window_start, window_end): window_start
+                   for window_start, window_end in windows}
+        for future in as_completed(futures):
+            row = future.result()
+            rows.append(row)
+            print(f"✓ {futures[future]:%Y-%m-%d} : {row['current_data_count']} prédictions, "
+                  f"{row['labelled_count']} labellisées, {row['seconds']:.1f}s")
+
+    rows.sort(key=lambda row: row["window_start"])
+    write_csv(rows, args.output)
+    if args.openmetrics:
+        write_openmetrics(rows, args.openmetrics)
+    print(f"Série de {len(rows)} fenêtres écrite dans {args.output} en {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
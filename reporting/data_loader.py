@@ -1,33 +1,65 @@
-import pandas as pd 
+import os
+import sys
+
+import pandas as pd
 from model_loader import ModelLoader
+
+# "csv" : référence lue dans customer_ref.csv
+# "snapshot" : référence = données d'entraînement du snapshot local (ml_pipeline/src/utils/snapshot_store.py)
+REFERENCE_SOURCE = os.getenv("REFERENCE_SOURCE", "csv")
+ML_PIPELINE_SRC = os.getenv("ML_PIPELINE_SRC", os.path.abspath("../ml_pipeline/src"))
+
+
+def load_reference_from_snapshot(model):
+    """Données d'entraînement (load_training_frame) avec les prédictions du modèle servi."""
+    if ML_PIPELINE_SRC not in sys.path:
+        sys.path.append(ML_PIPELINE_SRC)
+    from utils.snapshot_store import load_training_frame
+
+    customer_ref = load_training_frame()
+    # Mêmes types que le CSV pour le preprocessor et la définition Evidently
+    categories = customer_ref.select_dtypes(include=["category", "string"]).columns
+    customer_ref[categories] = customer_ref[categories].astype(object)
+    customer_ref["predictions"] = model.predict(customer_ref.drop(columns=["churn"])).astype(bool)
+    return customer_ref
+
+
 class DataLoader:
-    def __init__(self):
-        self.preprocessor =  ModelLoader.load_model().named_steps['preprocess']
-        self.customer_ref =  pd.read_csv("customer_ref.csv") 
-        self.customer_prod =  pd.read_csv("customer_drift.csv") 
+    def __init__(self, load_reference=True, load_current=True):
+        self.model = ModelLoader.load_model()
+        self.preprocessor =  self.model.named_steps['preprocess']
+        # Sans référence (load_reference=False), seul le profil de référence est utilisé (reference_profile.py)
+        self.customer_ref = self.read_reference() if load_reference else None
+        # Sans données courantes (load_current=False), prepare() s'applique à des données lues ailleurs (backfill.py)
+        self.customer_prod =  pd.read_csv("customer_drift.csv") if load_current else None
 
-    def load_data(self):
-        # Stocker les données avec le preprocessor
-        prod_predictions = self.customer_prod["predictions"]
-        ref_predictions = self.customer_ref["predictions"]
-        prod_churn = self.customer_prod["churn"]
-        ref_churn = self.customer_ref["churn"]
-        self.customer_ref = self.customer_ref.drop('predictions', axis=1)
-        self.customer_prod = self.customer_prod.drop('predictions', axis=1)
+    def read_reference(self):
+        if REFERENCE_SOURCE == "snapshot":
+            return load_reference_from_snapshot(self.model)
+        return pd.read_csv("customer_ref.csv")
+
+    def prepare(self, data):
+        """Applique le preprocessor en gardant les colonnes predictions et churn (0/1)."""
+        predictions = data["predictions"]
+        churn = data["churn"]
+        data = data.drop('predictions', axis=1)
 
         # Transformer les données avec le preprocessor
-        self.customer_ref = self.preprocessor.transform(self.customer_ref)
-        self.customer_prod = self.preprocessor.transform(self.customer_prod)
+        data = self.preprocessor.transform(data)
 
         # Récuperer les predictions et les
-        self.customer_prod["predictions"] = prod_predictions
-        self.customer_ref["predictions"] = ref_predictions
-        self.customer_prod["churn"]=prod_churn
-        self.customer_ref["churn"]=ref_churn
+        data["predictions"] = predictions
+        data["churn"] = churn
 
-        self.customer_prod["predictions"] = self.customer_prod["predictions"].map({False: 0, True: 1})
-        self.customer_ref["predictions"] = self.customer_ref["predictions"].map({False: 0, True: 1})
-        self.customer_prod["churn"] = self.customer_prod["churn"].map({False: 0, True: 1})
-        self.customer_ref["churn"]  = self.customer_ref["churn"].map({False: 0, True: 1})
+        data["predictions"] = data["predictions"].map({False: 0, True: 1})
+        data["churn"] = data["churn"].map({False: 0, True: 1})
+        return data
 
-        return self.customer_ref, self.customer_prod    
\ No newline at end of file
+    def load_current(self):
+        self.customer_prod = self.prepare(self.customer_prod)
+        return self.customer_prod
+
+    def load_data(self):
+        self.customer_ref = self.prepare(self.customer_ref)
+        self.customer_prod = self.prepare(self.customer_prod)
+        return self.customer_ref, self.customer_prod
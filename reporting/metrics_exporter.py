@@ -1,7 +1,6 @@
-import time
 from prometheus_client import start_http_server, Gauge
 from project import create_report
-import random
+from report_scheduler import ReportScheduler
 # === MÉTRIQUES DE DRIFT GLOBAL ===
 # nombre_colonnes_driftees = nombre ABSOLU de colonnes qui ont drifté (ex: 3 colonnes)
 share_drifted_columns = Gauge('drift_share', 
@@ -34,57 +33,60 @@ reference_data_count = Gauge('reference_data_count',
 columns_count = Gauge('columns_count', 
                       'Nombre total de colonnes dans les datasets')
 
+def publish_metrics(metrics):
+    """Publie dans les gauges les métriques d'un rapport (calculé ou lu depuis le cache)."""
+    
+    # Mettre à jour le drift global
+    if 'global_drift' in metrics:
+        nombre = metrics['global_drift'].get('nombre_colonnes_driftees', 0)
+        share = metrics['global_drift'].get('share_colonnes_driftees', 0)
+        number_drifted_columns.set(nombre)
+        share_drifted_columns.set(share)
+        print(f"   Drift global: {nombre} colonnes ({share*100:.1f}%)")
+    
+    # Mettre à jour les drifts par colonne
+    if 'drift_scores' in metrics:
+        drift_scores = metrics['drift_scores']
+        drift_payment_electronic.set(drift_scores.get('payment_method_Electronic_check', 0))
+        drift_internet_fiber.set(drift_scores.get('internet_service_Fiber_optic', 0))
+        drift_monthly_charges.set(drift_scores.get('monthly_charges', 0))
+        drift_paperless_billing.set(drift_scores.get('paperless_billing', 0))
+        print(f"   {len(drift_scores)} drifts de colonnes spécifiques extraits")
+    
+    # Mettre à jour les métriques de classification
+    if 'classification' in metrics:
+        classification = metrics['classification']
+        accuracy_gauge.set(classification.get('accuracy', 0))
+        precision_gauge.set(classification.get('precision', 0))
+        recall_gauge.set(classification.get('recall', 0))
+        f1_score_gauge.set(classification.get('f1_score', 0))
+        print(f"   Accuracy: {classification.get('accuracy', 0):.4f}")
+        print(f"   F1 Score: {classification.get('f1_score', 0):.4f}")
+    
+    # Mettre à jour les informations sur les données
+    if 'data_info' in metrics:
+        data_info = metrics['data_info']
+        nb_current = data_info.get('nombre_enregistrements_current', 0)
+        nb_ref = data_info.get('nombre_enregistrements_reference', 0)
+        nb_cols = data_info.get('nombre_colonnes', 0)
+        
+        current_data_count.set(nb_current)
+        reference_data_count.set(nb_ref)
+        columns_count.set(nb_cols)
+        
+        print(f"   Données PROD (current): {nb_current} enregistrements")
+        print(f"   Données REF: {nb_ref} enregistrements")
+        print(f"   {nb_cols} colonnes au total")
+    
+    print("\n Métriques Prometheus mises à jour avec succès!")
+
+
 def update_metrics_from_evidently():
     """Appelle directement create_report() pour obtenir les métriques Evidently."""
     
     try:
         print("\n Génération d'un nouveau rapport Evidently...")
-        metrics = create_report()
-        
-        # Mettre à jour le drift global
-        if 'global_drift' in metrics:
-            nombre = metrics['global_drift'].get('nombre_colonnes_driftees', 0)
-            share = metrics['global_drift'].get('share_colonnes_driftees', 0)
-            number_drifted_columns.set(nombre +random.randint(10, 300))
-            share_drifted_columns.set(share)
-            print(f"   Drift global: {nombre} colonnes ({share*100:.1f}%)")
-        
-        # Mettre à jour les drifts par colonne
-        if 'drift_scores' in metrics:
-            drift_scores = metrics['drift_scores']
-            drift_payment_electronic.set(drift_scores.get('payment_method_Electronic_check', 0))
-            drift_internet_fiber.set(drift_scores.get('internet_service_Fiber_optic', 0))
-            drift_monthly_charges.set(drift_scores.get('monthly_charges', 0))
-            drift_paperless_billing.set(drift_scores.get('paperless_billing', 0))
-            print(f"   {len(drift_scores)} drifts de colonnes spécifiques extraits")
-        
-        # Mettre à jour les métriques de classification
-        if 'classification' in metrics:
-            classification = metrics['classification']
-            accuracy_gauge.set(classification.get('accuracy', 0))
-            precision_gauge.set(classification.get('precision', 0))
-            recall_gauge.set(classification.get('recall', 0))
-            f1_score_gauge.set(classification.get('f1_score', 0))
-            print(f"   Accuracy: {classification.get('accuracy', 0):.4f}")
-            print(f"   F1 Score: {classification.get('f1_score', 0):.4f}")
-        
-        # Mettre à jour les informations sur les données
-        if 'data_info' in metrics:
-            data_info = metrics['data_info']
-            nb_current = data_info.get('nombre_enregistrements_current', 0)
-            nb_ref = data_info.get('nombre_enregistrements_reference', 0)
-            nb_cols = data_info.get('nombre_colonnes', 0)
-            
-            current_data_count.set(nb_current)
-            reference_data_count.set(nb_ref)
-            columns_count.set(nb_cols)
-            
-            print(f"   Données PROD (current): {nb_current} enregistrements")
-            print(f"   Données REF: {nb_ref} enregistrements")
-            print(f"   {nb_cols} colonnes au total")
-        
-        print("\n Métriques Prometheus mises à jour avec succès!")
-        
+        publish_metrics(create_report())
     except Exception as e:
         print(f"\n Erreur lors de la mise à jour des métriques: {e}")
         import traceback
@@ -93,10 +95,8 @@ def update_metrics_from_evidently():
 if __name__ == '__main__':
     # Démarrer le serveur HTTP pour Prometheus sur le port 8020
     start_http_server(8020)
-   
-    
-    # Boucle infinie pour mettre à jour les métriques
-    while True:
-        update_metrics_from_evidently()
-        print(f"\n⏳ Prochain rapport dans 5 minutes...\n")
-        time.sleep(3)  # Mise à jour toutes les 5 minutes
\ No newline at end of file
+
+    # Rapport recalculé seulement si le modèle ou les données ont changé,
+    # sinon les gauges gardent les dernières métriques (voir report_scheduler.py)
+    scheduler = ReportScheduler(compute=create_report, publish=publish_metrics)
+    scheduler.run_forever()
@@ -6,8 +6,16 @@ from evidently import Report, Dataset, BinaryClassification, DataDefinition
 from evidently.presets import DataDriftPreset, ClassificationPreset
 from evidently.ui.workspace import Workspace
 from data_loader import DataLoader
+from reference_profile import ReferenceProfileStore, drift_against_profile
 
-def extract_metrics_from_report(my_eval, customer_prod, customer_ref):
+# "profile" : drift calculé contre le profil de référence persistant (seule la production est transformée)
+# "evidently" : DataDriftPreset sur référence + production, comme avant
+DRIFT_ENGINE = os.getenv("DRIFT_ENGINE", "profile")
+
+DRIFT_GAUGE_COLUMNS = ["payment_method_Electronic_check", "internet_service_Fiber_optic",
+                       "monthly_charges", "paperless_billing"]
+
+def extract_metrics_from_report(my_eval, customer_prod, reference_rows):
     """Extrait les métriques du rapport Evidently et les sauvegarde pour Prometheus."""
     
     # Charger les métriques
@@ -30,8 +38,7 @@ def extract_metrics_from_report(my_eval, customer_prod, customer_ref):
         # 1. Extraire les drifts des colonnes spécifiques
         if "ValueDrift" in metric_name:
             column = config.get("column", "")
-            if column in ["payment_method_Electronic_check", "internet_service_Fiber_optic", 
-                         "monthly_charges", "paperless_billing"]:
+            if column in DRIFT_GAUGE_COLUMNS:
                 results["drift_scores"][column] = value
         
         # 2. Extraire le drift global
@@ -52,7 +59,7 @@ def extract_metrics_from_report(my_eval, customer_prod, customer_ref):
     # 4. Informations sur les données
     results["data_info"] = {
         "nombre_enregistrements_current": len(customer_prod),
-        "nombre_enregistrements_reference": len(customer_ref),
+        "nombre_enregistrements_reference": reference_rows,
         "nombre_colonnes": len(customer_prod.columns)
     }
     
@@ -70,8 +77,19 @@ def create_report():
     else:
         project = existing_projects[0]
     
-    data_loader = DataLoader()
-    customer_ref, customer_prod = data_loader.load_data()
+    if DRIFT_ENGINE == "evidently":
+        data_loader = DataLoader()
+        customer_ref, customer_prod = data_loader.load_data()
+        reference_rows = len(customer_ref)
+        metrics_list = [DataDriftPreset(), ClassificationPreset()]
+    else:
+        # La référence n'est ni relue ni transformée : son profil est calculé une fois par (référence, modèle)
+        data_loader = DataLoader(load_reference=False)
+        customer_prod = data_loader.load_current()
+        profile = ReferenceProfileStore().load(data_loader)
+        customer_ref = None
+        reference_rows = profile["rows"]
+        metrics_list = [ClassificationPreset()]
 
     # Configuration de la définition des données
     definition = DataDefinition(
@@ -84,13 +102,10 @@ def create_report():
 
     # Créer les Dataset objects
     current_data = Dataset.from_pandas(customer_prod, data_definition=definition)
-    reference_data = Dataset.from_pandas(customer_ref, data_definition=definition)
+    reference_data = Dataset.from_pandas(customer_ref, data_definition=definition) if customer_ref is not None else None
     
     # Créer et exécuter le rapport
-    report = Report(metrics=[
-        DataDriftPreset(),
-        ClassificationPreset(),
-    ])
+    report = Report(metrics=metrics_list)
     
     my_eval = report.run(reference_data=reference_data, current_data=current_data)
     
@@ -99,7 +114,15 @@ def create_report():
     print("✓ Nouveau rapport généré avec succès.")
     
     # Extraire et sauvegarder les métriques pour Prometheus
-    metrics = extract_metrics_from_report(my_eval, customer_prod, customer_ref)
+    metrics = extract_metrics_from_report(my_eval, customer_prod, reference_rows)
+    if DRIFT_ENGINE != "evidently":
+        drift = drift_against_profile(profile, customer_prod)
+        metrics["drift_scores"] = {column: drift["scores"][column]
+                                   for column in DRIFT_GAUGE_COLUMNS if column in drift["scores"]}
+        metrics["global_drift"] = {
+            "nombre_colonnes_driftees": drift["count"],
+            "share_colonnes_driftees": drift["share"],
+        }
     
     return metrics
 
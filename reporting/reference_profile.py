@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import distance
+
+from data_loader import REFERENCE_SOURCE
+from model_loader import ModelLoader
+from report_scheduler import REFERENCE_CSV, FileFingerprint, reference_watermark
+
+# Dossier des profils de référence (un fichier par couple référence / modèle)
+REFERENCE_PROFILE_DIR = os.getenv("REFERENCE_PROFILE_DIR", "profiles")
+# Seuil de drift par colonne, le même que les tests par défaut d'Evidently
+DRIFT_THRESHOLD = float(os.getenv("DRIFT_THRESHOLD", 0.1))
+
+# Quantiles gardés pour la distance de Wasserstein (1001 points : erreur < 0.1% de l'étendue)
+QUANTILES = np.linspace(0, 1, 1001)
+# Quantiles qui servent de bornes aux histogrammes des colonnes numériques (PSI)
+HISTOGRAM_QUANTILES = np.linspace(0, 1, 21)
+# En dessous de ce nombre de valeurs distinctes, on garde aussi les fréquences exactes
+MAX_FREQUENCY_VALUES = 20
+
+_files = FileFingerprint()
+
+
+def column_kind(series: pd.Series) -> str:
+    # Même règle que la DataDefinition de project.py : les colonnes entières sont catégorielles
+    return "categorical" if pd.api.types.is_integer_dtype(series) or pd.api.types.is_bool_dtype(series) else "numerical"
+
+
+def profile_column(series: pd.Series) -> dict:
+    """Statistiques et distribution d'une colonne de la référence (valeurs manquantes exclues)."""
+    kind = column_kind(series)
+    values = series.dropna()
+    profile = {
+        "kind": kind,
+        "count": int(len(values)),
+        "missing": int(series.isna().sum()),
+        "unique": int(values.nunique()),
+    }
+    if profile["unique"] <= MAX_FREQUENCY_VALUES or kind == "categorical":
+        profile["frequencies"] = {_key(value): int(count) for value, count in values.value_counts().items()}
+    if kind == "numerical" and len(values):
+        array = values.to_numpy(dtype=float)
+        edges = np.unique(np.quantile(array, HISTOGRAM_QUANTILES))
+        profile.update({
+            "mean": float(array.mean()),
+            "std": float(array.std()),
+            "min": float(array.min()),
+            "max": float(array.max()),
+            "quantiles": np.quantile(array, QUANTILES).tolist(),
+            "bin_edges": edges.tolist(),
+            "bin_counts": histogram(array, edges).tolist(),
+        })
+    return profile
+
+
+def histogram(values: np.ndarray, edges) -> np.ndarray:
+    """Comptes par intervalle ; les valeurs hors de [min, max] de la référence vont dans les intervalles extrêmes."""
+    edges = np.asarray(edges, dtype=float)
+    if len(edges) < 2:
+        return np.array([len(values)])
+    inner = edges[1:-1]
+    return np.bincount(np.searchsorted(inner, values, side="right"), minlength=len(edges) - 1)
+
+
+def build_profile(data: pd.DataFrame) -> dict:
+    return {
+        "rows": int(len(data)),
+        "columns": {column: profile_column(data[column]) for column in data.columns},
+        "created_at": time.time(),
+    }
+
+
+def _key(value) -> str:
+    # Clés JSON : 1, 1.0 et True désignent la même modalité
+    if isinstance(value, (bool, np.bool_)):
+        value = int(value)
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        value = int(value)
+    return str(value)
+
+
+# === COMPARAISON AVEC LA PÉRIODE COURANTE ===
+
+def jensenshannon_from_counts(reference: dict, current: dict) -> float:
+    keys = sorted(set(reference) | set(current))
+    ref = np.array([reference.get(k, 0) for k in keys], dtype=float)
+    cur = np.array([current.get(k, 0) for k in keys], dtype=float)
+    if not ref.sum() or not cur.sum():
+        return float("nan")
+    return float(distance.jensenshannon(ref / ref.sum(), cur / cur.sum()))
+
+
+def wasserstein_from_quantiles(column: dict, values: np.ndarray) -> float:
+    """Distance de Wasserstein entre les quantiles de la référence et ceux de `values`, normée par l'écart-type de la référence."""
+    current = np.quantile(values, QUANTILES)
+    distance_value = np.trapz(np.abs(np.asarray(column["quantiles"]) - current), QUANTILES)
+    return float(distance_value / max(column["std"], 0.001))
+
+
+def column_drift(column: dict, series: pd.Series) -> tuple[float, str]:
+    """
+    Score de drift d'une colonne, avec le test qu'Evidently choisit pour une référence > 1000 lignes :
+    Jensen-Shannon pour les catégorielles et les numériques à ≤ 5 valeurs, Wasserstein normé sinon.
+    """
+    values = series.dropna()
+    if not len(values):
+        return float("nan"), "empty"
+    if "frequencies" in column:
+        current = {_key(value): int(count) for value, count in values.value_counts().items()}
+        if column["kind"] == "categorical" or len(set(column["frequencies"]) | set(current)) <= 5:
+            return jensenshannon_from_counts(column["frequencies"], current), "jensenshannon"
+    return wasserstein_from_quantiles(column, values.to_numpy(dtype=float)), "wasserstein"
+
+
+def drift_against_profile(profile: dict, current: pd.DataFrame, threshold: float = DRIFT_THRESHOLD) -> dict:
+    """Drift de chaque colonne du profil présente dans `current` ; seule la période courante est parcourue."""
+    scores = {}
+    methods = {}
+    for name, column in profile["columns"].items():
+        if name in current.columns:
+            scores[name], methods[name] = column_drift(column, current[name])
+    drifted = [name for name, score in scores.items() if score >= threshold]
+    return {
+        "scores": scores,
+        "methods": methods,
+        "drifted_columns": drifted,
+        "count": len(drifted),
+        "share": len(drifted) / len(scores) if scores else 0.0,
+    }
+
+
+# === STOCKAGE ===
+
+def reference_key() -> str:
+    """Empreinte de la référence : contenu du CSV, ou état de la table avec REFERENCE_SOURCE=snapshot."""
+    if REFERENCE_SOURCE == "snapshot":
+        return hashlib.sha256(json.dumps(reference_watermark()).encode("utf-8")).hexdigest()
+    return _files.digest(REFERENCE_CSV)
+
+
+def model_key() -> str:
+    return _files.digest(ModelLoader.model_path)
+
+
+class ReferenceProfileStore:
+    """Profils de référence en JSON, un par (empreinte de la référence, version du modèle)."""
+
+    def __init__(self, directory: str = REFERENCE_PROFILE_DIR):
+        self.directory = directory
+
+    def path(self, reference: str, model: str) -> str:
+        return os.path.join(self.directory, f"reference_{reference[:16]}_{model[:16]}.json")
+
+    def get(self, reference: str, model: str) -> dict | None:
+        try:
+            with open(self.path(reference, model)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, reference: str, model: str, profile: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(reference, model)
+        with open(path + ".partial", "w") as f:
+            json.dump({**profile, "reference_key": reference, "model_key": model}, f)
+        os.replace(path + ".partial", path)
+
+    def load(self, data_loader) -> dict:
+        """Profil de la référence courante, calculé (une seule fois) s'il n'existe pas encore."""
+        reference, model = reference_key(), model_key()
+        profile = self.get(reference, model)
+        if profile is not None:
+            return profile
+
+        started = time.perf_counter()
+        customer_ref = data_loader.prepare(data_loader.read_reference())
+        profile = build_profile(customer_ref)
+        self.put(reference, model, profile)
+        print(f"✓ Profil de référence calculé en {time.perf_counter() - started:.1f}s "
+              f"({profile['rows']} lignes) : {self.path(reference, model)}")
+        return profile
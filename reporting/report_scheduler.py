@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import sys
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from data_loader import REFERENCE_SOURCE, ML_PIPELINE_SRC
+from model_loader import ModelLoader
+
+# Fréquence à laquelle on vérifie si les entrées du rapport ont changé
+REPORT_CHECK_INTERVAL_SECONDS = float(os.getenv("REPORT_CHECK_INTERVAL_SECONDS", 30))
+# Âge maximal du dernier rapport : au-delà, on le recalcule même sans changement (0 = jamais)
+REPORT_MAX_AGE_SECONDS = float(os.getenv("REPORT_MAX_AGE_SECONDS", 3600))
+# Délai avant de retenter des entrées qui ont fait échouer le rapport, indépendant de max_age
+REPORT_RETRY_INTERVAL_SECONDS = float(os.getenv("REPORT_RETRY_INTERVAL_SECONDS", 300))
+# Dernières métriques calculées, rechargées au démarrage
+REPORT_CACHE_PATH = os.getenv("REPORT_CACHE_PATH", "latest_metrics.json")
+
+REFERENCE_CSV = "customer_ref.csv"
+CURRENT_CSV = "customer_drift.csv"
+
+# === MÉTRIQUES DU SCHEDULER ===
+report_duration = Histogram('report_duration_seconds',
+                            'Durée de calcul d\'un rapport Evidently',
+                            buckets=[1, 2, 5, 10, 30, 60, 120, 300, 600])
+report_runs = Counter('report_runs_total', 'Rapports calculés', ['result'])
+report_skipped = Counter('report_skipped_total',
+                         'Vérifications sans recalcul (entrées inchangées)')
+report_last_success = Gauge('report_last_success_timestamp_seconds',
+                            'Horodatage du dernier rapport calculé avec succès')
+report_staleness = Gauge('report_staleness_seconds',
+                         'Âge des métriques publiées (secondes depuis le dernier rapport réussi)')
+
+
+class FileFingerprint:
+    """
+    Empreinte SHA-256 du contenu de fichiers. Un fichier n'est relu que si
+    sa taille ou sa date de modification a changé depuis le dernier appel.
+    """
+
+    def __init__(self):
+        self._digests = {}  # chemin -> (taille, mtime_ns, sha256)
+
+    def digest(self, path: str) -> str | None:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        cached = self._digests.get(path)
+        if cached and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+            return cached[2]
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(block)
+        self._digests[path] = (stat.st_size, stat.st_mtime_ns, sha.hexdigest())
+        return sha.hexdigest()
+
+
+def reference_watermark() -> list:
+    """Avec REFERENCE_SOURCE=snapshot : nombre de lignes et dernier updated_at de la table d'entraînement."""
+    if ML_PIPELINE_SRC not in sys.path:
+        sys.path.append(ML_PIPELINE_SRC)
+    from utils.data_loader import get_connection
+
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f'SELECT COUNT(*), MAX(updated_at) FROM "{os.getenv("TABLE_NAME", "customers")}"')
+            count, last_update = cur.fetchone()
+    finally:
+        conn.close()
+    return [count, last_update.isoformat() if last_update else None]
+
+
+_files = FileFingerprint()
+
+
+def input_fingerprint() -> str:
+    """Empreinte de tout ce dont dépend create_report() : modèle, référence et données de production."""
+    inputs = {
+        "model": _files.digest(ModelLoader.model_path),
+        "current": _files.digest(CURRENT_CSV),
+        "reference_source": REFERENCE_SOURCE,
+        "reference": reference_watermark() if REFERENCE_SOURCE == "snapshot" else _files.digest(REFERENCE_CSV),
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ReportScheduler:
+    """
+    Recalcule le rapport uniquement quand ses entrées ont changé (empreinte),
+    ou quand le dernier rapport réussi a plus de `max_age` secondes. Des
+    entrées qui ont fait échouer le rapport sont retentées toutes les
+    `retry_interval` secondes, même si max_age vaut 0.
+
+    Les dernières métriques sont gardées en cache (mémoire + fichier JSON) et
+    republiées via `publish` ; un rapport en échec laisse le cache en place.
+    """
+
+    def __init__(self, compute, publish, fingerprint=input_fingerprint,
+                 check_interval: float = REPORT_CHECK_INTERVAL_SECONDS,
+                 max_age: float = REPORT_MAX_AGE_SECONDS,
+                 retry_interval: float = REPORT_RETRY_INTERVAL_SECONDS,
+                 cache_path: str = REPORT_CACHE_PATH):
+        self.compute = compute
+        self.publish = publish
+        self.fingerprint = fingerprint
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self.retry_interval = retry_interval
+        self.cache_path = cache_path
+        self.metrics = None
+        self.last_fingerprint = None
+        self.last_success = None
+        self.last_failure = None
+        self.failed_fingerprint = None
+        report_staleness.set_function(self.staleness)
+        self._load_cache()
+
+    def staleness(self) -> float:
+        return time.time() - self.last_success if self.last_success else float("nan")
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.metrics = cache.get("metrics")
+        self.last_fingerprint = cache.get("fingerprint")
+        self.last_success = cache.get("computed_at")
+        if self.metrics is not None:
+            print(f"Métriques du cache {self.cache_path} publiées (calculées il y a {self.staleness():.0f}s)")
+            report_last_success.set(self.last_success)
+            self.publish(self.metrics)
+
+    def _save_cache(self):
+        partial = self.cache_path + ".partial"
+        with open(partial, "w") as f:
+            json.dump({
+                "fingerprint": self.last_fingerprint,
+                "computed_at": self.last_success,
+                "metrics": self.metrics,
+            }, f, indent=2, default=str)
+        os.replace(partial, self.cache_path)
+
+    def check(self) -> bool:
+        """Recalcule si nécessaire ; retourne True si un rapport a été calculé."""
+        fingerprint = self.fingerprint()
+        now = time.time()
+        if fingerprint == self.failed_fingerprint:
+            # Entrées qui ont déjà fait échouer le rapport : retentées après retry_interval
+            due = now - self.last_failure >= self.retry_interval
+        elif fingerprint == self.last_fingerprint:
+            due = self.max_age > 0 and (self.last_success is None or now - self.last_success >= self.max_age)
+        else:
+            due = True
+        if not due:
+            report_skipped.inc()
+            return False
+
+        started = time.perf_counter()
+        try:
+            metrics = self.compute()
+        except Exception as e:
+            self.failed_fingerprint = fingerprint
+            self.last_failure = time.time()
+            report_runs.labels(result="failure").inc()
+            print(f"\n Erreur lors du calcul du rapport, métriques précédentes conservées: {e}")
+            return False
+        report_duration.observe(time.perf_counter() - started)
+        report_runs.labels(result="success").inc()
+
+        self.metrics = metrics
+        self.last_fingerprint = fingerprint
+        self.failed_fingerprint = None
+        self.last_success = time.time()
+        report_last_success.set(self.last_success)
+        self._save_cache()
+        self.publish(metrics)
+        return True
+
+    def run_forever(self):
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                # Empreinte impossible à calculer (fichier illisible, base injoignable...)
+                print(f"\n Vérification des entrées impossible: {e}")
+            time.sleep(self.check_interval)
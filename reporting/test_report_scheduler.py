@@ -0,0 +1,111 @@
+import json
+
+import pytest
+
+import report_scheduler
+from report_scheduler import ReportScheduler
+
+
+class FakeReport:
+    """compute, publish et fingerprint d'un ReportScheduler, sur une horloge manuelle."""
+
+    def __init__(self):
+        self.fingerprint = "a"
+        self.fail = False
+        self.computed = 0
+        self.published = []
+
+    def compute(self):
+        self.computed += 1
+        if self.fail:
+            raise RuntimeError("rapport impossible")
+        return {"drift_share": 0.1, "run": self.computed}
+
+    def publish(self, metrics):
+        self.published.append(metrics)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(report_scheduler.time, "time", lambda: now[0])
+    return now
+
+
+def make_scheduler(report, tmp_path, max_age=3600, retry_interval=300):
+    return ReportScheduler(report.compute, report.publish, fingerprint=lambda: report.fingerprint,
+                           max_age=max_age, retry_interval=retry_interval,
+                           cache_path=str(tmp_path / "latest_metrics.json"))
+
+
+def test_unchanged_inputs_are_skipped(tmp_path, clock):
+    report = FakeReport()
+    scheduler = make_scheduler(report, tmp_path)
+
+    assert scheduler.check()
+    clock[0] += 60
+    assert not scheduler.check()
+    assert report.computed == 1
+
+    report.fingerprint = "b"
+    assert scheduler.check()
+    assert report.computed == 2
+    assert report.published == [{"drift_share": 0.1, "run": 1}, {"drift_share": 0.1, "run": 2}]
+
+
+def test_report_expires_after_max_age(tmp_path, clock):
+    report = FakeReport()
+    scheduler = make_scheduler(report, tmp_path, max_age=600)
+
+    assert scheduler.check()
+    clock[0] += 599
+    assert not scheduler.check()
+    clock[0] += 1
+    assert scheduler.check()
+    assert report.computed == 2
+
+
+def test_max_age_zero_never_expires(tmp_path, clock):
+    report = FakeReport()
+    scheduler = make_scheduler(report, tmp_path, max_age=0)
+
+    assert scheduler.check()
+    clock[0] += 10 * 86400
+    assert not scheduler.check()
+    assert report.computed == 1
+
+
+def test_failure_keeps_previous_metrics_and_is_retried(tmp_path, clock):
+    report = FakeReport()
+    scheduler = make_scheduler(report, tmp_path, max_age=0, retry_interval=300)
+    assert scheduler.check()
+    cache = json.loads((tmp_path / "latest_metrics.json").read_text())
+
+    report.fingerprint = "b"
+    report.fail = True
+    assert not scheduler.check()
+    assert scheduler.metrics == {"drift_share": 0.1, "run": 1}
+    assert json.loads((tmp_path / "latest_metrics.json").read_text()) == cache
+
+    # Les entrées en échec ne sont retentées qu'après retry_interval, même avec max_age=0
+    clock[0] += 299
+    assert not scheduler.check()
+    assert report.computed == 2
+    clock[0] += 1
+    report.fail = False
+    assert scheduler.check()
+    assert report.computed == 3
+    assert scheduler.failed_fingerprint is None
+    assert scheduler.last_fingerprint == "b"
+
+
+def test_cache_is_published_at_startup(tmp_path, clock):
+    report = FakeReport()
+    make_scheduler(report, tmp_path).check()
+
+    restarted = FakeReport()
+    scheduler = make_scheduler(restarted, tmp_path)
+    assert restarted.published == [{"drift_share": 0.1, "run": 1}]
+    # Mêmes entrées qu'avant le redémarrage : rien à recalculer
+    assert not scheduler.check()
+    assert restarted.computed == 0